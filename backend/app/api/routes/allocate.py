@@ -1,21 +1,46 @@
 from datetime import datetime
 from pathlib import Path
+from typing import Literal
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.db.deps import get_db
-from app.db.models import Task, TeamMember
-from app.schemas.allocation import AllocateRequest, AllocateResponse, ExplainTaskRequest, ExplainTaskResponse
-from app.services.reasoning import run_allocation, explain_task
+from app.db.models import AllocationJob, Task, TeamMember
+from app.schemas.allocation import (
+    AllocateRequest,
+    AllocateResponse,
+    AllocationJobStatus,
+    Assignment,
+    ExplainTaskRequest,
+    ExplainTaskResponse,
+)
+from app.services import jobs
+from app.services.logic_engine import ProofBudgetExceeded
+from app.services.reasoning import (
+    encode_allocation_stream,
+    explain_stored_task,
+    explain_task,
+    run_allocation,
+    stored_task_detail,
+)
 
 router = APIRouter(tags=["allocation"])
 
 
-def _append_allocation_log(db: Session, request: AllocateRequest, result: AllocateResponse) -> None:
+def _append_allocation_log(
+    db: Session,
+    request: AllocateRequest,
+    result: AllocateResponse,
+    allocated: int | None = None,
+    member_ids: set[int] | None = None,
+) -> None:
     """
     Write a minimal key:value style log entry.
     Newest run is always inserted at the top.
+    allocated and member_ids count the run's assignments when result does
+    not hold them (a stream); by default they come from result.assignments.
     """
     backend_root = Path(__file__).resolve().parents[3]
     log_dir = backend_root / "logs"
@@ -27,20 +52,29 @@ def _append_allocation_log(db: Session, request: AllocateRequest, result: Alloca
     total_members = db.query(TeamMember).count()
     total_tasks = db.query(Task).count()
     db_unassigned = db.query(Task).filter(Task.assignee_id.is_(None)).count()
-    assigned_member_ids = sorted({a.team_member_id for a in result.assignments})
+    if allocated is None:
+        allocated = len(result.assignments)
+    if member_ids is None:
+        member_ids = {a.team_member_id for a in result.assignments}
     unassigned_ids = result.unassigned_task_ids or []
-    entry = "\n".join(
-        [
-            f"- Timestamp: {ts}",
-            f"- Total Members: {total_members}",
-            f"- Total Tasks: {total_tasks}",
-            f"- Allocated This Run: {len(result.assignments)}",
-            f"- Unassigned This Run: {len(unassigned_ids)}",
-            f"- Members Used This Run: {len(assigned_member_ids)}",
-            "",
-            "",
-        ]
-    )
+    lines = [
+        f"- Timestamp: {ts}",
+        f"- Total Members: {total_members}",
+        f"- Total Tasks: {total_tasks}",
+        f"- Allocated This Run: {allocated}",
+        f"- Unassigned This Run: {len(unassigned_ids)}",
+        f"- Members Used This Run: {len(member_ids)}",
+        f"- Strategy: {request.strategy}",
+    ]
+    stats = result.engine_stats
+    if stats:
+        slowest = sorted(stats["predicates"].items(), key=lambda item: item[1]["seconds"], reverse=True)[:3]
+        lines.append(f"- Engine Queries Sampled: {stats['sampled']}/{stats['queries']}")
+        lines.append(
+            "- Engine Slowest Predicates: "
+            + (", ".join(f"{pred} {p['seconds']:.3f}s/{p['goals']} goals" for pred, p in slowest) or "none")
+        )
+    entry = "\n".join(lines + ["", ""])
 
     if log_path.exists():
         old = log_path.read_text(encoding="utf-8")
@@ -72,7 +106,12 @@ def allocate(
     Returns task assignments with full explanations (constraints satisfied,
     why members were preferred/rejected). Use `apply: true` to persist.
     """
-    result = run_allocation(db, request)
+    try:
+        result = run_allocation(db, request)
+    except ProofBudgetExceeded as exc:
+        raise HTTPException(
+            status_code=422, detail=f"Allocation stopped: {exc}. Raise LOGIC_ENGINE_MAX_STEPS to allow it."
+        )
     try:
         _append_allocation_log(db, request, result)
     except Exception:
@@ -81,6 +120,86 @@ def allocate(
     return result
 
 
+@router.post("/allocate/stream")
+def allocate_stream(
+    request: AllocateRequest = AllocateRequest(),
+    format: Literal["ndjson", "sse"] = "ndjson",
+) -> StreamingResponse:
+    """
+    Run the allocation and stream each decision as soon as it is made: one
+    record per Assignment ("assignment") or UnassignedTask ("unassigned"),
+    then the AllocateResponse without assignments ("summary"). A run stopped
+    by LOGIC_ENGINE_MAX_STEPS ends with an "error" record ({"detail"}) instead
+    of the summary. `format=ndjson` sends one {"type", "data"} JSON object
+    per line; `format=sse` sends Server-Sent Events named by type.
+    """
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(encode_allocation_stream(request, format, _append_allocation_log), media_type=media_type)
+
+
+@router.post("/allocate/jobs", response_model=AllocationJobStatus, status_code=202)
+def allocate_job(
+    request: AllocateRequest = AllocateRequest(),
+    db: Session = Depends(get_db),
+) -> AllocationJobStatus:
+    """
+    Queue the allocation as a background job and return its id at once.
+    Poll GET /allocate/jobs/{job_id} or follow /allocate/jobs/{job_id}/events
+    for progress and the result. 429 when too many jobs are pending.
+    """
+    try:
+        job = jobs.submit(db, request)
+    except jobs.JobQueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
+    return jobs.job_status(job)
+
+
+@router.get("/allocate/jobs/{job_id}", response_model=AllocationJobStatus)
+def allocate_job_status(job_id: str, db: Session = Depends(get_db)) -> AllocationJobStatus:
+    """Status and progress of a background job, with the AllocateResponse once done."""
+    job = db.get(AllocationJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Allocation job {job_id} not found.")
+    return jobs.job_status(job)
+
+
+@router.get("/allocate/jobs/{job_id}/events")
+def allocate_job_events(job_id: str, db: Session = Depends(get_db)) -> StreamingResponse:
+    """
+    Server-Sent Events for a background job: "progress" whenever its status
+    changes, then one "done" or "failed" event with the full status. Ends
+    with an "error" event ({"detail"}) if the job is deleted or left without
+    a running backend (see jobs.events).
+    """
+    if db.get(AllocationJob, job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Allocation job {job_id} not found.")
+    return StreamingResponse(jobs.events(job_id), media_type="text/event-stream")
+
+
+@router.get("/allocate/runs/{run_id}/tasks/{task_id}", response_model=Assignment)
+def allocate_run_task(run_id: str, task_id: int) -> Assignment:
+    """
+    Full explanation of one task (inference trace, every candidate) from a
+    stored run; 404 if the run has expired or left the task unassigned.
+    """
+    assignment = stored_task_detail(run_id, task_id)
+    if assignment is None:
+        raise HTTPException(status_code=404, detail=f"No assignment of task {task_id} in run {run_id}.")
+    return assignment
+
+
+@router.post("/allocate/runs/{run_id}/tasks/{task_id}/explain", response_model=ExplainTaskResponse)
+def allocate_run_task_explain(run_id: str, task_id: int) -> ExplainTaskResponse:
+    """
+    Task-level explanation for one task of a stored run; the evidence comes
+    from the run, not the request body.
+    """
+    response = explain_stored_task(run_id, task_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"No assignment of task {task_id} in run {run_id}.")
+    return response
+
+
 @router.post("/allocate/explain_task", response_model=ExplainTaskResponse)
 def allocate_explain_task(
     request: ExplainTaskRequest,
@@ -28,6 +28,45 @@ class Settings(BaseSettings):
     LLM_TIMEOUT_SECONDS: float = 12.0
     # Azure: api_version from your Azure code (e.g. 2024-12-01-preview)
     LLM_AZURE_API_VERSION: str = "2024-12-01-preview"
+    # Logic engine: "compiled" (rules compiled once) or "interpret" (reference prover)
+    LOGIC_ENGINE_MODE: str = "compiled"
+    # Cache answers to derived goals (can_perform, eligible) within a run
+    LOGIC_ENGINE_TABLING: bool = True
+    # Materialize can_perform/eligible bottom-up instead of proving per pair
+    LOGIC_ENGINE_MATERIALIZE: bool = True
+    # Decide can_perform's ∀ with skill bitmasks instead of one proof per skill
+    LOGIC_ENGINE_BITSET_KERNEL: bool = True
+    # Reorder rule conjuncts by estimated cost (cheap ground checks first)
+    LOGIC_ENGINE_REORDER: bool = True
+    # Steps each proved goal (e.g. eligible(m, t) for one member) may take before the run aborts (0 = no limit)
+    LOGIC_ENGINE_MAX_STEPS: int = 100000
+    # Fraction of engine queries profiled on every run, logged with the run (0 = off)
+    LOGIC_ENGINE_STATS_SAMPLE_RATE: float = 0.0
+    # Serve the KB from one process-wide snapshot, kept current by this process's ORM writes
+    KB_CACHE_ENABLED: bool = True
+    # Also reload it when the KB tables' fingerprint changes (read once per session): for seed scripts,
+    # several backends or other processes writing the same database
+    KB_CACHE_EXTERNAL_WRITERS: bool = False
+    # Directory the KB cache's snapshot is written to for job workers to map ("" = the system temp dir)
+    KB_SNAPSHOT_DIR: str = ""
+    # Score all eligible members of a task with NumPy array ops (when numpy is installed)
+    SCORING_VECTORIZED: bool = True
+    # Allocation runs kept for the run-id detail/explain endpoints (0 = keep none)
+    RUN_STORE_MAX_RUNS: int = 32
+    # Seconds a stored run stays retrievable
+    RUN_STORE_TTL_SECONDS: float = 3600.0
+    # SQLite file that runs pushed out of memory are spilled to ("" = drop them)
+    RUN_STORE_SPILL_PATH: str = ""
+    # Processes allocating independent skill components of one optimal run (0/1 = off)
+    ALLOCATION_PARTITION_WORKERS: int = 0
+    # Smallest run (in tasks) that is split across those processes
+    ALLOCATION_PARTITION_MIN_TASKS: int = 500
+    # Processes running background allocation jobs (/allocate/jobs)
+    ALLOCATION_JOB_WORKERS: int = 2
+    # Queued plus running jobs accepted before /allocate/jobs answers 429
+    ALLOCATION_JOB_MAX_PENDING: int = 20
+    # Seconds without a heartbeat after which another backend process takes over a pending job
+    ALLOCATION_JOB_STALE_SECONDS: float = 30.0
     model_config = SettingsConfigDict(
         env_file=str(_BACKEND_DIR / ".env"),
         env_file_encoding="utf-8",
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Table, ForeignKey
+from sqlalchemy import Column, DateTime, Integer, String, Float, Table, Text, ForeignKey
 from sqlalchemy.orm import relationship
 
 from app.db.base import Base
@@ -58,3 +58,23 @@ class Task(Base):
 
     required_skills = relationship("Skill", secondary=task_required_skills, back_populates="tasks")
     assignee = relationship("TeamMember", back_populates="assigned_tasks", foreign_keys=[assignee_id])
+
+
+class AllocationJob(Base):
+    __tablename__ = "allocation_jobs"
+
+    id = Column(String, primary_key=True)  # uuid hex
+    status = Column(String, nullable=False, default="queued")  # queued/running/done/failed
+    request_json = Column(Text, nullable=False)  # AllocateRequest
+
+    tasks_done = Column(Integer, nullable=False, default=0)
+    tasks_total = Column(Integer, nullable=True)
+    result_json = Column(Text, nullable=True)  # AllocateResponse, once done
+    error = Column(Text, nullable=True)
+    run_id = Column(String, nullable=True)  # run store id, set by the backend process
+    owner = Column(String, nullable=True)  # "host:pid:token" of the backend process running it
+    heartbeat_at = Column(DateTime, nullable=True)  # refreshed by the owner while the job is pending
+
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -10,8 +12,18 @@ from app.api.routes.stats import router as stats_router
 from app.db.session import engine
 from app.db.base import Base
 import app.db.models  # noqa: F401
+from app.services import jobs as allocation_jobs
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # take over background allocation jobs whose backend process is gone, and keep ours alive
+    allocation_jobs.start()
+    yield
+    allocation_jobs.stop()
+
 
-app = FastAPI(title="KRAFT API", version="0.1.0")
+app = FastAPI(title="KRAFT API", version="0.1.0", lifespan=lifespan)
 
 # auto-create tables on startup (we'll use alembic later)
 Base.metadata.create_all(bind=engine)
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Any, Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -31,6 +34,38 @@ class AllocateRequest(BaseModel):
         default=None,
         description="Assignments from first round; used to compute workload for second round.",
     )
+    second_round: bool = Field(
+        default=False,
+        description=(
+            "If True, run the relaxed (partial skill match) round on the tasks the first round leaves "
+            "unassigned, in the same request. Ignored with force_round."
+        ),
+    )
+    profile: bool = Field(
+        default=False,
+        description="If True, record logic engine counters for every query and return them in engine_stats.",
+    )
+    strategy: Literal["greedy", "optimal"] = Field(
+        default="greedy",
+        description=(
+            "'greedy': tasks in priority order, each to its best-scoring eligible member. "
+            "'optimal': one capacitated assignment over the whole batch (min-cost flow), "
+            "maximizing tasks assigned and then total score."
+        ),
+    )
+    explain_level: Literal["none", "top", "full"] = Field(
+        default="full",
+        description=(
+            "'full': inference trace and an explanation row for every member. "
+            "'top': trace and rows for the explain_top_k best-scoring eligible members only. "
+            "'none': no trace or rows. Full detail for one task: GET /allocate/runs/{run_id}/tasks/{task_id}."
+        ),
+    )
+    explain_top_k: int = Field(
+        default=3,
+        ge=1,
+        description="Candidate rows per assignment when explain_level is 'top' (the chosen member is always one).",
+    )
 
 
 class AssignmentExplanation(BaseModel):
@@ -134,6 +169,28 @@ class AllocateResponse(BaseModel):
         default_factory=list,
         description="Task IDs and names that could not be assigned.",
     )
+    engine_stats: dict[str, Any] | None = Field(
+        default=None,
+        description="Logic engine counters per predicate and rule (when profiled or sampled).",
+    )
+    run_id: str | None = Field(
+        default=None,
+        description="Id of this run in the server's run store, for /allocate/runs/{run_id}/tasks/{task_id} (None when the store is off).",
+    )
+
+
+class AllocationJobStatus(BaseModel):
+    """A background allocation job (POST /allocate/jobs) and, once done, its result."""
+
+    job_id: str
+    status: Literal["queued", "running", "done", "failed"]
+    tasks_done: int = Field(default=0, description="Tasks decided so far.")
+    tasks_total: int | None = Field(default=None, description="Tasks in the run (None until the job starts).")
+    error: str | None = Field(default=None, description="Why the job failed.")
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    result: AllocateResponse | None = Field(default=None, description="The run's response, once done.")
 
 
 class ExplainTaskRequest(BaseModel):
@@ -0,0 +1,108 @@
+"""
+Capacitated task assignment by min-cost flow.
+
+solve_capacitated_assignment() picks at most one member per task, at most
+capacity[m] tasks per member, maximizing first the number of tasks assigned
+and then the total score. It is successive shortest paths over the bipartite
+task/member graph: tasks are added one at a time, each along a shortest
+augmenting path (Dijkstra on reduced costs, stopped at the first member with
+spare capacity), so earlier tasks are moved when that raises the total.
+Each task touches only the part of the graph its path needs, which keeps
+batches of thousands of tasks fast when each has a modest candidate list.
+"""
+
+from __future__ import annotations
+
+import heapq
+from typing import Hashable, Sequence
+
+# Scores are in [0, 1] (MCDM); costs are integers so reduced costs stay exact
+_SCALE = 1_000_000
+
+
+def solve_capacitated_assignment(
+    options: Sequence[Sequence[tuple[Hashable, float]]],
+    capacity: dict[Hashable, int],
+) -> list[Hashable | None]:
+    """
+    options[i] lists (member, score) pairs task i may take; returns the
+    chosen member per task, or None where no assignment fits. Among the
+    assignments covering the most tasks, the total score is maximal (to
+    1e-6); ties are broken deterministically.
+    """
+    n = len(options)
+    column: dict[Hashable, int] = {}
+    for opts in options:
+        for member, _ in opts:
+            if capacity.get(member, 0) > 0 and member not in column:
+                column[member] = len(column)
+    m = len(column)
+    cap = [0] * m
+    for member, j in column.items():
+        cap[j] = capacity[member]
+    # task i -> {member column: cost}; cost is the score shortfall from 1
+    costs: list[dict[int, int]] = []
+    for opts in options:
+        edges: dict[int, int] = {}
+        for member, score in opts:
+            j = column.get(member)
+            if j is not None and j not in edges:
+                edges[j] = _SCALE - round(min(max(score, 0.0), 1.0) * _SCALE)
+        costs.append(edges)
+
+    # Nodes: tasks 0..n-1, members n..n+m-1, and NONE (task left unassigned).
+    # Leaving a task out costs more than any augmenting path through members,
+    # so the flow maximizes the number assigned before the score.
+    none = n + m
+    skip_cost = (n + 1) * _SCALE
+    pot = [0] * (n + m + 1)
+    assigned: list[int | None] = [None] * n  # node a task is routed to
+    holders: list[dict[int, int]] = [{} for _ in range(m)]  # member -> {task: cost}
+
+    for i in range(n):
+        dist = {i: 0}
+        parent: dict[int, int] = {}
+        settled: set[int] = set()
+        heap = [(0, i)]
+        target, reach = none, skip_cost
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            if u == none or (u >= n and len(holders[u - n]) < cap[u - n]):
+                target, reach = u, d
+                break
+            settled.add(u)
+            if u < n:
+                current = assigned[u]
+                steps = [(n + j, c) for j, c in costs[u].items() if n + j != current]
+                if current != none:
+                    steps.append((none, skip_cost))
+            else:
+                # A full member: reroute one of its tasks
+                steps = [(k, -c) for k, c in holders[u - n].items()]
+            for v, c in steps:
+                nd = d + c + pot[u] - pot[v]
+                if nd < dist.get(v, nd + 1):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+        for v in settled:
+            pot[v] += dist[v] - reach
+
+        # Walk the path back from the target, moving each task one step on.
+        v = target
+        while True:
+            k = parent[v]
+            old = assigned[k]
+            if old is not None and old != none:
+                del holders[old - n][k]
+            if v != none:
+                holders[v - n][k] = costs[k][v - n]
+            assigned[k] = v
+            if k == i:
+                break
+            v = parent[k]
+
+    members = list(column)
+    return [members[a - n] if a is not None and a != none else None for a in assigned]
@@ -0,0 +1,404 @@
+"""
+Background allocation jobs.
+
+submit() records an AllocateRequest as a queued AllocationJob row and hands
+it to a process pool of ALLOCATION_JOB_WORKERS workers. A worker claims the
+row, maps the backend's KB snapshot file (kb_cache.snapshot_file) instead
+of reloading the KB from the database, runs run_allocation() on its own
+session, writes tasks done / total to the row as it goes (at most every
+_PROGRESS_INTERVAL seconds), and finally the AllocateResponse or the error. The run's stored evidence comes back to
+this process, which puts it in its run store, so the run-detail and explain
+endpoints work for job results too.
+
+Jobs are rows, not just futures. Each pending job has an owner, the backend
+process ("host:pid:token") that dispatched it, and a heartbeat_at the owner
+refreshes every third of ALLOCATION_JOB_STALE_SECONDS. start() (called from
+the app's lifespan) runs that heartbeat and takes over pending jobs whose
+owner is provably gone: released by stop(), a pid no longer running on this
+host, or a heartbeat older than ALLOCATION_JOB_STALE_SECONDS. Taking over
+is a conditional UPDATE on the owner and heartbeat seen, so of several
+backends on one database exactly one re-queues a job, and a worker only
+writes to its job while its backend still owns it.
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Iterator
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import AllocationJob
+from app.db.session import SessionLocal
+from app.schemas.allocation import AllocateRequest, AllocateResponse, AllocationJobStatus
+from app.services import kb_cache, run_store
+from app.services.reasoning import run_allocation
+
+PENDING = ("queued", "running")
+FINISHED = ("done", "failed")
+
+# Minimum seconds between two progress writes of one job
+_PROGRESS_INTERVAL = 0.5
+# Seconds between two reads of a followed job's row, and at most between two lines of its events stream
+_EVENTS_POLL_INTERVAL = 0.5
+_EVENTS_KEEPALIVE = 10.0
+
+_HOST = socket.gethostname()
+# This process as a job owner; the token tells it apart from an earlier process with the same pid
+_OWNER = f"{_HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+_heartbeat: threading.Thread | None = None
+_stopping = threading.Event()
+
+
+class JobQueueFull(Exception):
+    """ALLOCATION_JOB_MAX_PENDING jobs are already queued or running."""
+
+
+def submit(db: Session, request: AllocateRequest) -> AllocationJob:
+    """Queue request as a new job and return its row."""
+    pending = db.query(AllocationJob).filter(AllocationJob.status.in_(PENDING)).count()
+    if pending >= settings.ALLOCATION_JOB_MAX_PENDING:
+        raise JobQueueFull(f"{pending} allocation jobs are already pending.")
+    now = datetime.now()
+    job = AllocationJob(
+        id=uuid.uuid4().hex,
+        status="queued",
+        request_json=request.model_dump_json(),
+        created_at=now,
+        owner=_OWNER,
+        heartbeat_at=now,
+    )
+    db.add(job)
+    db.commit()
+    _start_heartbeat()
+    _dispatch(job.id)
+    return job
+
+
+def start() -> int:
+    """
+    Take over pending jobs whose owner is gone and start the heartbeat
+    (which keeps taking them over); returns how many were taken at once.
+    """
+    _stopping.clear()
+    taken = reclaim()
+    _start_heartbeat()
+    return taken
+
+
+def stop() -> None:
+    """Stop the heartbeat and release this process's pending jobs, so the next backend takes them over at once."""
+    global _heartbeat, _pool
+    _stopping.set()
+    with _lock:
+        thread, _heartbeat = _heartbeat, None
+        pool, _pool = _pool, None
+    if thread is not None:
+        thread.join()
+    # Released before the pool stops, so cancelled and abandoned runs can no longer write to their rows
+    with SessionLocal() as db:
+        db.execute(
+            update(AllocationJob)
+            .where(AllocationJob.owner == _OWNER, AllocationJob.status.in_(PENDING))
+            .values(owner=None, heartbeat_at=None)
+        )
+        db.commit()
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def reclaim() -> int:
+    """Re-queue and dispatch pending jobs whose owner is gone; returns how many."""
+    now = datetime.now()
+    with SessionLocal() as db:
+        candidates = (
+            db.query(AllocationJob.id, AllocationJob.owner, AllocationJob.heartbeat_at)
+            .filter(
+                AllocationJob.status.in_(PENDING),
+                or_(AllocationJob.owner.is_(None), AllocationJob.owner != _OWNER),
+            )
+            .order_by(AllocationJob.created_at)
+            .all()
+        )
+        job_ids = []
+        for job_id, owner, heartbeat_at in candidates:
+            if not _owner_gone(owner, heartbeat_at, now):
+                continue
+            # Only if no other backend took it over since it was read
+            taken = db.execute(
+                update(AllocationJob)
+                .where(
+                    AllocationJob.id == job_id,
+                    AllocationJob.status.in_(PENDING),
+                    AllocationJob.owner.is_(None) if owner is None else AllocationJob.owner == owner,
+                    AllocationJob.heartbeat_at.is_(None) if heartbeat_at is None
+                    else AllocationJob.heartbeat_at == heartbeat_at,
+                )
+                .values(status="queued", tasks_done=0, started_at=None, owner=_OWNER, heartbeat_at=now)
+            ).rowcount
+            db.commit()
+            if taken:
+                job_ids.append(job_id)
+    for job_id in job_ids:
+        _dispatch(job_id)
+    return len(job_ids)
+
+
+def job_status(job: AllocationJob) -> AllocationJobStatus:
+    """API view of a job row, with its result once done."""
+    result = None
+    if job.result_json is not None:
+        result = AllocateResponse.model_validate_json(job.result_json)
+        result.run_id = job.run_id
+    return AllocationJobStatus(
+        job_id=job.id,
+        status=job.status,
+        tasks_done=job.tasks_done,
+        tasks_total=job.tasks_total,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        result=result,
+    )
+
+
+def events(job_id: str) -> Iterator[str]:
+    """
+    Server-Sent Events following a job: "progress" (the status without the
+    result) whenever it changes, then one "done" or "failed" event with the
+    full status. The stream ends with an "error" event ({"detail"}) instead
+    if the job's row is deleted, or if the job has had no live owner for
+    ALLOCATION_JOB_STALE_SECONDS, so no backend took it over. Between events
+    a comment line is sent every _EVENTS_KEEPALIVE seconds; writing it is
+    how the server notices a client that has gone.
+    """
+    # Own session: the stream outlives the request that opened it
+    with SessionLocal() as db:
+        last = None
+        orphaned_since = None
+        sent = time.monotonic()
+        while True:
+            job = db.get(AllocationJob, job_id, populate_existing=True)
+            if job is None:
+                yield _sse("error", json.dumps({"detail": f"Allocation job {job_id} was deleted."}))
+                return
+            if job.status in FINISHED:
+                yield _sse(job.status, job_status(job).model_dump_json())
+                return
+            now = time.monotonic()
+            if not _owner_gone(job.owner, job.heartbeat_at, datetime.now()):
+                orphaned_since = None
+            elif orphaned_since is None:
+                orphaned_since = now
+            elif now - orphaned_since > settings.ALLOCATION_JOB_STALE_SECONDS:
+                detail = f"Allocation job {job_id} has no running backend to finish it."
+                yield _sse("error", json.dumps({"detail": detail}))
+                return
+            state = (job.status, job.tasks_done, job.tasks_total)
+            if state != last:
+                last = state
+                sent = now
+                yield _sse("progress", job_status(job).model_dump_json())
+            elif now - sent >= _EVENTS_KEEPALIVE:
+                sent = now
+                yield ": keep-alive\n\n"
+            # Not holding a read transaction open between polls
+            db.commit()
+            time.sleep(_EVENTS_POLL_INTERVAL)
+
+
+def _sse(kind: str, data: str) -> str:
+    return f"event: {kind}\ndata: {data}\n\n"
+
+
+# ---------------------------------------------------------------------------
+# Ownership (backend process)
+# ---------------------------------------------------------------------------
+
+
+def _owner_gone(owner: str | None, heartbeat_at: datetime | None, now: datetime) -> bool:
+    """Whether the backend process that owns a pending job has certainly stopped."""
+    if owner == _OWNER:
+        return False
+    if owner is None or heartbeat_at is None:
+        # Released by stop(), or queued before jobs had owners
+        return True
+    if now - heartbeat_at > timedelta(seconds=settings.ALLOCATION_JOB_STALE_SECONDS):
+        return True
+    host, pid, _ = owner.rsplit(":", 2)
+    if host != _HOST or os.name != "posix":
+        # A live heartbeat is all there is to go on (os.kill would terminate the process on Windows)
+        return False
+    if int(pid) == os.getpid():
+        # An earlier process with this pid, e.g. the last run of this container
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _start_heartbeat() -> None:
+    global _heartbeat
+    with _lock:
+        if _heartbeat is None or not _heartbeat.is_alive():
+            _heartbeat = threading.Thread(target=_beat, name="allocation-job-heartbeat", daemon=True)
+            _heartbeat.start()
+
+
+def _beat() -> None:
+    """Refresh this process's jobs' heartbeat and take over orphaned jobs until stop()."""
+    while not _stopping.wait(settings.ALLOCATION_JOB_STALE_SECONDS / 3):
+        try:
+            with SessionLocal() as db:
+                db.execute(
+                    update(AllocationJob)
+                    .where(AllocationJob.owner == _OWNER, AllocationJob.status.in_(PENDING))
+                    .values(heartbeat_at=datetime.now())
+                )
+                db.commit()
+            reclaim()
+        except Exception:
+            # A missed beat is retried on the next one; the thread must outlive DB hiccups
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Dispatch (backend process)
+# ---------------------------------------------------------------------------
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn: workers open their own DB engine instead of sharing ours
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.ALLOCATION_JOB_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _dispatch(job_id: str) -> None:
+    future = _executor().submit(_run_job, job_id, _OWNER, _kb_file())
+    future.add_done_callback(lambda f: _on_done(job_id, f))
+
+
+def _kb_file() -> tuple[str, tuple | None] | None:
+    """This process's KB snapshot file and its DB fingerprint, for the worker to map (None without one)."""
+    if not settings.KB_CACHE_ENABLED:
+        return None
+    try:
+        with SessionLocal() as db:
+            return kb_cache.snapshot_file(db)
+    except OSError:
+        # The worker loads the KB from the database instead
+        return None
+
+
+def _on_done(job_id: str, future: Future) -> None:
+    global _pool
+    try:
+        _, stored, applied = future.result()
+    except Exception as exc:
+        # The worker died (the job records its own errors); a broken pool is replaced on next use
+        with _lock:
+            if _pool is not None and getattr(_pool, "_broken", False):
+                _pool = None
+        with SessionLocal() as db:
+            db.execute(
+                update(AllocationJob)
+                .where(AllocationJob.id == job_id, AllocationJob.owner == _OWNER, AllocationJob.status.in_(PENDING))
+                .values(status="failed", error=f"Worker failed: {exc!r}", finished_at=datetime.now())
+            )
+            db.commit()
+        return
+    if applied:
+        # The worker's commit happened in another process
+        kb_cache.invalidate()
+    if stored is not None and run_store.enabled():
+        _set(job_id, _OWNER, run_id=run_store.put(stored))
+
+
+def _set(job_id: str, owner: str, **values: Any) -> int:
+    """Update the job row in its own session while owner still owns it; returns the number of rows changed."""
+    with SessionLocal() as db:
+        changed = db.execute(
+            update(AllocationJob).where(AllocationJob.id == job_id, AllocationJob.owner == owner).values(**values)
+        ).rowcount
+        db.commit()
+    return changed
+
+
+# ---------------------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------------------
+
+
+def _run_job(job_id: str, owner: str, kb_file: tuple[str, tuple | None] | None = None) -> tuple[str, Any, bool]:
+    """
+    Run one job for its owner; returns (job id, its stored run or None,
+    whether it wrote assignments). kb_file is the backend's snapshot file
+    and the DB fingerprint it was taken at (see kb_cache.adopt).
+    """
+    # Claim the job, so a job dispatched twice runs once
+    with SessionLocal() as db:
+        claimed = db.execute(
+            update(AllocationJob)
+            .where(AllocationJob.id == job_id, AllocationJob.owner == owner, AllocationJob.status == "queued")
+            .values(status="running", started_at=datetime.now())
+        ).rowcount
+        db.commit()
+        job = db.get(AllocationJob, job_id) if claimed else None
+        request_json = job.request_json if job is not None else None
+    if request_json is None:
+        return job_id, None, False
+
+    # The backend's KB as of dispatch, which has seen its own and its workers'
+    # writes; without it, drop whatever this worker cached for an earlier job
+    if kb_file is None:
+        kb_cache.invalidate()
+    else:
+        try:
+            kb_cache.adopt(*kb_file)
+        except (OSError, ValueError):
+            kb_cache.invalidate()
+    last_write = 0.0
+
+    def progress(done: int, total: int) -> None:
+        nonlocal last_write
+        now = time.monotonic()
+        if done in (0, total) or now - last_write >= _PROGRESS_INTERVAL:
+            last_write = now
+            _set(job_id, owner, tasks_done=done, tasks_total=total)
+
+    try:
+        request = AllocateRequest.model_validate_json(request_json)
+        with SessionLocal() as db:
+            response = run_allocation(db, request, progress=progress)
+    except Exception as exc:
+        _set(job_id, owner, status="failed", error=f"{type(exc).__name__}: {exc}", finished_at=datetime.now())
+        return job_id, None, False
+
+    stored = run_store.pop(response.run_id) if response.run_id else None
+    response.run_id = None
+    _set(job_id, owner, status="done", result_json=response.model_dump_json(), finished_at=datetime.now())
+    return job_id, stored, request.apply and bool(response.assignments)
@@ -0,0 +1,330 @@
+"""
+Process-wide knowledge-base cache kept current by ORM write events.
+
+The cache holds one KBSnapshot of every member and task, and one
+MemberProfile (scoring features) per member, built on first use. Session
+events follow what each transaction writes, and its commit updates the
+cache:
+
+- A change of task assignees (an applied run, a task reassigned through
+  the ORM) only moves workloads. The flush recounts every member's tasks
+  with one GROUP BY inside the writing transaction, and the commit swaps
+  that workload column into the cached snapshot. Nothing is reloaded.
+- Any other write to what the snapshot holds (a member's name,
+  availability or experience, a skill or task name, inserted or deleted
+  rows, the two skill junction tables, Core DML on those tables run
+  through a session) bumps the KB version, and the next reader reloads
+  every member and task with their relations in one fresh session.
+- Updates of columns the snapshot does not hold (a task's deadline or
+  estimated time, a member's resume) leave the cache as it is.
+
+Serving the cache checks the version only, with no query. Its cost is in
+what it does not cover: a reload after any structural write is a full
+load, and a run still queries the member and task rows it selects
+(reasoning._load_run_rows); the cache saves walking their skills and
+assigned tasks and rebuilding the snapshot and profiles.
+
+Writes made outside this process (seed scripts, another backend on the
+same database) raise no events. With KB_CACHE_EXTERNAL_WRITERS on, each
+entry also records a fingerprint of the KB tables (row counts and sums of
+ids, links, assignees, experience and text lengths, read in one query once
+per session) and is reloaded when the database's fingerprint differs;
+assignee changes then reload too. An edit that keeps every one of those
+sums, such as replacing a name with another of the same length, is not
+detected from another process; call invalidate() after such writes.
+
+Snapshots are immutable (read-only columns), so a run takes a view of the
+rows it needs and builds its own engine and KnowledgeBase from it: workload
+changes made during one run never reach the cache or another run.
+
+Other processes share the snapshot through a file: snapshot_file() writes
+the current one to KB_SNAPSHOT_DIR (once per content version), and adopt()
+in a job worker memory-maps it as that worker's cache entry, served until
+the worker's KB version moves (or, with KB_CACHE_EXTERNAL_WRITERS, the
+database's fingerprint moves away from the one the file was taken at).
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session, object_session, selectinload
+
+from app.core.config import settings
+from app.db.models import Skill, Task, TeamMember, task_required_skills, team_member_skills
+from app.services.kb_snapshot import KBSnapshot, load_snapshot, write_snapshot
+from app.services.scoring import MemberProfile
+
+_KB_TABLES = frozenset(
+    t.name for t in (TeamMember.__table__, Skill.__table__, Task.__table__, team_member_skills, task_required_skills)
+)
+
+# Columns the snapshot reads, per model: updates of any other column leave the KB as it was
+_SNAPSHOT_COLUMNS = {
+    TeamMember: ("name", "calendar_availability", "years_of_experience"),
+    Skill: ("skill_name",),
+    Task: ("task_name",),
+}
+
+# Every member's workload: assigned tasks per assignee
+_WORKLOAD = (
+    select(Task.assignee_id, func.count()).where(Task.assignee_id.is_not(None)).group_by(Task.assignee_id)
+)
+
+_Entry = tuple[int, KBSnapshot, dict[int, MemberProfile], "tuple | None"]
+
+_lock = threading.Lock()
+_version = 0
+# (version it was built at, snapshot of every member and task, member profiles,
+# DB fingerprint with KB_CACHE_EXTERNAL_WRITERS, else None)
+_cached: _Entry | None = None
+# Path of the last file snapshot_file() wrote
+_written: Path | None = None
+
+
+def kb_version() -> int:
+    """Current KB version; increases whenever committed writes may have changed the KB."""
+    return _version
+
+
+def invalidate() -> None:
+    """Bump the KB version, so the next snapshot() reloads from the DB."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def snapshot(db: Session) -> KBSnapshot:
+    """Snapshot of every member and task at the current KB version."""
+    return _current(db)[1]
+
+
+def member_profiles(db: Session) -> dict[int, MemberProfile]:
+    """MemberProfile of every member at the current KB version (shared; do not mutate)."""
+    return _current(db)[2]
+
+
+def snapshot_file(db: Session) -> tuple[str, tuple | None]:
+    """
+    Path of a file holding the current snapshot (see adopt()), and the DB
+    fingerprint the snapshot was taken at (None without
+    KB_CACHE_EXTERNAL_WRITERS). Files are named by the
+    snapshot's content version, so an unchanged KB is written once; the
+    previous file is removed when a new one is written.
+    """
+    global _written
+    _, snap, _, fingerprint = _current(db)
+    directory = Path(settings.KB_SNAPSHOT_DIR or tempfile.gettempdir())
+    path = directory / f"kraft-kb-{snap.version}.snap"
+    with _lock:
+        if path != _written or not path.exists():
+            directory.mkdir(parents=True, exist_ok=True)
+            write_snapshot(snap, path)
+            previous, _written = _written, path
+            if previous is not None and previous != path:
+                try:
+                    # Workers that mapped it keep their mapping (POSIX)
+                    os.unlink(previous)
+                except OSError:
+                    pass
+    return str(path), fingerprint
+
+
+def adopt(path: str, fingerprint: tuple | None) -> None:
+    """
+    Serve the snapshot file written by snapshot_file() in another process as
+    this process's cache entry, until this process's KB version moves (and,
+    with KB_CACHE_EXTERNAL_WRITERS, while the DB fingerprint is still
+    fingerprint). Raises OSError or ValueError if the file cannot be read.
+    """
+    global _cached, _version
+    snap = load_snapshot(path)
+    entry_profiles = snap.member_profiles()
+    with _lock:
+        _version += 1
+        _cached = (_version, snap, entry_profiles, fingerprint)
+
+
+def _fingerprint_query() -> Any:
+    """One row of aggregates over the KB tables that any committed write to the snapshot's inputs changes."""
+    m, t, s = TeamMember.__table__.c, Task.__table__.c, Skill.__table__.c
+    ms, ts = team_member_skills.c, task_required_skills.c
+
+    def length(col: Any) -> Any:
+        # -1 for NULL, so setting a value to '' is a change too
+        return func.coalesce(func.length(col), -1)
+
+    aggregates = [
+        (TeamMember.__table__, [
+            func.count(), func.sum(m.id), func.sum(m.id * length(m.name)),
+            func.sum(m.id * length(m.calendar_availability)),
+            func.sum(m.id * func.coalesce(m.years_of_experience, -1)),
+        ]),
+        (Task.__table__, [
+            func.count(), func.sum(t.id), func.sum(t.id * length(t.task_name)),
+            func.sum(func.coalesce(t.assignee_id, 0)), func.sum(t.id * func.coalesce(t.assignee_id, 0)),
+        ]),
+        (Skill.__table__, [func.count(), func.sum(s.id), func.sum(s.id * length(s.skill_name))]),
+        (team_member_skills, [
+            func.count(), func.sum(ms.team_member_id * ms.skill_id),
+            func.sum(ms.team_member_id + ms.skill_id * ms.skill_id),
+        ]),
+        (task_required_skills, [
+            func.count(), func.sum(ts.task_id * ts.skill_id), func.sum(ts.task_id + ts.skill_id * ts.skill_id),
+        ]),
+    ]
+    return select(*(select(agg).select_from(table).scalar_subquery() for table, aggs in aggregates for agg in aggs))
+
+
+_FINGERPRINT = _fingerprint_query()
+
+
+def _db_fingerprint(session: Session) -> tuple:
+    return tuple(session.execute(_FINGERPRINT).one())
+
+
+def _current(db: Session) -> _Entry:
+    """
+    The cache entry for the current KB version (and, with
+    KB_CACHE_EXTERNAL_WRITERS, DB fingerprint). The fingerprint is read once
+    per session of db's (until it commits or rolls back) in a fresh session
+    on db's bind, so db's own uncommitted writes never count. A miss loads
+    the rows in such a session too (relations eagerly), so objects already
+    in db's identity map, and its pending changes, are never read.
+    """
+    global _cached
+    with _lock:
+        version, cached = _version, _cached
+    fingerprint = None
+    if settings.KB_CACHE_EXTERNAL_WRITERS:
+        seen = db.info.get("kb_fingerprint")
+        if seen is None or seen[0] != version:
+            with Session(bind=db.get_bind()) as check:
+                seen = (version, _db_fingerprint(check))
+            db.info["kb_fingerprint"] = seen
+        fingerprint = seen[1]
+    if cached is not None and cached[0] == version and (fingerprint is None or cached[3] == fingerprint):
+        return cached
+    # version and fingerprint were read before the rows: a commit landing
+    # mid-load changes one of them, so an entry that may have missed that
+    # commit is never served as current.
+    with Session(bind=db.get_bind()) as load:
+        members = (
+            load.query(TeamMember)
+            .options(selectinload(TeamMember.skills), selectinload(TeamMember.assigned_tasks))
+            .order_by(TeamMember.id)
+            .all()
+        )
+        tasks = load.query(Task).options(selectinload(Task.required_skills)).order_by(Task.id).all()
+        snap = KBSnapshot.from_orm(members, tasks).frozen()
+        entry = (version, snap, snap.member_profiles(), fingerprint)
+    with _lock:
+        if _cached is None or _cached[0] <= version:
+            _cached = entry
+    return entry
+
+
+def view(db: Session, members: list[TeamMember], tasks: list[Task]) -> KBSnapshot:
+    """
+    The cached snapshot's rows for members and tasks, in the order given:
+    the same KB that KBSnapshot.from_orm(members, tasks) builds, without
+    walking their relations.
+    """
+    return snapshot(db).subset([m.id for m in members], [t.id for t in tasks])
+
+
+# ---------------------------------------------------------------------------
+# Versioning: follow what each session writes, update the cache on commit
+# ---------------------------------------------------------------------------
+
+
+def _mark(session: Session | None) -> None:
+    if session is not None:
+        session.info["kb_dirty"] = True
+
+
+def _on_row_write(mapper: Any, connection: Any, target: Any) -> None:
+    _mark(object_session(target))
+
+
+def _on_row_update(mapper: Any, connection: Any, target: Any) -> None:
+    state = inspect(target)
+    if any(state.attrs[key].history.has_changes() for key in _SNAPSHOT_COLUMNS[mapper.class_]):
+        _mark(state.session)
+    elif mapper.class_ is Task and state.attrs.assignee_id.history.has_changes():
+        if settings.KB_CACHE_EXTERNAL_WRITERS:
+            # The entry's fingerprint would no longer match anyway
+            _mark(state.session)
+        else:
+            state.session.info["kb_assignees"] = True
+
+
+def _on_collection_change(target: Any, value: Any, initiator: Any) -> None:
+    _mark(object_session(target))
+
+
+def _on_execute(orm_execute_state: Any) -> None:
+    """Bulk and Core DML run through a session (e.g. insert(team_member_skills))."""
+    state = orm_execute_state
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is None or getattr(table, "name", None) in _KB_TABLES:
+            _mark(state.session)
+
+
+def _on_flush(session: Session, flush_context: Any) -> None:
+    """
+    After a flush that moved task assignees: every member's workload as the
+    writing transaction sees it, and the cache entry current at that point
+    (the one the workloads may be swapped into on commit).
+    """
+    if session.info.pop("kb_assignees", False) and not session.info.get("kb_dirty"):
+        workload = dict(session.execute(_WORKLOAD).all())
+        with _lock:
+            base = _cached if _cached is not None and _cached[0] == _version else None
+        session.info["kb_workload"] = (base, workload)
+
+
+def _on_commit(session: Session) -> None:
+    session.info.pop("kb_fingerprint", None)
+    workload = session.info.pop("kb_workload", None)
+    if session.info.pop("kb_dirty", False):
+        invalidate()
+    elif workload is not None:
+        _apply_workload(*workload)
+
+
+def _on_rollback(session: Session) -> None:
+    for key in ("kb_dirty", "kb_fingerprint", "kb_assignees", "kb_workload"):
+        session.info.pop(key, None)
+
+
+def _apply_workload(base: _Entry | None, workload: dict[int, int]) -> None:
+    """
+    Bump the KB version; if base is still the entry served (no other commit
+    or reload came between the flush and this commit), serve it from now on
+    with workload as its member workloads instead of reloading it.
+    """
+    global _cached, _version
+    with _lock:
+        _version += 1
+        if base is not None and _cached is base and base[0] == _version - 1:
+            _cached = (_version, base[1].with_workload(workload).frozen(), base[2], None)
+
+
+for _model in (TeamMember, Skill, Task):
+    event.listen(_model, "after_insert", _on_row_write)
+    event.listen(_model, "after_update", _on_row_update)
+    event.listen(_model, "after_delete", _on_row_write)
+for _collection in (TeamMember.skills, Task.required_skills, Skill.team_members, Skill.tasks):
+    event.listen(_collection, "append", _on_collection_change)
+    event.listen(_collection, "remove", _on_collection_change)
+event.listen(Session, "do_orm_execute", _on_execute)
+event.listen(Session, "after_flush_postexec", _on_flush)
+event.listen(Session, "after_commit", _on_commit)
+event.listen(Session, "after_rollback", _on_rollback)
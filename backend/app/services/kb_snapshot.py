@@ -0,0 +1,265 @@
+"""
+Compact, versioned snapshots of the allocation knowledge base.
+
+A snapshot holds what build_engine_from_kb and build_knowledge_base read from
+the ORM objects: member and task ids, workloads, availability, the
+member→skill and task→skill relations and the display names, plus each
+member's years of experience and availability slot count (the rest of its
+MemberProfile). Relations are stored as int64 columns in CSR form (a
+row-start column plus one flat id column), so a snapshot taken once can be
+subset and shared between runs, and one written with write_snapshot() can be
+memory-mapped by load_snapshot() in another process and its columns used in
+place, without re-walking every member's skills and assigned tasks through
+SQLAlchemy.
+
+`version` is a digest of the snapshot's contents: any DB change that alters
+the knowledge base gives a different version, and equal versions mean equal
+knowledge bases.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import struct
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Sequence
+
+from app.services.scoring import MemberProfile, availability_slot_count
+
+if TYPE_CHECKING:
+    from app.db.models import Task, TeamMember
+
+SNAPSHOT_MAGIC = b"KRAFTKB\0"
+SNAPSHOT_FORMAT = 1
+
+# Integer columns, in file (and digest) order.
+_COLUMNS = (
+    "member_id",
+    "member_workload",
+    "member_available",
+    "member_years",
+    "member_slots",
+    "member_skill_start",
+    "member_skill",
+    "task_id",
+    "task_skill_start",
+    "task_skill",
+)
+
+# magic, format, version digest, names blob length, then one length per column
+_HEADER = struct.Struct(f"<8sI16sQ{len(_COLUMNS)}Q")
+
+
+@dataclass
+class KBSnapshot:
+    """
+    Column-oriented knowledge base. Member and task rows keep the order they
+    were loaded in (the engine's answer order depends on it); the skills of
+    member i are member_skill[member_skill_start[i]:member_skill_start[i + 1]].
+    Columns are arrays after from_orm() and subset(), and read-only
+    memoryviews after frozen() and load_snapshot() (over the mapped file).
+    """
+
+    version: str
+    member_id: Sequence[int]
+    member_workload: Sequence[int]
+    member_available: Sequence[int]
+    member_years: Sequence[int]
+    member_slots: Sequence[int]
+    member_skill_start: Sequence[int]
+    member_skill: Sequence[int]
+    task_id: Sequence[int]
+    task_skill_start: Sequence[int]
+    task_skill: Sequence[int]
+    member_name: list[str]
+    task_name: list[str]
+    # Names of the skills the tasks require, as (skill_id, name) pairs
+    skill_name: list[tuple[int, str]]
+
+    @classmethod
+    def from_orm(cls, members: list["TeamMember"], tasks: list["Task"]) -> "KBSnapshot":
+        """Snapshot of the given members and tasks, in the order given."""
+        cols: dict[str, array] = {name: array("q") for name in _COLUMNS}
+        cols["member_skill_start"].append(0)
+        cols["task_skill_start"].append(0)
+        skill_name: dict[int, str] = {}
+        for m in members:
+            cols["member_id"].append(m.id)
+            cols["member_workload"].append(len(m.assigned_tasks) if hasattr(m, "assigned_tasks") and m.assigned_tasks else 0)
+            cols["member_available"].append(1 if m.calendar_availability else 0)
+            cols["member_years"].append(m.years_of_experience or 0)
+            cols["member_slots"].append(availability_slot_count(m.calendar_availability))
+            cols["member_skill"].extend(s.id for s in m.skills)
+            cols["member_skill_start"].append(len(cols["member_skill"]))
+        for t in tasks:
+            cols["task_id"].append(t.id)
+            # In id order, so explanations list a task's skills the same however its rows were loaded
+            for s in sorted(t.required_skills, key=lambda s: s.id):
+                cols["task_skill"].append(s.id)
+                skill_name[s.id] = s.skill_name
+            cols["task_skill_start"].append(len(cols["task_skill"]))
+        names = {
+            "member_name": [m.name for m in members],
+            "task_name": [t.task_name for t in tasks],
+            "skill_name": list(skill_name.items()),
+        }
+        blob = _encode_names(names)
+        return cls(version=_digest(cols, blob).hex(), **cols, **names)
+
+    def frozen(self) -> "KBSnapshot":
+        """This snapshot with read-only columns, safe to share between runs."""
+        cols = {name: _as_view(getattr(self, name)).toreadonly() for name in _COLUMNS}
+        return KBSnapshot(
+            version=self.version,
+            member_name=list(self.member_name),
+            task_name=list(self.task_name),
+            skill_name=list(self.skill_name),
+            **cols,
+        )
+
+    def subset(self, member_ids: Sequence[int], task_ids: Sequence[int]) -> "KBSnapshot":
+        """
+        Snapshot of the given members and tasks, in the order given (ids not
+        in this snapshot are skipped). Equal to from_orm() over the same rows.
+        """
+        member_row = {mid: i for i, mid in enumerate(self.member_id)}
+        task_row = {tid: i for i, tid in enumerate(self.task_id)}
+        known_skills = dict(self.skill_name)
+        cols: dict[str, array] = {name: array("q") for name in _COLUMNS}
+        cols["member_skill_start"].append(0)
+        cols["task_skill_start"].append(0)
+        member_name: list[str] = []
+        task_name: list[str] = []
+        skill_name: dict[int, str] = {}
+        for mid in member_ids:
+            i = member_row.get(mid)
+            if i is None:
+                continue
+            cols["member_id"].append(mid)
+            cols["member_workload"].append(self.member_workload[i])
+            cols["member_available"].append(self.member_available[i])
+            cols["member_years"].append(self.member_years[i])
+            cols["member_slots"].append(self.member_slots[i])
+            cols["member_skill"].extend(self.member_skills(i))
+            cols["member_skill_start"].append(len(cols["member_skill"]))
+            member_name.append(self.member_name[i])
+        for tid in task_ids:
+            i = task_row.get(tid)
+            if i is None:
+                continue
+            cols["task_id"].append(tid)
+            for sid in self.task_skills(i):
+                cols["task_skill"].append(sid)
+                skill_name[sid] = known_skills[sid]
+            cols["task_skill_start"].append(len(cols["task_skill"]))
+            task_name.append(self.task_name[i])
+        names = {"member_name": member_name, "task_name": task_name, "skill_name": list(skill_name.items())}
+        return KBSnapshot(version=_digest(cols, _encode_names(names)).hex(), **cols, **names)
+
+    def with_workload(self, workload: dict[int, int]) -> "KBSnapshot":
+        """
+        This snapshot with each member's workload taken from workload (member
+        id -> assigned tasks; members not in it have none). The other columns
+        are shared; equal to from_orm() over the rows with those workloads.
+        """
+        cols = {name: getattr(self, name) for name in _COLUMNS}
+        cols["member_workload"] = array("q", (workload.get(mid, 0) for mid in self.member_id))
+        names = {"member_name": self.member_name, "task_name": self.task_name, "skill_name": self.skill_name}
+        return KBSnapshot(version=_digest(cols, _encode_names(names)).hex(), **cols, **names)
+
+    def member_profiles(self) -> dict[int, MemberProfile]:
+        """MemberProfile of every member, equal to MemberProfile.from_member() over its row."""
+        return {
+            mid: MemberProfile(self.member_years[i], self.member_slots[i], frozenset(self.member_skills(i)))
+            for i, mid in enumerate(self.member_id)
+        }
+
+    def member_skills(self, i: int) -> Sequence[int]:
+        """Skill ids of the i-th member."""
+        return self.member_skill[self.member_skill_start[i] : self.member_skill_start[i + 1]]
+
+    def task_skills(self, i: int) -> Sequence[int]:
+        """Required skill ids of the i-th task."""
+        return self.task_skill[self.task_skill_start[i] : self.task_skill_start[i + 1]]
+
+
+def write_snapshot(snapshot: KBSnapshot, path: str | Path) -> None:
+    """Write snapshot to path (replacing it atomically, so readers never see a partial file)."""
+    blob = _encode_names(
+        {"member_name": snapshot.member_name, "task_name": snapshot.task_name, "skill_name": snapshot.skill_name}
+    )
+    columns = [_as_bytes(getattr(snapshot, name)) for name in _COLUMNS]
+    header = _HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_FORMAT,
+        bytes.fromhex(snapshot.version),
+        len(blob),
+        *(len(c) // 8 for c in columns),
+    )
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for c in columns:
+            f.write(c)
+        f.write(blob)
+    tmp.replace(path)
+
+
+def load_snapshot(path: str | Path) -> KBSnapshot:
+    """
+    Memory-map a snapshot written by write_snapshot(). Integer columns are
+    views into the mapping (nothing is copied until read); only the names
+    are decoded up front. Raises ValueError for a file that is not a
+    snapshot or was written in another format.
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+        if size < _HEADER.size:
+            raise ValueError(f"{path}: not a knowledge-base snapshot")
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, fmt, version, blob_len, *lengths = _HEADER.unpack_from(buf)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path}: not a knowledge-base snapshot")
+    if fmt != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path}: snapshot format {fmt}, expected {SNAPSHOT_FORMAT}")
+    if _HEADER.size + 8 * sum(lengths) + blob_len != size:
+        raise ValueError(f"{path}: truncated knowledge-base snapshot")
+    view = memoryview(buf)
+    cols: dict[str, Any] = {}
+    offset = _HEADER.size
+    for name, n in zip(_COLUMNS, lengths):
+        cols[name] = view[offset : offset + 8 * n].cast("q")
+        offset += 8 * n
+    names = json.loads(bytes(view[offset : offset + blob_len]))
+    names["skill_name"] = [(sid, name) for sid, name in names["skill_name"]]
+    return KBSnapshot(version=version.hex(), **cols, **names)
+
+
+def _encode_names(names: dict[str, Any]) -> bytes:
+    return json.dumps(names, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _as_bytes(column: Sequence[int]) -> bytes:
+    return _as_view(column).tobytes()
+
+
+def _as_view(column: Sequence[int]) -> memoryview:
+    if isinstance(column, memoryview):
+        return column
+    return memoryview(column if isinstance(column, array) else array("q", column))
+
+
+def _digest(cols: dict[str, Any], blob: bytes) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(struct.pack("<I", SNAPSHOT_FORMAT))
+    for name in _COLUMNS:
+        data = cols[name].tobytes()
+        h.update(struct.pack("<Q", len(data)))
+        h.update(data)
+    h.update(blob)
+    return h.digest()
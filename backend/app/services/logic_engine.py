@@ -4,12 +4,30 @@ Minimal backward-chaining logic engine for FOPC-style inference.
 Facts and rules are declarative; the engine performs unification and
 resolution. No procedural encoding of rule logic — the engine interprets
 rule structures generically.
+
+Two engine modes give the same answers:
+- "interpret": walks the Goal tree on every proof (reference implementation).
+- "compiled": each rule body is compiled once, in add_rule, into closures over
+  a flat frame of variable slots, so proofs allocate no goal trees.
+
+With `tabling=True` answers to derived-predicate goals are cached per goal
+variant and dropped only when a predicate they depend on changes.
+
+materialize() instead evaluates every derived predicate bottom-up
+(semi-naive, stratified), after which goals on them are relation lookups.
+assert_fact/retract_fact keep materialized relations current incrementally.
+
+With `bitset_kernel=True`, ∀ goals of the subset shape
+∀S: p(X, S) ⇒ q(Y, S) over base facts are decided by one bitmask test.
 """
 
 from __future__ import annotations
 
+import random
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass, field
-from typing import Any, Callable, Iterator
+from time import perf_counter
+from typing import Any, Callable, ContextManager, Iterable, Iterator
 
 
 @dataclass(frozen=True)
@@ -53,141 +71,1805 @@ class NegGoal(Goal):
 
 @dataclass(frozen=True)
 class ForallGoal(Goal):
-    """Goal: forall X in domain, prove body(X)."""
+    """
+    Goal: forall X in domain, prove body(X).
+
+    domain is either a FactGoal antecedent whose solutions bind X
+    (∀S: requires_skill(T, S) ⇒ ...) or a callable(engine, subst) yielding
+    values. Prefer the FactGoal form: the engine can see which predicate it
+    reads, whereas a callable is treated as depending on every predicate.
+    """
 
     var: Var
-    domain: Callable[["LogicEngine", dict[str, Any]], Iterator[Any]]
+    domain: "FactGoal | Callable[[LogicEngine, dict[str, Any]], Iterator[Any]]"
     body: Goal
 
 
+def goal_predicates(goal: Goal) -> set[str] | None:
+    """Predicates a goal reads, or None if it has an opaque (callable) domain."""
+    if isinstance(goal, FactGoal):
+        return {goal.pred}
+    if isinstance(goal, ConjGoal):
+        preds: set[str] = set()
+        for g in goal.goals:
+            sub = goal_predicates(g)
+            if sub is None:
+                return None
+            preds |= sub
+        return preds
+    if isinstance(goal, NegGoal):
+        return goal_predicates(goal.goal)
+    if isinstance(goal, ForallGoal):
+        if not isinstance(goal.domain, FactGoal):
+            return None
+        body = goal_predicates(goal.body)
+        return None if body is None else body | {goal.domain.pred}
+    return set()
+
+
+def _polarity_predicates(
+    goal: Goal,
+    positive: set[str],
+    negative: set[str],
+    negated: bool = False,
+) -> None:
+    """
+    Split the predicates a goal reads into positive and negative occurrences.
+    ∀X: A ⇒ B is ¬∃X: A ∧ ¬B, so both sides of a ForallGoal count as negative.
+    """
+    if isinstance(goal, FactGoal):
+        (negative if negated else positive).add(goal.pred)
+    elif isinstance(goal, ConjGoal):
+        for g in goal.goals:
+            _polarity_predicates(g, positive, negative, negated)
+    elif isinstance(goal, NegGoal):
+        _polarity_predicates(goal.goal, positive, negative, True)
+    elif isinstance(goal, ForallGoal):
+        if isinstance(goal.domain, FactGoal):
+            negative.add(goal.domain.pred)
+        _polarity_predicates(goal.body, positive, negative, True)
+
+
+def _conjuncts(goal: Goal) -> list[Goal]:
+    """Flatten nested ConjGoals into a list of conjuncts."""
+    if isinstance(goal, ConjGoal):
+        return [c for g in goal.goals for c in _conjuncts(g)]
+    return [goal]
+
+
+def _var_names(goal: Goal) -> set[str]:
+    names: dict[str, None] = {}
+    _collect_var_names(goal, names)
+    return set(names)
+
+
+def _check_range_restricted(head_pred: str, head_var_names: list[str], body: Goal) -> None:
+    """
+    Bottom-up evaluation needs every head variable, and every variable a
+    negation or ∀ shares with the rest of the rule, to be bound by an earlier
+    positive FactGoal. Variables used only inside a negation are existential.
+    """
+    conjuncts = _conjuncts(body)
+    names = [_var_names(g) for g in conjuncts]
+    bound: set[str] = set()
+    for i, g in enumerate(conjuncts):
+        if isinstance(g, FactGoal):
+            bound |= names[i]
+            continue
+        shared = set(head_var_names).union(*(n for j, n in enumerate(names) if j != i))
+        free = names[i] & shared
+        if isinstance(g, ForallGoal):
+            free.discard(g.var.name)
+        if not free <= bound:
+            raise ValueError(
+                f"Rule {head_pred}({', '.join(head_var_names)}) is not range-restricted: "
+                f"{', '.join(sorted(free - bound))} must be bound before {type(g).__name__}"
+            )
+    missing = set(head_var_names) - bound
+    if missing:
+        raise ValueError(
+            f"Rule {head_pred}({', '.join(head_var_names)}) is not range-restricted: "
+            f"head variable(s) {', '.join(sorted(missing))} not bound by a positive goal"
+        )
+
+
+def _literal_occurrences(
+    goal: Goal,
+    hidden: frozenset[str] = frozenset(),
+) -> Iterator[tuple[FactGoal, frozenset[str]]]:
+    """
+    Every FactGoal in goal (including ∀ domains), with the names of the
+    enclosing ∀ variables, which are local to that literal's scope.
+    """
+    if isinstance(goal, FactGoal):
+        yield goal, hidden
+    elif isinstance(goal, ConjGoal):
+        for g in goal.goals:
+            yield from _literal_occurrences(g, hidden)
+    elif isinstance(goal, NegGoal):
+        yield from _literal_occurrences(goal.goal, hidden)
+    elif isinstance(goal, ForallGoal):
+        inner = hidden | {goal.var.name}
+        if isinstance(goal.domain, FactGoal):
+            yield goal.domain, inner
+        yield from _literal_occurrences(goal.body, inner)
+
+
+def _variant_key(pattern: tuple[Any, ...]) -> tuple[Any, ...]:
+    """Rename Vars in pattern to canonical names, so variant goals share a key."""
+    names: dict[str, Var] = {}
+    return tuple(
+        names.setdefault(a.name, Var(f"_{len(names)}")) if isinstance(a, Var) else a
+        for a in pattern
+    )
+
+
+class FactIndex:
+    """
+    Ground facts for one predicate, hash-indexed on bound argument positions.
+
+    The full-tuple table answers ground lookups in O(1). Indexes for partially
+    bound patterns (e.g. first argument only) are built on demand the first
+    time that binding pattern is queried, then kept in sync by add/discard.
+    Iterates like a set of tuples, so existing read-only callers still work.
+    Tables and index buckets are insertion-ordered dicts, so lookups return
+    facts in the order they were asserted.
+    """
+
+    __slots__ = ("_facts", "_indexes")
+
+    def __init__(self, facts: Iterable[tuple[Any, ...]] = ()) -> None:
+        self._facts: dict[tuple[Any, ...], None] = {}
+        self._indexes: dict[tuple[int, ...], dict[tuple[Any, ...], dict[tuple[Any, ...], None]]] = {}
+        for fact in facts:
+            self.add(fact)
+
+    def __contains__(self, fact: object) -> bool:
+        return fact in self._facts
+
+    def __iter__(self) -> Iterator[tuple[Any, ...]]:
+        return iter(self._facts)
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    def add(self, fact: tuple[Any, ...]) -> bool:
+        """Add fact; returns False if it was already present."""
+        if fact in self._facts:
+            return False
+        self._facts[fact] = None
+        for positions, index in self._indexes.items():
+            if len(fact) > positions[-1]:
+                index.setdefault(tuple(fact[i] for i in positions), {})[fact] = None
+        return True
+
+    def discard(self, fact: tuple[Any, ...]) -> bool:
+        """Remove fact if present; returns True if it was removed."""
+        if fact not in self._facts:
+            return False
+        del self._facts[fact]
+        for positions, index in self._indexes.items():
+            if len(fact) > positions[-1]:
+                key = tuple(fact[i] for i in positions)
+                bucket = index.get(key)
+                if bucket is not None:
+                    bucket.pop(fact, None)
+                    if not bucket:
+                        del index[key]
+        return True
+
+    def lookup(self, args: tuple[Any, ...]) -> Iterable[tuple[Any, ...]]:
+        """
+        Candidate facts for a pattern whose non-Var args are bound.
+        Only facts agreeing on every bound position are returned; arity is
+        not checked here (callers unify anyway).
+        """
+        positions = tuple(i for i, a in enumerate(args) if not isinstance(a, Var))
+        if not positions:
+            return self._facts
+        if len(positions) == len(args):
+            return (args,) if args in self._facts else ()
+        index = self._indexes.get(positions)
+        if index is None:
+            index = self._build_index(positions)
+        return index.get(tuple(args[i] for i in positions), ())
+
+    def distinct(self, position: int) -> int:
+        """Number of distinct values at position (a query-planning statistic)."""
+        index = self._indexes.get((position,))
+        if index is None:
+            index = self._build_index((position,))
+        return len(index)
+
+    def _build_index(self, positions: tuple[int, ...]) -> dict[tuple[Any, ...], dict[tuple[Any, ...], None]]:
+        index: dict[tuple[Any, ...], dict[tuple[Any, ...], None]] = {}
+        last = positions[-1]
+        for fact in self._facts:
+            if len(fact) > last:
+                index.setdefault(tuple(fact[i] for i in positions), {})[fact] = None
+        self._indexes[positions] = index
+        return index
+
+
+def subset_shape(goal: ForallGoal) -> tuple[str, int, Any, str, int, Any] | None:
+    """
+    Recognise ∀S: p(X, S) ⇒ q(Y, S) with binary FactGoals (S in either position).
+    Returns (p, key position in p, X, q, key position in q, Y), else None.
+    """
+    domain, body, name = goal.domain, goal.body, goal.var.name
+    if not isinstance(domain, FactGoal) or not isinstance(body, FactGoal):
+        return None
+    shape: list[Any] = []
+    for literal in (domain, body):
+        if len(literal.args) != 2:
+            return None
+        hits = [i for i, a in enumerate(literal.args) if isinstance(a, Var) and a.name == name]
+        if len(hits) != 1:
+            return None
+        key_pos = 1 - hits[0]
+        shape += [literal.pred, key_pos, literal.args[key_pos]]
+    return tuple(shape)  # type: ignore[return-value]
+
+
+class BitsetKernel:
+    """
+    Bitmask view of binary base relations for subset-shaped ∀ goals.
+
+    Values in the non-key position (e.g. skill ids) are interned to bit
+    numbers; each key (a task, a member) maps to the int mask of its values.
+    ∀S: requires_skill(T, S) ⇒ has_skill(M, S) then holds iff
+    mask(requires_skill, T) & ~mask(has_skill, M) == 0. Masks are built per
+    (predicate, key position) on first use and updated on fact changes.
+    """
+
+    __slots__ = ("_bits", "_masks")
+
+    def __init__(self) -> None:
+        self._bits: dict[Any, int] = {}
+        self._masks: dict[str, dict[int, dict[Any, int]]] = {}
+
+    def covers(self, engine: "LogicEngine", shape: tuple[str, int, Any, str, int, Any], x: Any, y: Any) -> bool:
+        """True if every value p relates to x is also related to y by q."""
+        domain_pred, domain_key, _, body_pred, body_key, _ = shape
+        need = self._masks_for(engine, domain_pred, domain_key).get(x, 0)
+        have = self._masks_for(engine, body_pred, body_key).get(y, 0)
+        return not need & ~have
+
+    def update(self, pred: str, fact: tuple[Any, ...], present: bool) -> None:
+        """Reflect an asserted (present=True) or retracted fact in built masks."""
+        by_key = self._masks.get(pred)
+        if not by_key or len(fact) != 2:
+            return
+        for key_pos, masks in by_key.items():
+            key, bit = fact[key_pos], self._bit(fact[1 - key_pos])
+            if present:
+                masks[key] = masks.get(key, 0) | bit
+            else:
+                masks[key] = masks.get(key, 0) & ~bit
+
+    def _bit(self, value: Any) -> int:
+        return 1 << self._bits.setdefault(value, len(self._bits))
+
+    def _masks_for(self, engine: "LogicEngine", pred: str, key_pos: int) -> dict[Any, int]:
+        by_key = self._masks.setdefault(pred, {})
+        masks = by_key.get(key_pos)
+        if masks is None:
+            masks = {}
+            for fact in engine.facts.get(pred, ()):
+                if len(fact) == 2:
+                    key = fact[key_pos]
+                    masks[key] = masks.get(key, 0) | self._bit(fact[1 - key_pos])
+            by_key[key_pos] = masks
+        return masks
+
+
+# ---------------------------------------------------------------------------
+# Proof instrumentation (per-predicate and per-rule counters)
+# ---------------------------------------------------------------------------
+
+class PredicateStats:
+    """
+    Proof counters for one predicate. seconds is wall time spent producing
+    its answers, including time in the subgoals of its rules.
+    """
+
+    __slots__ = ("goals", "unifications", "facts_scanned", "rule_expansions", "table_hits", "seconds")
+
+    def __init__(self) -> None:
+        self.goals = 0
+        self.unifications = 0
+        self.facts_scanned = 0
+        self.rule_expansions = 0
+        self.table_hits = 0
+        self.seconds = 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RuleStats:
+    """Counters for one rule: bodies entered, head answers produced, wall time."""
+
+    __slots__ = ("expansions", "answers", "seconds")
+
+    def __init__(self) -> None:
+        self.expansions = 0
+        self.answers = 0
+        self.seconds = 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class EngineStats:
+    """
+    Opt-in proof instrumentation: LogicEngine(stats=EngineStats()).
+
+    Counters are kept per predicate and per rule (labelled "pred#k" for the
+    k-th rule of pred). Each top-level call (prove and the queries built on
+    it, materialize, assert_fact/retract_fact maintenance) is one query;
+    with sample_rate < 1 only that fraction of queries is recorded, and the
+    engine skips instrumentation entirely for the rest.
+    """
+
+    __slots__ = ("sample_rate", "queries", "sampled", "predicates", "rules", "_random")
+
+    def __init__(self, sample_rate: float = 1.0, seed: int | None = None) -> None:
+        self.sample_rate = sample_rate
+        self.queries = 0
+        self.sampled = 0
+        self.predicates: dict[str, PredicateStats] = {}
+        self.rules: dict[str, RuleStats] = {}
+        self._random = random.Random(seed)
+
+    def sample(self) -> bool:
+        """Count a query and decide whether to record it."""
+        self.queries += 1
+        if self.sample_rate >= 1 or self._random.random() < self.sample_rate:
+            self.sampled += 1
+            return True
+        return False
+
+    def predicate(self, pred: str) -> PredicateStats:
+        entry = self.predicates.get(pred)
+        if entry is None:
+            entry = self.predicates[pred] = PredicateStats()
+        return entry
+
+    def rule(self, pred: str, k: int) -> RuleStats:
+        label = f"{pred}#{k}"
+        entry = self.rules.get(label)
+        if entry is None:
+            entry = self.rules[label] = RuleStats()
+        return entry
+
+    def goal(self, pred: str, answers: Callable[[], Iterable[Any]]) -> Iterator[Any]:
+        """
+        One goal on pred: counts it, each answer tried, and the time spent
+        producing them, including the answers() call (which may fill a table).
+        """
+        entry = self.predicate(pred)
+        entry.goals += 1
+        return _timed(entry, _deferred(answers), "unifications")
+
+    def expand(self, pred: str, k: int, answers: Iterable[Any]) -> Iterator[Any]:
+        """One application of pred's k-th rule, yielding its answers."""
+        self.predicate(pred).rule_expansions += 1
+        entry = self.rule(pred, k)
+        entry.expansions += 1
+        return _timed(entry, answers, "answers")
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "queries": self.queries,
+            "sampled": self.sampled,
+            "predicates": {pred: entry.as_dict() for pred, entry in self.predicates.items()},
+            "rules": {label: entry.as_dict() for label, entry in self.rules.items()},
+        }
+
+
+_NOT_SAMPLED = nullcontext()
+
+
+def _deferred(answers: Callable[[], Iterable[Any]]) -> Iterator[Any]:
+    yield from answers()
+
+
+def _timed(entry: PredicateStats | RuleStats, items: Iterable[Any], counter: str | None) -> Iterator[Any]:
+    """
+    Yield items, adding the time spent producing them (not the consumer's
+    time between items) to entry.seconds and counting each in entry.<counter>.
+    """
+    start: float | None = perf_counter()
+    try:
+        for item in items:
+            entry.seconds += perf_counter() - start  # type: ignore[operator]
+            if counter is not None:
+                setattr(entry, counter, getattr(entry, counter) + 1)
+            start = None
+            yield item
+            start = perf_counter()
+    finally:
+        if start is not None:
+            entry.seconds += perf_counter() - start
+
+
+# ---------------------------------------------------------------------------
+# Rule compilation (engine mode "compiled")
+# ---------------------------------------------------------------------------
+
+ENGINE_MODES = ("interpret", "compiled")
+
+
+class ProofBudgetExceeded(RuntimeError):
+    """A query resolved more goals than its step budget allows."""
+
+
+# Planner cost of a goal it cannot see into (callable ∀ domain, recursion).
+_UNKNOWN_COST = 100.0
+
+# Marks an empty variable slot in a compiled frame.
+_UNBOUND = object()
+
+# A compiled goal: yields once per solution with its bindings written into the
+# frame, and clears them again when resumed or closed.
+Runner = Callable[["LogicEngine", list[Any]], Iterator[None]]
+
+# A compiled rule: yields head tuples matching a pattern (non-Var args bound).
+RuleSolver = Callable[["LogicEngine", tuple[Any, ...]], Iterator[tuple[Any, ...]]]
+
+# Where a compiled FactGoal reads its tuples from; defaults to LogicEngine._match.
+FactSource = Callable[["LogicEngine", tuple[Any, ...]], Iterable[tuple[Any, ...]]]
+
+
+def _collect_var_names(goal: Goal, names: dict[str, None]) -> None:
+    """Add Var names used in goal to names, in first-occurrence order."""
+    if isinstance(goal, FactGoal):
+        for a in goal.args:
+            if isinstance(a, Var):
+                names.setdefault(a.name, None)
+    elif isinstance(goal, ConjGoal):
+        for g in goal.goals:
+            _collect_var_names(g, names)
+    elif isinstance(goal, NegGoal):
+        _collect_var_names(goal.goal, names)
+    elif isinstance(goal, ForallGoal):
+        names.setdefault(goal.var.name, None)
+        if isinstance(goal.domain, FactGoal):
+            _collect_var_names(goal.domain, names)
+        _collect_var_names(goal.body, names)
+
+
+def _has_solution(solutions: Iterator[Any]) -> bool:
+    """True if solutions yields at least once. Closes it so bindings unwind."""
+    try:
+        for _ in solutions:
+            return True
+        return False
+    finally:
+        solutions.close()  # type: ignore[attr-defined]
+
+
+VarKey = tuple[str, int]
+
+
+class _Alias:
+    """Binding of a variable to another variable that is still unbound."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key: VarKey) -> None:
+        self.key = key
+
+
+class Bindings:
+    """
+    Interpret-mode substitution: one binding table plus an undo trail, shared
+    by a whole proof. Variables are keyed by (name, scope) and every rule
+    application opens a fresh scope, so rule variables are renamed apart
+    without rewriting the rule body. bind() records the key on the trail;
+    undo_to(mark) pops bindings back to an earlier trail length, so
+    backtracking costs the bindings it undoes rather than a dict copy.
+    """
+
+    __slots__ = ("values", "trail", "_scopes")
+
+    def __init__(self) -> None:
+        self.values: dict[VarKey, Any] = {}
+        self.trail: list[VarKey] = []
+        self._scopes = 0
+
+    def new_scope(self) -> int:
+        self._scopes += 1
+        return self._scopes
+
+    def walk(self, key: VarKey) -> tuple[VarKey, Any]:
+        """Follow aliases from key. Returns (last key, its value or _UNBOUND)."""
+        values = self.values
+        value = values.get(key, _UNBOUND)
+        while type(value) is _Alias:
+            key = value.key
+            value = values.get(key, _UNBOUND)
+        return key, value
+
+    def bind(self, key: VarKey, value: Any) -> None:
+        self.values[key] = value
+        self.trail.append(key)
+
+    def unify(self, key: VarKey, value: Any) -> bool:
+        """Unify the variable at key with a value or an _Alias to another variable."""
+        key, current = self.walk(key)
+        if type(value) is _Alias:
+            other, value = self.walk(value.key)
+            if value is _UNBOUND:
+                if other != key:
+                    if current is _UNBOUND:
+                        self.bind(key, _Alias(other))
+                    else:
+                        self.bind(other, current)
+                return True
+        if current is _UNBOUND:
+            self.bind(key, value)
+            return True
+        return current == value
+
+    def undo_to(self, mark: int) -> None:
+        values, trail = self.values, self.trail
+        while len(trail) > mark:
+            del values[trail.pop()]
+
+
+def _succeed(engine: "LogicEngine", frame: list[Any]) -> Iterator[None]:
+    yield
+
+
+def _fail(engine: "LogicEngine", frame: list[Any]) -> Iterator[None]:
+    return
+    yield
+
+
+def _compile_goal(goal: Goal, slots: dict[str, int]) -> Runner:
+    """Compile a goal into a Runner; Var names are resolved to frame slots once."""
+    if isinstance(goal, FactGoal):
+        return _compile_fact(goal, slots)
+    if isinstance(goal, ConjGoal):
+        return _compile_conj(goal, slots)
+    if isinstance(goal, NegGoal):
+        return _compile_neg(goal, slots)
+    if isinstance(goal, ForallGoal):
+        return _compile_forall(goal, slots)
+    return _fail
+
+
+def _compile_fact(goal: FactGoal, slots: dict[str, int], source: FactSource | None = None) -> Runner:
+    pred = goal.pred
+    template = goal.args
+    var_pos = tuple((i, slots[a.name]) for i, a in enumerate(template) if isinstance(a, Var))
+
+    def run(engine: "LogicEngine", frame: list[Any]) -> Iterator[None]:
+        if engine._step_limit is not None:
+            engine._step()
+        pattern = list(template)
+        for i, s in var_pos:
+            if frame[s] is not _UNBOUND:
+                pattern[i] = frame[s]
+        key = tuple(pattern)
+        if engine._recording is not None:
+            answers = engine._recording.goal(pred, lambda: engine._match(pred, key) if source is None else source(engine, key))
+        else:
+            answers = engine._match(pred, key) if source is None else source(engine, key)
+        for answer in answers:
+            bound: list[int] = []
+            try:
+                for i, s in var_pos:
+                    v = answer[i]
+                    if frame[s] is _UNBOUND:
+                        if not isinstance(v, Var):
+                            frame[s] = v
+                            bound.append(s)
+                    elif frame[s] != v:
+                        break
+                else:
+                    yield
+            finally:
+                for s in bound:
+                    frame[s] = _UNBOUND
+
+    return run
+
+
+def _compile_conj(goal: ConjGoal, slots: dict[str, int]) -> Runner:
+    run: Runner = _succeed
+    for sub in reversed(goal.goals):
+        run = _chain(_compile_goal(sub, slots), run)
+    return run
+
+
+def _chain(first: Runner, rest: Runner) -> Runner:
+    if rest is _succeed:
+        return first
+
+    def run(engine: "LogicEngine", frame: list[Any]) -> Iterator[None]:
+        for _ in first(engine, frame):
+            yield from rest(engine, frame)
+
+    return run
+
+
+def _compile_neg(goal: NegGoal, slots: dict[str, int]) -> Runner:
+    inner = _compile_goal(goal.goal, slots)
+
+    def run(engine: "LogicEngine", frame: list[Any]) -> Iterator[None]:
+        if not _has_solution(inner(engine, frame)):
+            yield
+
+    return run
+
+
+def _compile_forall(goal: ForallGoal, slots: dict[str, int]) -> Runner:
+    var_slot = slots[goal.var.name]
+    domain = goal.domain
+    domain_run = _compile_goal(domain, slots) if isinstance(domain, FactGoal) else None
+    body = _compile_goal(goal.body, slots)
+    named = tuple(slots.items())
+
+    def values(engine: "LogicEngine", frame: list[Any]) -> list[Any]:
+        if domain_run is not None:
+            return [frame[var_slot] for _ in domain_run(engine, frame)]
+        # Domain functions take a substitution dict; build it once per proof.
+        subst = {name: frame[s] for name, s in named if frame[s] is not _UNBOUND}
+        return list(domain(engine, subst))
+
+    def run(engine: "LogicEngine", frame: list[Any]) -> Iterator[None]:
+        saved = frame[var_slot]
+        frame[var_slot] = _UNBOUND
+        try:
+            for x in values(engine, frame):
+                frame[var_slot] = x
+                if not _has_solution(body(engine, frame)):
+                    return
+        finally:
+            frame[var_slot] = saved
+        yield
+
+    shape = subset_shape(goal)
+    if shape is None:
+        return run
+    x_arg, y_arg = shape[2], shape[5]
+    x_slot = slots[x_arg.name] if isinstance(x_arg, Var) else None
+    y_slot = slots[y_arg.name] if isinstance(y_arg, Var) else None
+
+    def run_kernel(engine: "LogicEngine", frame: list[Any]) -> Iterator[None]:
+        if engine.bitset_kernel and engine._kernel_applies(shape):
+            x = x_arg if x_slot is None else frame[x_slot]
+            y = y_arg if y_slot is None else frame[y_slot]
+            if x is not _UNBOUND and y is not _UNBOUND:
+                if engine._kernel.covers(engine, shape, x, y):
+                    yield
+                return
+        yield from run(engine, frame)
+
+    return run_kernel
+
+
+def _delta_source(delta: FactIndex) -> FactSource:
+    def source(engine: "LogicEngine", pattern: tuple[Any, ...]) -> Iterator[tuple[Any, ...]]:
+        for fact in delta.lookup(pattern):
+            if len(fact) == len(pattern):
+                yield fact
+
+    return source
+
+
+def _compile_rule(
+    head_var_names: list[str],
+    body: Goal,
+    sources: dict[int, FactSource] | None = None,
+) -> RuleSolver:
+    """
+    Compile rule head_pred(V1, ..., Vn) :- body into a RuleSolver.
+    sources overrides where the i-th top-level conjunct (a FactGoal) reads from;
+    semi-naive evaluation uses it to point one conjunct at the last delta.
+    The body is compiled on first use of each head binding pattern, in the
+    conjunct order the engine plans for it (see LogicEngine.reorder).
+    """
+    names = dict.fromkeys(head_var_names)
+    _collect_var_names(body, names)
+    slots = {name: i for i, name in enumerate(names)}
+    head_slots = tuple(slots[n] for n in head_var_names)
+    size = len(slots)
+    conjuncts = _conjuncts(body)
+    runners: dict[tuple[bool, ...], Runner] = {}
+
+    def runner(engine: "LogicEngine", pattern: tuple[Any, ...]) -> Runner:
+        mask = tuple(not isinstance(a, Var) for a in pattern) if engine.reorder else ()
+        run = runners.get(mask)
+        if run is None:
+            bound = {n for n, b in zip(head_var_names, mask) if b}
+            run = _succeed
+            for i, g in reversed(engine._order_conjuncts(conjuncts, bound, first=tuple(sources or ()))):
+                sub = _compile_fact(g, slots, sources[i]) if sources and i in sources else _compile_goal(g, slots)  # type: ignore[arg-type]
+                run = _chain(sub, run)
+            runners[mask] = run
+        return run
+
+    def solve(engine: "LogicEngine", pattern: tuple[Any, ...]) -> Iterator[tuple[Any, ...]]:
+        frame: list[Any] = [_UNBOUND] * size
+        for a, s in zip(pattern, head_slots):
+            if isinstance(a, Var):
+                continue
+            if frame[s] is _UNBOUND:
+                frame[s] = a
+            elif frame[s] != a:
+                return
+        for _ in runner(engine, pattern)(engine, frame):
+            yield tuple(a if frame[s] is _UNBOUND else frame[s] for a, s in zip(pattern, head_slots))
+
+    return solve
+
+
 @dataclass
 class LogicEngine:
     """
     Logic engine with fact base and rule base.
     Inference is done via backward chaining; rules are declarative data.
+    `mode` selects the interpretive or compiled prover (see ENGINE_MODES).
     """
 
-    facts: dict[str, set[tuple[Any, ...]]] = field(default_factory=dict)
+    facts: dict[str, FactIndex] = field(default_factory=dict)
     rules: list[tuple[str, list[str], Goal]] = field(default_factory=list)
+    mode: str = "interpret"
+    tabling: bool = False
+    bitset_kernel: bool = False
+    reorder: bool = False
+    # Default per-goal step budget of prove_one/exists/count and budget(); None is unlimited
+    max_steps: int | None = None
+    # Opt-in instrumentation (see EngineStats)
+    stats: EngineStats | None = None
+    _compiled: dict[str, list[tuple[int, RuleSolver]]] = field(default_factory=dict, init=False, repr=False)
+    # Tabling: pred -> variant pattern -> answers; pred -> preds it depends on
+    _tables: dict[str, dict[tuple[Any, ...], tuple[tuple[Any, ...], ...]]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _dependencies: dict[str, frozenset[str] | None] = field(default_factory=dict, init=False, repr=False)
+    _filling: set[tuple[str, tuple[Any, ...]]] = field(default_factory=set, init=False, repr=False)
+    # Bottom-up: materialized relations of derived predicates, and their strata
+    _derived: dict[str, FactIndex] = field(default_factory=dict, init=False, repr=False)
+    _strata: list[list[str]] | None = field(default=None, init=False, repr=False)
+    _kernel: BitsetKernel = field(default_factory=BitsetKernel, init=False, repr=False)
+    # Conjunct ordering: interpret-mode rule plans per (rule index, bound head
+    # vars), and estimated (cost, fanout) per derived goal binding pattern
+    _plans: dict[tuple[int, frozenset[str]], Goal] = field(default_factory=dict, init=False, repr=False)
+    _rule_costs: dict[tuple[str, int, tuple[int, ...]], tuple[float, float]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    # Step budget of the running query: goals resolved so far, and the limit
+    _steps: int = field(default=0, init=False, repr=False)
+    _step_limit: int | None = field(default=None, init=False, repr=False)
+    # Stats being recorded for the current top-level call, if it was sampled
+    _recording: EngineStats | None = field(default=None, init=False, repr=False)
+    _call_depth: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.mode not in ENGINE_MODES:
+            raise ValueError(f"Unknown engine mode {self.mode!r}; expected one of {ENGINE_MODES}")
+        for head_pred, head_var_names, body in self.rules:
+            self._compile_rule(head_pred, head_var_names, body)
 
     def assert_fact(self, pred: str, *args: Any) -> None:
         """Add ground fact."""
         if pred not in self.facts:
-            self.facts[pred] = set()
-        self.facts[pred].add(tuple(args))
+            self.facts[pred] = FactIndex()
+        fact = tuple(args)
+        if self.facts[pred].add(fact):
+            self._kernel.update(pred, fact, True)
+            with self._sampled():
+                self._invalidate(pred, fact)
+
+    def retract_fact(self, pred: str, *args: Any) -> bool:
+        """Remove ground fact; returns True if it was present."""
+        fact = tuple(args)
+        facts = self.facts.get(pred)
+        if facts is None or not facts.discard(fact):
+            return False
+        self._kernel.update(pred, fact, False)
+        with self._sampled():
+            self._invalidate(pred, fact)
+        return True
 
     def add_rule(self, head_pred: str, head_var_names: list[str], body: Goal) -> None:
         """Add rule: head_pred(V1, V2, ...) :- body. Vars in body use these names."""
         self.rules.append((head_pred, head_var_names, body))
+        self._compile_rule(head_pred, head_var_names, body)
+        self._tables.clear()
+        self._dependencies.clear()
+        self._derived.clear()
+        self._strata = None
+        self._plans.clear()
+        self._rule_costs.clear()
 
-    def prove(self, goal: Goal, subst: dict[str, Any] | None = None) -> Iterator[dict[str, Any]]:
-        """Backward-chaining proof. Yields substitutions satisfying the goal."""
-        subst = subst or {}
+    def depends_on(self, pred: str) -> frozenset[str] | None:
+        """
+        Predicates whose facts can change the answers for pred (including pred
+        itself), following rules transitively. None if a rule has an opaque
+        domain, i.e. pred may depend on anything.
+        """
+        if pred in self._dependencies:
+            return self._dependencies[pred]
+        deps = {pred}
+        stack = [pred]
+        while stack:
+            current = stack.pop()
+            for head_pred, _, body in self.rules:
+                if head_pred != current:
+                    continue
+                preds = goal_predicates(body)
+                if preds is None:
+                    self._dependencies[pred] = None
+                    return None
+                for p in preds - deps:
+                    deps.add(p)
+                    stack.append(p)
+        result = frozenset(deps)
+        self._dependencies[pred] = result
+        return result
 
-        if isinstance(goal, FactGoal):
-            yield from self._prove_fact(goal, subst)
-        elif isinstance(goal, ConjGoal):
-            yield from self._prove_conj(goal, subst)
-        elif isinstance(goal, NegGoal):
-            yield from self._prove_neg(goal, subst)
-        elif isinstance(goal, ForallGoal):
-            yield from self._prove_forall(goal, subst)
+    def _invalidate(self, changed_pred: str, fact: tuple[Any, ...]) -> None:
+        """Drop dependent tables, then bring materialized relations up to date."""
+        for pred in list(self._tables):
+            deps = self.depends_on(pred)
+            if deps is None or changed_pred in deps:
+                del self._tables[pred]
+        if self._derived:
+            self._update_materialized(changed_pred, fact)
 
-    def _prove_fact(
-        self,
-        goal: FactGoal,
-        subst: dict[str, Any],
-    ) -> Iterator[dict[str, Any]]:
-        """Prove fact by fact-base lookup or rule application."""
-        pred, args = goal.pred, goal.args
+    def _update_materialized(self, pred: str, fact: tuple[Any, ...]) -> None:
+        """
+        Truth maintenance after pred(fact) was asserted or retracted.
+
+        Walking the strata upwards, each materialized predicate whose rules
+        read a changed predicate re-derives only the head bindings the change
+        can touch (delete-and-rederive scoped to that head pattern), e.g. a
+        new overloaded(m) re-derives eligible(m, _) and nothing else. The
+        facts that actually changed propagate to the next strata. Recursive
+        strata and rules with callable domains are dropped instead and
+        rebuilt by the next materialize().
+        """
+        changed: dict[str, set[tuple[Any, ...]]] = {pred: {fact}}
+        try:
+            self._propagate(pred, fact, changed)
+        except ProofBudgetExceeded:
+            # Relations left half-updated are dropped; queries fall back to the rules
+            self._derived.clear()
+            raise
 
-        # Try fact base
-        if pred in self.facts:
-            for fact in self.facts[pred]:
-                if len(fact) != len(args):
+    def _propagate(self, pred: str, fact: tuple[Any, ...], changed: dict[str, set[tuple[Any, ...]]]) -> None:
+        for stratum in self.stratify():
+            for head in stratum:
+                if head not in self._derived:
+                    continue
+                patterns = self._touched_patterns(head, changed)
+                if head == pred:
+                    patterns.add(fact)
+                if not patterns:
+                    continue
+                if self.depends_on(head) is None or self._is_recursive(head):
+                    self._drop_materialized(head)
                     continue
-                new_subst = dict(subst)
-                if self._unify(list(args), list(fact), new_subst):
-                    yield new_subst
+                delta: set[tuple[Any, ...]] = set()
+                for pattern in patterns:
+                    delta |= self._rederive(head, pattern)
+                if delta:
+                    changed.setdefault(head, set()).update(delta)
 
-        # Try rules: bind head vars to goal args, prove body
-        for rule_pred, var_names, body in self.rules:
-            if rule_pred != pred or len(var_names) != len(args):
+    def _touched_patterns(
+        self,
+        head: str,
+        changed: dict[str, set[tuple[Any, ...]]],
+    ) -> set[tuple[Any, ...]]:
+        """Head patterns of head whose truth may differ after the changed facts."""
+        patterns: set[tuple[Any, ...]] = set()
+        for head_pred, head_var_names, body in self.rules:
+            if head_pred != head:
                 continue
-            rule_subst = {**subst, **dict(zip(var_names, args))}
-            yield from self.prove(self._apply_subst(body, rule_subst), rule_subst)
+            for literal, hidden in _literal_occurrences(body):
+                for fact in changed.get(literal.pred, ()):
+                    if len(fact) != len(literal.args):
+                        continue
+                    binding: dict[str, Any] = {}
+                    for a, v in zip(literal.args, fact):
+                        if not isinstance(a, Var):
+                            if a != v:
+                                break
+                        elif a.name not in hidden and binding.setdefault(a.name, v) != v:
+                            break
+                    else:
+                        # A fact that cannot unify with the literal cannot change it.
+                        patterns.add(tuple(binding.get(n, Var(n)) for n in head_var_names))
+        return patterns
 
-    def _apply_subst(self, goal: Goal, subst: dict[str, Any]) -> Goal:
-        """Replace Vars in goal with values from subst."""
-        if isinstance(goal, FactGoal):
-            new_args = tuple(
-                subst[a.name] if isinstance(a, Var) and a.name in subst else a
-                for a in goal.args
-            )
-            return FactGoal(goal.pred, new_args)
+    def _kernel_applies(self, shape: tuple[str, int, Any, str, int, Any]) -> bool:
+        """The bitset kernel only reads base facts, so both predicates must be rule-free."""
+        return shape[0] not in self._compiled and shape[3] not in self._compiled
+
+    def _mutually_recursive(self, a: str, b: str) -> bool:
+        deps_a, deps_b = self.depends_on(a), self.depends_on(b)
+        return deps_a is not None and deps_b is not None and a in deps_b and b in deps_a
+
+    def _is_recursive(self, head: str) -> bool:
+        """True if head depends on itself through one of its rule bodies."""
+        for head_pred, _, body in self.rules:
+            if head_pred != head:
+                continue
+            for pred in goal_predicates(body) or ():
+                deps = self.depends_on(pred)
+                if deps is None or head in deps:
+                    return True
+        return False
+
+    def _rederive(self, head: str, pattern: tuple[Any, ...]) -> set[tuple[Any, ...]]:
+        """Recompute head's materialized facts matching pattern; returns those that changed."""
+        relation = self._derived[head]
+        old = {f for f in relation.lookup(pattern) if len(f) == len(pattern)}
+        known = self.facts.get(head, ())
+        new: set[tuple[Any, ...]] = set()
+        for arity, solve in self._compiled.get(head, ()):
+            if arity == len(pattern):
+                new.update(f for f in solve(self, pattern) if f not in known)
+        for f in old - new:
+            relation.discard(f)
+        for f in new - old:
+            relation.add(f)
+        return old ^ new
+
+    def _drop_materialized(self, head: str) -> None:
+        for pred in list(self._derived):
+            deps = self.depends_on(pred)
+            if deps is None or head in deps:
+                del self._derived[pred]
+
+    def stratify(self) -> list[list[str]]:
+        """
+        Derived predicates grouped into strata, in evaluation order: a predicate
+        sits above everything it reads, except mutually recursive predicates,
+        which share a stratum. Anything read under negation (NegGoal or either
+        side of a ForallGoal) is strictly lower. Raises ValueError if the rules
+        recurse through negation.
+        """
+        if self._strata is not None:
+            return self._strata
+        derived = {head_pred for head_pred, _, _ in self.rules}
+        edges = []
+        for head_pred, _, body in self.rules:
+            positive: set[str] = set()
+            negative: set[str] = set()
+            _polarity_predicates(body, positive, negative)
+            edges.append((head_pred, positive & derived, negative & derived))
+        level = dict.fromkeys(derived, 0)
+        changed = True
+        while changed:
+            changed = False
+            for head_pred, positive, negative in edges:
+                need = max(
+                    [level[p] + (0 if self._mutually_recursive(head_pred, p) else 1) for p in positive]
+                    + [level[p] + 1 for p in negative],
+                    default=0,
+                )
+                if need > level[head_pred]:
+                    if need > len(derived):
+                        raise ValueError(f"Rules are not stratifiable: {head_pred} recurses through negation")
+                    level[head_pred] = need
+                    changed = True
+        strata: list[list[str]] = [[] for _ in range(max(level.values(), default=-1) + 1)]
+        for pred in sorted(level):
+            strata[level[pred]].append(pred)
+        self._strata = strata
+        return strata
+
+    def materialize(self) -> None:
+        """
+        Bottom-up, semi-naive evaluation of every derived predicate, stratum by
+        stratum. Goals on materialized predicates are then answered from their
+        relations instead of rules, and assert_fact/retract_fact keep them
+        current. Predicates dropped by a change that cannot be maintained
+        incrementally are recomputed by the next call.
+        """
+        with self._sampled():
+            for stratum in self.stratify():
+                pending = [p for p in stratum if p not in self._derived]
+                if pending:
+                    try:
+                        self._materialize_stratum(pending)
+                    except ProofBudgetExceeded:
+                        for p in pending:
+                            del self._derived[p]
+                        raise
+
+    def project(self, pred: str, *args: Any) -> list[Any]:
+        """
+        Distinct values of the one Var in args over pred, in assertion order:
+        project("requires_skill", task_id, Var("S")) -> every S with
+        requires_skill(task_id, S). Base facts and materialized relations are
+        read through the argument index, so the cost is O(matches). A
+        rule-defined predicate that is not materialized is answered by
+        select() in compiled mode (one set-at-a-time query for every value) and by
+        prove() in interpret mode.
+        """
+        var_pos = [i for i, a in enumerate(args) if isinstance(a, Var)]
+        if len(var_pos) != 1:
+            raise ValueError(f"project() needs exactly one Var argument, got {len(var_pos)}")
+        pos = var_pos[0]
+        if pred in self._compiled and pred not in self._derived:
+            if self.mode == "compiled":
+                return list(dict.fromkeys(a[pos] for a in self.select(pred, *args) if not isinstance(a[pos], Var)))
+            name = args[pos].name
+            return list(dict.fromkeys(s[name] for s in self.prove(FactGoal(pred, args)) if name in s))
+        values: dict[Any, None] = {}
+        for relation in (self.facts.get(pred), self._derived.get(pred)):
+            if relation is not None:
+                for fact in relation.lookup(args):
+                    if len(fact) == len(args):
+                        values[fact[pos]] = None
+        return list(values)
+
+    def select(self, pred: str, *args: Any) -> list[tuple[Any, ...]]:
+        """
+        Distinct tuples of pred matching args (Vars are open), computed
+        set-at-a-time: a rule body is evaluated as joins over rows of
+        bindings, so eligible(Var("M"), t) is one pass over the members
+        rather than one proof per member.
+        """
+        pattern = tuple(args)
+        with self._sampled():
+            if self._recording is not None:
+                return list(self._recording.goal(pred, lambda: self._select(pred, pattern)))
+            return list(self._select(pred, pattern))
+
+    def _select(self, pred: str, pattern: tuple[Any, ...]) -> Iterable[tuple[Any, ...]]:
+        if pred not in self._compiled or pred in self._derived:
+            return self._stored_answers(pred, pattern)
+        if self.tabling:
+            return self._table_answers(pred, pattern, lambda key: iter(self._select_rules(pred, key)))
+        return self._select_rules(pred, pattern)
+
+    def _stored_answers(self, pred: str, pattern: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+        """Base facts and materialized tuples of pred matching pattern."""
+        answers: list[tuple[Any, ...]] = []
+        for relation in (self.facts.get(pred), self._derived.get(pred)):
+            if relation is not None:
+                answers.extend(f for f in relation.lookup(pattern) if len(f) == len(pattern))
+        return answers
+
+    def _select_rules(self, pred: str, pattern: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+        rules = [(names, body) for head, names, body in self.rules if head == pred and len(names) == len(pattern)]
+        try:
+            for names, body in rules:
+                _check_range_restricted(pred, names, body)
+        except ValueError:
+            # Answers may be non-ground; prove tuple-at-a-time instead.
+            return list(dict.fromkeys(self._match_untabled(pred, pattern)))
+        if self._is_recursive(pred):
+            return list(dict.fromkeys(self._match_untabled(pred, pattern)))
+        answers = dict.fromkeys(self._stored_answers(pred, pattern))
+        for names, body in rules:
+            for answer in self._join_rule(names, body, pattern):
+                answers[answer] = None
+        return list(answers)
+
+    def _join_rule(self, head_var_names: list[str], body: Goal, pattern: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+        """
+        Head tuples of one rule for pattern. Rows hold the values of the Vars
+        in schema (name -> column); each conjunct joins, anti-joins or
+        filters the whole row set before the next one runs.
+        """
+        schema: dict[str, int] = {}
+        row: list[Any] = []
+        for name, a in zip(head_var_names, pattern):
+            if isinstance(a, Var):
+                continue
+            if name not in schema:
+                schema[name] = len(row)
+                row.append(a)
+            elif row[schema[name]] != a:
+                return []
+        rows = [tuple(row)]
+        for _, g in self._order_conjuncts(_conjuncts(body), set(schema)):
+            if not rows:
+                return []
+            if isinstance(g, FactGoal):
+                rows = self._join_fact(g, schema, rows, negated=False)
+            elif isinstance(g, NegGoal) and isinstance(g.goal, FactGoal):
+                rows = self._join_fact(g.goal, schema, rows, negated=True)
+            else:
+                rows = self._filter_rows(g, schema, rows)
+        return [
+            tuple(r[schema[name]] if name in schema else a for name, a in zip(head_var_names, pattern))
+            for r in rows
+        ]
+
+    def _join_fact(
+        self,
+        goal: FactGoal,
+        schema: dict[str, int],
+        rows: list[tuple[Any, ...]],
+        negated: bool,
+    ) -> list[tuple[Any, ...]]:
+        """
+        Join rows with goal's tuples on the Vars they share (anti-join if
+        negated). A derived predicate is queried once, open on the shared
+        Vars that vary between rows, and hash-joined; a stored relation is probed through its
+        argument index once per distinct key.
+        """
+        args = goal.args
+        key_pos = [(i, schema[a.name]) for i, a in enumerate(args) if isinstance(a, Var) and a.name in schema]
+        new_pos = [(i, a.name) for i, a in enumerate(args) if isinstance(a, Var) and a.name not in schema]
+        if goal.pred in self._compiled and goal.pred not in self._derived:
+            index: dict[tuple[Any, ...], list[tuple[Any, ...]]] = {}
+            wild: list[tuple[Any, ...]] = []
+            # Shared Vars holding one value across every row (the task in
+            # eligible(M, t)) are bound in the query; the rest stay open.
+            query = list(args)
+            for i, slot in key_pos:
+                values = {row[slot] for row in rows}
+                if len(values) == 1:
+                    query[i] = values.pop()
+            query_key = tuple(query)
+            if self._recording is not None:
+                answers = self._recording.goal(goal.pred, lambda: self._select(goal.pred, query_key))
+            else:
+                answers = self._select(goal.pred, query_key)
+            for answer in answers:
+                key = tuple(answer[i] for i, _ in key_pos)
+                if any(isinstance(v, Var) for v in key):
+                    wild.append(answer)
+                else:
+                    index.setdefault(key, []).append(answer)
+
+            def matches(key: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+                found = index.get(key, [])
+                return found + wild if wild else found
+
+        else:
+            probed: dict[tuple[Any, ...], list[tuple[Any, ...]]] = {}
+
+            def matches(key: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+                found = probed.get(key)
+                if found is None:
+                    probe = list(args)
+                    for (i, _), v in zip(key_pos, key):
+                        probe[i] = v
+                    found = probed[key] = self._stored_answers(goal.pred, tuple(probe))
+                return found
+
+        names = list(dict.fromkeys(name for _, name in new_pos))
+        out: list[tuple[Any, ...]] = []
+        for row in rows:
+            if self._step_limit is not None:
+                self._step()
+            found = matches(tuple(row[s] for _, s in key_pos))
+            extensions = []
+            for answer in found:
+                values: dict[str, Any] = {}
+                if all(values.setdefault(name, answer[i]) == answer[i] for i, name in new_pos):
+                    extensions.append(values)
+                    if negated:
+                        break
+            if negated:
+                if not extensions:
+                    out.append(row)
+            else:
+                out.extend(row + tuple(values[n] for n in names) for values in extensions)
+        if not negated:
+            for name in names:
+                schema[name] = len(schema)
+        return out
+
+    def _filter_rows(self, goal: Goal, schema: dict[str, int], rows: list[tuple[Any, ...]]) -> list[tuple[Any, ...]]:
+        """Keep the rows on which goal (a ∀ or a compound negation) holds."""
+        names = dict.fromkeys(schema)
+        _collect_var_names(goal, names)
+        run = _compile_goal(goal, {name: i for i, name in enumerate(names)})
+        free = [_UNBOUND] * (len(names) - len(schema))
+        kept = []
+        for row in rows:
+            if self._step_limit is not None:
+                self._step()
+            if _has_solution(run(self, list(row) + free)):
+                kept.append(row)
+        return kept
+
+    def materialized(self, pred: str) -> FactIndex:
+        """Materialized relation for derived predicate pred (materializing first)."""
+        self.materialize()
+        return self._derived.setdefault(pred, FactIndex())
+
+    def _materialize_stratum(self, preds: list[str]) -> None:
+        rules = [(h, names, body) for h, names, body in self.rules if h in preds]
+        for head_pred, head_var_names, body in rules:
+            _check_range_restricted(head_pred, head_var_names, body)
+        for pred in preds:
+            self._derived[pred] = FactIndex()
+
+        # k-th rule of its head predicate, as labelled in EngineStats
+        rule_ks = [sum(1 for h, _, _ in rules[:j] if h == head_pred) for j, (head_pred, _, _) in enumerate(rules)]
+
+        def derive(solvers: list[tuple[str, int, int, RuleSolver]]) -> dict[str, FactIndex]:
+            new: dict[str, FactIndex] = {pred: FactIndex() for pred in preds}
+            for head_pred, k, arity, solve in solvers:
+                known = self.facts.get(head_pred, ())
+                answers = solve(self, tuple(Var(f"_{i}") for i in range(arity)))
+                if self._recording is not None:
+                    answers = self._recording.expand(head_pred, k, answers)
+                # Collect first: the solver may be reading the relation we extend.
+                for fact in list(answers):
+                    if fact not in self._derived[head_pred] and fact not in known:
+                        new[head_pred].add(fact)
+            for pred, facts in new.items():
+                for fact in facts:
+                    self._derived[pred].add(fact)
+            return new
+
+        # Round 0: every rule once, same-stratum predicates still empty.
+        delta = derive(
+            [(h, k, len(names), _compile_rule(names, body)) for (h, names, body), k in zip(rules, rule_ks)]
+        )
+        # Seed recursion with base facts stored under a derived predicate name.
+        for pred in preds:
+            for fact in self.facts.get(pred, ()):
+                delta[pred].add(fact)
+
+        # Semi-naive rounds: each rule once per same-stratum conjunct, with
+        # that conjunct reading only the previous round's new facts.
+        while any(delta.values()):
+            solvers = []
+            for (head_pred, head_var_names, body), k in zip(rules, rule_ks):
+                for i, g in enumerate(_conjuncts(body)):
+                    if isinstance(g, FactGoal) and g.pred in delta:
+                        source = _delta_source(delta[g.pred])
+                        solvers.append((head_pred, k, len(head_var_names), _compile_rule(head_var_names, body, {i: source})))
+            delta = derive(solvers)
+
+    def _table_answers(
+        self,
+        pred: str,
+        pattern: tuple[Any, ...],
+        evaluate: Callable[[tuple[Any, ...]], Iterator[tuple[Any, ...]]],
+    ) -> Iterable[tuple[Any, ...]]:
+        """
+        Answers for pred(pattern), from the table for its variant if present.
+        On a miss, evaluate(variant_pattern) is run to completion and its
+        distinct answers stored. A goal re-entered while its own table is being
+        filled (recursion) is evaluated untabled.
+        """
+        key = _variant_key(pattern)
+        table = self._tables.get(pred)
+        if table is not None and key in table:
+            if self._recording is not None:
+                self._recording.predicate(pred).table_hits += 1
+            return table[key]
+        if (pred, key) in self._filling:
+            return evaluate(key)
+        self._filling.add((pred, key))
+        try:
+            answers = tuple(dict.fromkeys(evaluate(key)))
+        finally:
+            self._filling.discard((pred, key))
+        self._tables.setdefault(pred, {})[key] = answers
+        return answers
+
+    def _compile_rule(self, head_pred: str, head_var_names: list[str], body: Goal) -> None:
+        solver = _compile_rule(head_var_names, body)
+        self._compiled.setdefault(head_pred, []).append((len(head_var_names), solver))
+
+    def _plan(self, goal: Goal, bound: set[str]) -> Goal:
+        """goal with each conjunction reordered for the Vars already bound."""
         if isinstance(goal, ConjGoal):
-            return ConjGoal(tuple(self._apply_subst(g, subst) for g in goal.goals))
+            return ConjGoal(tuple(g for _, g in self._order_conjuncts(_conjuncts(goal), bound)))
         if isinstance(goal, NegGoal):
-            return NegGoal(self._apply_subst(goal.goal, subst))
+            return NegGoal(self._plan(goal.goal, bound))
         if isinstance(goal, ForallGoal):
-            return ForallGoal(goal.var, goal.domain, self._apply_subst(goal.body, subst))
+            inner = bound | {goal.var.name}
+            if isinstance(goal.domain, FactGoal):
+                inner |= _var_names(goal.domain)
+            return ForallGoal(goal.var, goal.domain, self._plan(goal.body, inner))
         return goal
 
-    def _unify(
+    def _order_conjuncts(
         self,
-        pattern: list[Any],
-        value: list[Any],
-        subst: dict[str, Any],
-    ) -> bool:
-        """Unify pattern with value, updating subst. Returns True if successful."""
-        if len(pattern) != len(value):
-            return False
-        for p, v in zip(pattern, value):
-            if isinstance(p, Var):
-                if p.name in subst:
-                    if subst[p.name] != v:
-                        return False
-                else:
-                    subst[p.name] = v
-            elif p != v:
-                return False
-        return True
+        conjuncts: list[Goal],
+        bound: set[str],
+        first: tuple[int, ...] = (),
+    ) -> list[tuple[int, Goal]]:
+        """
+        (written index, planned goal) for each conjunct, in evaluation order.
+        Without `reorder` this is the written order. Conjuncts in first
+        (semi-naive delta reads) are taken before anything else.
+        """
+        if not self.reorder:
+            return list(enumerate(conjuncts))
+        order, _, _ = self._greedy_order(conjuncts, bound, first, frozenset())
+        return [(i, self._plan(conjuncts[i], set(before))) for i, before in order]
 
-    def _prove_conj(
+    def _greedy_order(
         self,
-        goal: ConjGoal,
-        subst: dict[str, Any],
-    ) -> Iterator[dict[str, Any]]:
-        """Prove conjunction: prove each subgoal, threading subst."""
+        conjuncts: list[Goal],
+        bound: set[str],
+        first: tuple[int, ...],
+        visiting: frozenset[str],
+    ) -> tuple[list[tuple[int, frozenset[str]]], float, float]:
+        """
+        Repeatedly take the cheapest conjunct that may run next. Positive
+        goals may always run; a negation or ∀ waits until the Vars it shares
+        with the other remaining conjuncts are bound, so moving it never
+        changes its meaning. A ∀ with a callable domain reads unknown Vars,
+        so nothing crosses it. Returns each pick with the Vars bound before
+        it, plus the plan's estimated cost and fanout.
+        """
+        bound = set(bound)
+        names = [_var_names(g) for g in conjuncts]
+        remaining = list(range(len(conjuncts)))
+        order: list[tuple[int, frozenset[str]]] = []
+        cost, fanout = 0.0, 1.0
+        while remaining:
+            pick, pick_est = remaining[0], (float("inf"), float("inf"))
+            for pos, i in enumerate(remaining):
+                g = conjuncts[i]
+                opaque = isinstance(g, ForallGoal) and not isinstance(g.domain, FactGoal)
+                if opaque and pos > 0:
+                    break
+                if isinstance(g, (NegGoal, ForallGoal)) and not opaque:
+                    local = names[i] - {g.var.name} if isinstance(g, ForallGoal) else names[i]
+                    others = set().union(*(names[j] for j in remaining if j != i))
+                    if not local & others <= bound:
+                        continue
+                est = (0.0, 1.0) if i in first else self._estimate(g, bound, visiting)
+                if est < pick_est:
+                    pick, pick_est = i, est
+                if opaque:
+                    break
+            if pick_est[0] == float("inf"):
+                pick_est = self._estimate(conjuncts[pick], bound, visiting)
+            order.append((pick, frozenset(bound)))
+            cost += fanout * pick_est[0]
+            fanout *= pick_est[1]
+            if isinstance(conjuncts[pick], (FactGoal, ConjGoal)):
+                bound |= names[pick]
+            remaining.remove(pick)
+        return order, cost, fanout
 
-        def prove_all(goals: list[Goal], s: dict[str, Any]) -> Iterator[dict[str, Any]]:
-            if not goals:
-                yield s
-                return
-            first, rest = goals[0], goals[1:]
-            for s1 in self.prove(first, s):
-                yield from prove_all(rest, {**s, **s1})
+    def _estimate(self, goal: Goal, bound: set[str], visiting: frozenset[str]) -> tuple[float, float]:
+        """
+        (cost, fanout) of proving goal once with bound Vars bound: relation
+        size divided by the distinct values at each bound position, or the
+        planned cost of the rules for a derived predicate.
+        """
+        if isinstance(goal, FactGoal):
+            args = goal.args
+            bound_pos = tuple(i for i, a in enumerate(args) if not isinstance(a, Var) or a.name in bound)
+            cost = fanout = 0.0
+            for relation in (self.facts.get(goal.pred), self._derived.get(goal.pred)):
+                if relation:
+                    if len(bound_pos) == len(args):
+                        matches = 1.0
+                    else:
+                        matches = float(len(relation))
+                        for i in bound_pos:
+                            matches /= max(relation.distinct(i), 1)
+                    cost += max(matches, 1.0)
+                    fanout += matches
+            if goal.pred in self._compiled and goal.pred not in self._derived:
+                rule_cost, rule_fanout = self._rule_cost(goal.pred, len(args), bound_pos, visiting)
+                cost += rule_cost
+                fanout += rule_fanout
+            return max(cost, 1.0), fanout
+        if isinstance(goal, ConjGoal):
+            _, cost, fanout = self._greedy_order(_conjuncts(goal), bound, (), visiting)
+            return cost, fanout
+        if isinstance(goal, NegGoal):
+            return self._estimate(goal.goal, bound, visiting)[0], 1.0
+        if isinstance(goal, ForallGoal):
+            if not isinstance(goal.domain, FactGoal):
+                return _UNKNOWN_COST, 1.0
+            shape = subset_shape(goal) if self.bitset_kernel else None
+            if (
+                shape is not None
+                and self._kernel_applies(shape)
+                and all(not isinstance(a, Var) or a.name in bound for a in (shape[2], shape[5]))
+            ):
+                return 1.0, 1.0
+            domain_cost, domain_fanout = self._estimate(goal.domain, bound - {goal.var.name}, visiting)
+            body_cost, _ = self._estimate(goal.body, bound | _var_names(goal.domain), visiting)
+            return domain_cost + domain_fanout * body_cost, 1.0
+        return 1.0, 1.0
+
+    def _rule_cost(
+        self,
+        pred: str,
+        arity: int,
+        bound_pos: tuple[int, ...],
+        visiting: frozenset[str],
+    ) -> tuple[float, float]:
+        """Planned (cost, fanout) of pred's rules with the given head positions bound."""
+        if pred in visiting:
+            return _UNKNOWN_COST, 1.0
+        key = (pred, arity, bound_pos)
+        cached = self._rule_costs.get(key)
+        if cached is None:
+            cost = fanout = 0.0
+            for head_pred, head_var_names, body in self.rules:
+                if head_pred == pred and len(head_var_names) == arity:
+                    head_bound = {head_var_names[i] for i in bound_pos}
+                    _, c, f = self._greedy_order(_conjuncts(body), head_bound, (), visiting | {pred})
+                    cost += c
+                    fanout += f
+            cached = self._rule_costs[key] = (cost, fanout)
+        return cached
+
+    def prove(self, goal: Goal, subst: dict[str, Any] | None = None) -> Iterator[dict[str, Any]]:
+        """Backward-chaining proof. Yields substitutions satisfying the goal."""
+        subst = subst or {}
+        if self.reorder:
+            goal = self._plan(goal, set(subst))
+
+        if self.mode == "compiled":
+            solutions = self._prove_compiled(goal, subst)
+        else:
+            solutions = self._prove_interpreted(goal, subst)
+        if self.stats is None:
+            yield from solutions
+            return
+        # The scope is entered per resume, never held across a yield: a proof
+        # the caller suspends or abandons must not leave it open.
+        decision: list[bool] = []
+        try:
+            while True:
+                with self._sample_scope(decision):
+                    solution = next(solutions, None)
+                if solution is None:
+                    return
+                yield solution
+        finally:
+            solutions.close()
+
+    def _sampled(self) -> ContextManager[None]:
+        """
+        Scope of one top-level call: if stats are attached and sample this
+        call, record into them until it ends. Nested calls join the sample.
+        """
+        return _NOT_SAMPLED if self.stats is None else self._sample_scope()
+
+    @contextmanager
+    def _sample_scope(self, decision: list[bool] | None = None) -> Iterator[None]:
+        """
+        decision carries one prove() call's sampling choice across its
+        resumes: made on the first one that runs at top level, reused after.
+        Depth and recording are restored on exit whatever the caller does.
+        """
+        top = self._call_depth == 0
+        saved = self._recording
+        self._call_depth += 1
+        if top and self.stats is not None:
+            if decision is None:
+                sampled = self.stats.sample()
+            else:
+                if not decision:
+                    decision.append(self.stats.sample())
+                sampled = decision[0]
+            self._recording = self.stats if sampled else None
+        try:
+            yield
+        finally:
+            self._call_depth -= 1
+            self._recording = saved
+
+    def _prove_interpreted(self, goal: Goal, subst: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        env = Bindings()
+        for name, value in subst.items():
+            env.bind((name, 0), value)
+        names = dict.fromkeys(subst)
+        _collect_var_names(goal, names)
+        for _ in self._solve(goal, 0, env):
+            # The only copy: one dict per solution handed back to the caller.
+            solution = {}
+            for name in names:
+                value = env.walk((name, 0))[1]
+                if value is not _UNBOUND:
+                    solution[name] = value
+            yield solution
 
-        yield from prove_all(list(goal.goals), subst)
+    def prove_one(
+        self,
+        goal: Goal,
+        subst: dict[str, Any] | None = None,
+        max_steps: int | None = None,
+    ) -> dict[str, Any] | None:
+        """First solution of goal, or None. Proving stops as soon as one is found."""
+        solutions = self._query(goal, subst, max_steps)
+        try:
+            return next(solutions, None)
+        finally:
+            solutions.close()
+
+    def exists(self, goal: Goal, subst: dict[str, Any] | None = None, max_steps: int | None = None) -> bool:
+        """True if goal has at least one solution."""
+        return self.prove_one(goal, subst, max_steps) is not None
+
+    def count(
+        self,
+        goal: Goal,
+        subst: dict[str, Any] | None = None,
+        limit: int | None = None,
+        max_steps: int | None = None,
+    ) -> int:
+        """Number of distinct solutions of goal, stopping once limit is reached."""
+        n = 0
+        solutions = self._query(goal, subst, max_steps)
+        try:
+            for _ in solutions:
+                n += 1
+                if limit is not None and n >= limit:
+                    break
+        finally:
+            solutions.close()
+        return n
+
+    @contextmanager
+    def budget(self, max_steps: int | None = None, goals: int = 1) -> Iterator[None]:
+        """
+        Run the enclosed work (prove, select, project, materialize, and the
+        upkeep of materialized relations after assert_fact/retract_fact)
+        under a step budget of max_steps, else the engine's max_steps, per
+        goal: a set-at-a-time query standing for goals proofs, e.g.
+        eligible(M, t) over every member, gets goals times the budget. Each
+        goal resolved and each row joined or filtered is one step; running
+        out raises ProofBudgetExceeded. Steps taken inside a nested budget
+        count against the enclosing one too.
+        """
+        limit = self.max_steps if max_steps is None else max_steps
+        if limit is not None:
+            limit *= max(1, goals)
+        saved_limit, saved_steps = self._step_limit, self._steps
+        self._step_limit, self._steps = limit, 0
+        try:
+            yield
+        finally:
+            self._step_limit, self._steps = saved_limit, saved_steps + self._steps
 
-    def _prove_neg(
+    def _query(
         self,
-        goal: NegGoal,
-        subst: dict[str, Any],
+        goal: Goal,
+        subst: dict[str, Any] | None,
+        max_steps: int | None,
     ) -> Iterator[dict[str, Any]]:
-        """Negation-as-failure: succeed iff subgoal has no solutions."""
-        if any(True for _ in self.prove(goal.goal, subst)):
+        """
+        prove() without duplicate solutions (the same bindings reached through
+        several facts or rules), under budget(max_steps).
+        """
+        seen: set[frozenset[tuple[str, Any]]] = set()
+        with self.budget(max_steps):
+            for solution in self.prove(goal, subst):
+                key = frozenset(solution.items())
+                if key not in seen:
+                    seen.add(key)
+                    yield solution
+
+    def _step(self) -> None:
+        self._steps += 1
+        if self._step_limit is not None and self._steps > self._step_limit:
+            raise ProofBudgetExceeded(f"Query exceeded its budget of {self._step_limit} steps")
+
+    def _prove_compiled(self, goal: Goal, subst: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        """Compile a query goal against subst and yield its solutions."""
+        names = dict.fromkeys(subst)
+        _collect_var_names(goal, names)
+        slots = {name: i for i, name in enumerate(names)}
+        frame = [subst.get(name, _UNBOUND) for name in slots]
+        for _ in _compile_goal(goal, slots)(self, frame):
+            yield {name: frame[i] for name, i in slots.items() if frame[i] is not _UNBOUND}
+
+    def _match(self, pred: str, pattern: tuple[Any, ...]) -> Iterable[tuple[Any, ...]]:
+        """Compiled mode: tuples for pred matching pattern, from facts then rules."""
+        if self.tabling and pred in self._compiled and pred not in self._derived:
+            return self._table_answers(pred, pattern, lambda key: self._match_untabled(pred, key))
+        return self._match_untabled(pred, pattern)
+
+    def _match_untabled(self, pred: str, pattern: tuple[Any, ...]) -> Iterator[tuple[Any, ...]]:
+        stats = self._recording
+        for relation in (self.facts.get(pred), self._derived.get(pred)):
+            if relation is not None:
+                candidates = relation.lookup(pattern)
+                if stats is not None:
+                    candidates = list(candidates)
+                    stats.predicate(pred).facts_scanned += len(candidates)
+                for fact in candidates:
+                    if len(fact) == len(pattern):
+                        yield fact
+        if pred in self._derived:
             return
-        yield subst
+        for k, (arity, solve) in enumerate(self._compiled.get(pred, ())):
+            if arity == len(pattern):
+                answers = solve(self, pattern)
+                yield from answers if stats is None else stats.expand(pred, k, answers)
 
-    def _prove_forall(
+    def _solve(self, goal: Goal, scope: int, env: Bindings) -> Iterator[None]:
+        """
+        Interpret mode: yields each time env holds a solution of goal, with
+        goal's Vars read in scope. Bindings made for a solution stay live
+        only until the generator is resumed or closed.
+        """
+        if isinstance(goal, FactGoal):
+            yield from self._solve_fact(goal, scope, env)
+        elif isinstance(goal, ConjGoal):
+            yield from self._solve_conj(goal.goals, 0, scope, env)
+        elif isinstance(goal, NegGoal):
+            yield from self._solve_neg(goal, scope, env)
+        elif isinstance(goal, ForallGoal):
+            yield from self._solve_forall(goal, scope, env)
+
+    @staticmethod
+    def _resolve(args: tuple[Any, ...], scope: int, env: Bindings) -> tuple[tuple[Any, ...], list[Any]]:
+        """
+        Lookup pattern for args (bound Vars replaced by their values) and the
+        matching terms, where each unbound position holds an _Alias to its
+        variable.
+        """
+        pattern: list[Any] = []
+        terms: list[Any] = []
+        for a in args:
+            if isinstance(a, Var):
+                key, value = env.walk((a.name, scope))
+                if value is _UNBOUND:
+                    pattern.append(a)
+                    terms.append(_Alias(key))
+                    continue
+                a = value
+            pattern.append(a)
+            terms.append(a)
+        return tuple(pattern), terms
+
+    def _solve_fact(self, goal: FactGoal, scope: int, env: Bindings) -> Iterator[None]:
+        """Prove fact by fact-base lookup or rule application."""
+        if self._step_limit is not None:
+            self._step()
+        pred = goal.pred
+        pattern, terms = self._resolve(goal.args, scope, env)
+        stats = self._recording
+        if self.tabling and pred in self._compiled and pred not in self._derived:
+            def answers() -> Iterable[tuple[Any, ...]]:
+                return self._table_answers(pred, pattern, lambda key: self._fact_answers(pred, key))
+
+            yield from self._bind_answers(answers() if stats is None else stats.goal(pred, answers), terms, env)
+            return
+        solutions = self._solve_untabled(pred, pattern, terms, env)
+        if stats is not None:
+            entry = stats.predicate(pred)
+            entry.goals += 1
+            solutions = _timed(entry, solutions, None)
+        yield from solutions
+
+    def _fact_answers(self, pred: str, pattern: tuple[Any, ...]) -> Iterator[tuple[Any, ...]]:
+        """Interpretive mode: tuples for pred matching pattern (for tabling)."""
+        env = Bindings()
+        pattern, terms = self._resolve(pattern, 0, env)
+        for _ in self._solve_untabled(pred, pattern, terms, env):
+            yield tuple(
+                a if not isinstance(a, Var) or (v := env.walk(t.key)[1]) is _UNBOUND else v
+                for a, t in zip(pattern, terms)
+            )
+
+    def _solve_untabled(
         self,
-        goal: ForallGoal,
-        subst: dict[str, Any],
-    ) -> Iterator[dict[str, Any]]:
+        pred: str,
+        pattern: tuple[Any, ...],
+        terms: list[Any],
+        env: Bindings,
+    ) -> Iterator[None]:
+        # Try fact base (and the materialized relation, if any); bound Vars
+        # are already resolved in pattern so the index can narrow the scan
+        stats = self._recording
+        for relation in (self.facts.get(pred), self._derived.get(pred)):
+            if relation is not None:
+                candidates = relation.lookup(pattern)
+                if stats is not None:
+                    candidates = list(candidates)
+                    entry = stats.predicate(pred)
+                    entry.facts_scanned += len(candidates)
+                    entry.unifications += len(candidates)
+                answers = (f for f in candidates if len(f) == len(pattern))
+                yield from self._bind_answers(answers, terms, env)
+        if pred in self._derived:
+            return
+
+        # Try rules: bind head vars, in a fresh scope, to the goal's terms
+        k = -1
+        for index, (rule_pred, var_names, body) in enumerate(self.rules):
+            if rule_pred != pred or len(var_names) != len(terms):
+                continue
+            k += 1
+            if self.reorder:
+                bound = frozenset(n for n, t in zip(var_names, terms) if type(t) is not _Alias)
+                plan = self._plans.get((index, bound))
+                if plan is None:
+                    plan = self._plans[(index, bound)] = self._plan(body, set(bound))
+                body = plan
+            rule_scope = env.new_scope()
+            mark = len(env.trail)
+            try:
+                if stats is not None:
+                    stats.predicate(pred).unifications += 1
+                if all(env.unify((name, rule_scope), t) for name, t in zip(var_names, terms)):
+                    solutions = self._solve(body, rule_scope, env)
+                    yield from solutions if stats is None else stats.expand(pred, k, solutions)
+            finally:
+                env.undo_to(mark)
+
+    @staticmethod
+    def _bind_answers(answers: Iterable[tuple[Any, ...]], terms: list[Any], env: Bindings) -> Iterator[None]:
+        """
+        Bind the unbound terms to each answer in turn. Bound positions already
+        agree (answers come from a lookup on them). A Var in an answer (an
+        unbound position of a tabled answer) matches anything.
+        """
+        free = [(i, t.key) for i, t in enumerate(terms) if type(t) is _Alias]
+        for answer in answers:
+            mark = len(env.trail)
+            try:
+                if all(isinstance(answer[i], Var) or env.unify(key, answer[i]) for i, key in free):
+                    yield
+            finally:
+                env.undo_to(mark)
+
+    def _solve_conj(self, goals: tuple[Goal, ...], i: int, scope: int, env: Bindings) -> Iterator[None]:
+        """Prove conjunction: prove each subgoal in turn on the shared bindings."""
+        if i == len(goals):
+            yield
+            return
+        for _ in self._solve(goals[i], scope, env):
+            yield from self._solve_conj(goals, i + 1, scope, env)
+
+    def _solve_neg(self, goal: NegGoal, scope: int, env: Bindings) -> Iterator[None]:
+        """Negation-as-failure: succeed iff subgoal has no solutions."""
+        if not _has_solution(self._solve(goal.goal, scope, env)):
+            yield
+
+    def _solve_forall(self, goal: ForallGoal, scope: int, env: Bindings) -> Iterator[None]:
         """Prove forall X in domain: body(X)."""
-        for x in goal.domain(self, subst):
-            new_subst = {**subst, goal.var.name: x}
-            if not any(True for _ in self.prove(goal.body, new_subst)):
+        shape = subset_shape(goal) if self.bitset_kernel else None
+        if shape is not None and self._kernel_applies(shape):
+            x, y = (
+                env.walk((a.name, scope))[1] if isinstance(a, Var) else a
+                for a in (shape[2], shape[5])
+            )
+            if x is not _UNBOUND and y is not _UNBOUND:
+                if self._kernel.covers(self, shape, x, y):
+                    yield
                 return
-        yield subst
+
+        # X is fresh in an inner scope; every other Var aliases the outer one.
+        inner = env.new_scope()
+        mark = len(env.trail)
+        try:
+            for name in _var_names(goal) - {goal.var.name}:
+                env.bind((name, inner), _Alias((name, scope)))
+            key = (goal.var.name, inner)
+            if isinstance(goal.domain, FactGoal):
+                values = list(dict.fromkeys(env.walk(key)[1] for _ in self._solve(goal.domain, inner, env)))
+            else:
+                subst = {}
+                for name, s in list(env.values):
+                    if s == scope and (value := env.walk((name, s))[1]) is not _UNBOUND:
+                        subst[name] = value
+                values = goal.domain(self, subst)
+            holds = True
+            for x in values:
+                m = len(env.trail)
+                env.bind(key, x)
+                holds = _has_solution(self._solve(goal.body, inner, env))
+                env.undo_to(m)
+                if not holds:
+                    break
+        finally:
+            env.undo_to(mark)
+        if holds:
+            yield
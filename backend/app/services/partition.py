@@ -0,0 +1,123 @@
+"""
+Independent parts of an allocation run.
+
+A task only goes to a member who can_perform it (has every required skill),
+and assigning it changes only that member's workload. Tasks that share no
+capable member therefore never compete: skill_components() splits a run's
+KBSnapshot into the connected components of its member/task can_perform
+graph, and pack() groups the components into a few parts of similar size,
+each allocated on its own (see reasoning._allocate_partitioned). The
+workers read the run's snapshot from one file (shared_snapshot()) that
+each memory-maps, rather than from a pickled copy per part.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator
+
+from app.core.config import settings
+from app.services.kb_snapshot import KBSnapshot, write_snapshot
+
+# (member positions, task positions) in the snapshot, both ascending
+Part = tuple[list[int], list[int]]
+
+_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+
+
+def skill_components(snapshot: KBSnapshot) -> list[Part]:
+    """
+    Connected components of the can_perform graph, ordered by their first
+    task. A task no member can perform is a component without members;
+    members who can perform no task belong to no component.
+    """
+    n_members = len(snapshot.member_id)
+    members_with: dict[int, set[int]] = {}
+    for i in range(n_members):
+        for sid in snapshot.member_skills(i):
+            members_with.setdefault(sid, set()).add(i)
+    everyone = set(range(n_members))
+
+    # Union-find over members (0..n_members-1) and tasks (n_members + j)
+    parent = list(range(n_members + len(snapshot.task_id)))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    capable: dict[frozenset[int], set[int]] = {}
+    for j in range(len(snapshot.task_id)):
+        skills = frozenset(snapshot.task_skills(j))
+        if skills not in capable:
+            capable[skills] = set.intersection(*(members_with.get(sid, set()) for sid in skills)) if skills else everyone
+        root = find(n_members + j)
+        for i in capable[skills]:
+            other = find(i)
+            if other != root:
+                parent[other] = root
+
+    parts: dict[int, Part] = {}
+    for j in range(len(snapshot.task_id)):
+        parts.setdefault(find(n_members + j), ([], []))[1].append(j)
+    for i in range(n_members):
+        part = parts.get(find(i))
+        if part is not None:
+            part[0].append(i)
+    return list(parts.values())
+
+
+def pack(components: list[Part], n: int) -> list[Part]:
+    """
+    components grouped into at most n parts, largest first to the part with
+    the least work (tasks × members, ties to the earlier part); empty parts
+    are dropped. Deterministic for the same components.
+    """
+    parts: list[Part] = [([], []) for _ in range(max(1, n))]
+    work = [0] * len(parts)
+    order = sorted(range(len(components)), key=lambda c: -len(components[c][1]) * max(1, len(components[c][0])))
+    for c in order:
+        members, tasks = components[c]
+        k = min(range(len(parts)), key=work.__getitem__)
+        parts[k][0].extend(members)
+        parts[k][1].extend(tasks)
+        work[k] += len(tasks) * max(1, len(members))
+    return [(sorted(members), sorted(tasks)) for members, tasks in parts if tasks]
+
+
+def executor() -> ProcessPoolExecutor:
+    """The process pool parts are allocated in (ALLOCATION_PARTITION_WORKERS processes)."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.ALLOCATION_PARTITION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+@contextmanager
+def shared_snapshot(snapshot: KBSnapshot) -> Iterator[str]:
+    """Path of snapshot written to a file in KB_SNAPSHOT_DIR (see load_snapshot), removed on exit."""
+    directory = settings.KB_SNAPSHOT_DIR or None
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="kraft-run-", suffix=".snap", dir=directory)
+    os.close(fd)
+    try:
+        write_snapshot(snapshot, path)
+        yield path
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            # Still mapped by a worker on Windows; the temp dir is cleaned up eventually
+            pass
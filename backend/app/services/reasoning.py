@@ -7,14 +7,21 @@ Rules are declarative; the engine performs unification and resolution.
 
 from __future__ import annotations
 
+import heapq
+import json
+from array import array
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Literal, Sequence
 
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 if TYPE_CHECKING:
     from app.db.models import Task, TeamMember
 
+from app.core.config import settings
+from app.db.session import SessionLocal
 from app.schemas.allocation import (
     AllocateRequest,
     AllocateResponse,
@@ -25,14 +32,21 @@ from app.schemas.allocation import (
     ExplainTaskResponse,
     UnassignedTask,
 )
+from app.services import kb_cache, partition, run_store
+from app.services.assignment import solve_capacitated_assignment
+from app.services.kb_snapshot import KBSnapshot, load_snapshot
+from app.services.partition import Part, pack, skill_components
 from app.services.logic_engine import (
     ConjGoal,
+    EngineStats,
     FactGoal,
     ForallGoal,
     LogicEngine,
     NegGoal,
+    ProofBudgetExceeded,
     Var,
 )
+from app.services.scoring import CandidateScores, MemberFeatures, MemberProfile, member_profiles, score_candidates
 from app.services.explanation_llm import maybe_generate_run_explanation, maybe_generate_task_explanation
 
 # ---------------------------------------------------------------------------
@@ -43,51 +57,92 @@ RULE_CAN_PERFORM = "can_perform(M,T) ← ∀S: requires_skill(T,S) ⇒ has_skill
 RULE_ELIGIBLE = "eligible(M,T) ← member(M) ∧ can_perform(M,T) ∧ available(M) ∧ ¬overloaded(M)"
 RULE_PREFERRED = "preferred(M,T,S) ← eligible(M,T) ∧ S = multi_factor_score(M,T)"
 RULE_BEST = "best_candidate(M,T) ← preferred(M,T,S) ∧ ∀M′: S ≥ S′"
+RULE_BATCH = "best_candidate(M,T) ← preferred(M,T,S) ∧ (M,T) ∈ argmax Σ S over all tasks, |{T : assign(M,T)}| ≤ capacity(M)"
 
 # Max tasks per person per run — prevents one person taking all tasks
 OVERLOAD_LIMIT = 3
 
 
-def _domain_required_skills(engine: LogicEngine, subst: dict) -> list:
-    """Domain for ∀S: yields all S such that requires_skill(T, S)."""
-    T = subst.get("T")
-    if T is None:
-        return []
-    result = []
-    for (tid, sid) in engine.facts.get("requires_skill", set()):
-        if tid == T:
-            result.append(sid)
-    return result
+def build_engine_from_kb(
+    members: list["TeamMember"],
+    tasks: list["Task"],
+    mode: str | None = None,
+    tabling: bool | None = None,
+    materialize: bool | None = None,
+    bitset_kernel: bool | None = None,
+    reorder: bool | None = None,
+    max_steps: int | None = None,
+    stats: EngineStats | None = None,
+) -> LogicEngine:
+    """
+    Load knowledge base into logic engine and register rules.
+    `mode`, `tabling`, `materialize`, `bitset_kernel`, `reorder` and
+    `max_steps` override the LOGIC_ENGINE_* settings; with materialization
+    the derived predicates are computed bottom-up here. `stats` is attached
+    before any fact is loaded, so materialization is profiled too.
+    """
+    return build_engine_from_snapshot(
+        KBSnapshot.from_orm(members, tasks),
+        mode=mode,
+        tabling=tabling,
+        materialize=materialize,
+        bitset_kernel=bitset_kernel,
+        reorder=reorder,
+        max_steps=max_steps,
+        stats=stats,
+    )
 
 
-def build_engine_from_kb(members: list["TeamMember"], tasks: list["Task"]) -> LogicEngine:
-    """Load knowledge base into logic engine and register rules."""
-    engine = LogicEngine()
+def build_engine_from_snapshot(
+    snapshot: KBSnapshot,
+    mode: str | None = None,
+    tabling: bool | None = None,
+    materialize: bool | None = None,
+    bitset_kernel: bool | None = None,
+    reorder: bool | None = None,
+    max_steps: int | None = None,
+    stats: EngineStats | None = None,
+) -> LogicEngine:
+    """build_engine_from_kb() over a KBSnapshot (e.g. a view of the KB cache's)."""
+    engine = LogicEngine(
+        mode=mode or settings.LOGIC_ENGINE_MODE,
+        tabling=settings.LOGIC_ENGINE_TABLING if tabling is None else tabling,
+        bitset_kernel=settings.LOGIC_ENGINE_BITSET_KERNEL if bitset_kernel is None else bitset_kernel,
+        reorder=settings.LOGIC_ENGINE_REORDER if reorder is None else reorder,
+        max_steps=(settings.LOGIC_ENGINE_MAX_STEPS if max_steps is None else max_steps) or None,
+        stats=stats,
+    )
 
     # Ground facts from DB
-    for m in members:
-        engine.assert_fact("member", m.id)
-        w = len(m.assigned_tasks) if hasattr(m, "assigned_tasks") and m.assigned_tasks else 0
-        engine.assert_fact("workload", m.id, w)
-        if m.calendar_availability:
-            engine.assert_fact("available", m.id)
+    for i, mid in enumerate(snapshot.member_id):
+        engine.assert_fact("member", mid)
+        w = snapshot.member_workload[i]
+        engine.assert_fact("workload", mid, w)
+        if snapshot.member_available[i]:
+            engine.assert_fact("available", mid)
         if w > OVERLOAD_LIMIT:
-            engine.assert_fact("overloaded", m.id)
-        for s in m.skills:
-            engine.assert_fact("has_skill", m.id, s.id)
+            engine.assert_fact("overloaded", mid)
+        for sid in snapshot.member_skills(i):
+            engine.assert_fact("has_skill", mid, sid)
 
-    for t in tasks:
-        for s in t.required_skills:
-            engine.assert_fact("requires_skill", t.id, s.id)
+    for i, tid in enumerate(snapshot.task_id):
+        engine.assert_fact("task", tid)
+        for sid in snapshot.task_skills(i):
+            engine.assert_fact("requires_skill", tid, sid)
 
     # Rule: can_perform(M, T) ← ∀S: requires_skill(T,S) ⇒ has_skill(M,S)
-    def domain_fn(e: LogicEngine, s: dict):
-        return iter(_domain_required_skills(e, s))
-
-    body_can_perform = ForallGoal(
-        Var("S"),
-        domain_fn,
-        FactGoal("has_skill", (Var("M"), Var("S"))),
+    # member(M) ∧ task(T) type the head variables so the rule stays
+    # range-restricted for bottom-up materialization.
+    body_can_perform = ConjGoal(
+        (
+            FactGoal("member", (Var("M"),)),
+            FactGoal("task", (Var("T"),)),
+            ForallGoal(
+                Var("S"),
+                FactGoal("requires_skill", (Var("T"), Var("S"))),
+                FactGoal("has_skill", (Var("M"), Var("S"))),
+            ),
+        )
     )
     engine.add_rule("can_perform", ["M", "T"], body_can_perform)
 
@@ -102,9 +157,18 @@ def build_engine_from_kb(members: list["TeamMember"], tasks: list["Task"]) -> Lo
     )
     engine.add_rule("eligible", ["M", "T"], body_eligible)
 
+    if settings.LOGIC_ENGINE_MATERIALIZE if materialize is None else materialize:
+        # Budgeted as one can_perform and one eligible goal per member and task
+        with engine.budget(goals=2 * len(snapshot.member_id) * len(snapshot.task_id)):
+            engine.materialize()
     return engine
 
 
+def _task_skill_ids(engine: LogicEngine, task_id: int) -> list[int]:
+    """All S such that requires_skill(task_id, S), via the engine's argument index."""
+    return engine.project("requires_skill", task_id, Var("S"))
+
+
 # ---------------------------------------------------------------------------
 # Knowledge base (for names, workload lookup in scoring)
 # ---------------------------------------------------------------------------
@@ -125,15 +189,17 @@ def build_knowledge_base(
     tasks: list["Task"],
 ) -> KnowledgeBase:
     """Build lookup tables for reasoning trace and scoring."""
-    kb = KnowledgeBase()
-    for m in members:
-        kb.member_name[m.id] = m.name
-        kb.workload[m.id] = len(m.assigned_tasks) if hasattr(m, "assigned_tasks") and m.assigned_tasks else 0
-    for t in tasks:
-        kb.task_name[t.id] = t.task_name
-        for s in t.required_skills:
-            kb.skill_name[s.id] = s.skill_name
-    return kb
+    return knowledge_base_from_snapshot(KBSnapshot.from_orm(members, tasks))
+
+
+def knowledge_base_from_snapshot(snapshot: KBSnapshot) -> KnowledgeBase:
+    """Lookup tables for reasoning trace and scoring, from a KBSnapshot."""
+    return KnowledgeBase(
+        member_name=dict(zip(snapshot.member_id, snapshot.member_name)),
+        task_name=dict(zip(snapshot.task_id, snapshot.task_name)),
+        skill_name=dict(snapshot.skill_name),
+        workload=dict(zip(snapshot.member_id, snapshot.member_workload)),
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -315,29 +381,41 @@ def build_chosen_trace(
     kb: KnowledgeBase,
     engine: LogicEngine,
     score: float,
+    best_rule: str = RULE_BEST,
 ) -> list[InferenceStep]:
     """Build inference trace for the chosen member from engine state."""
+    required_sids = _task_skill_ids(engine, task_id)
+    member_sids = set(engine.project("has_skill", member_id, Var("S")))
+    return _chosen_trace(
+        kb.member_name.get(member_id, str(member_id)),
+        kb.task_name.get(task_id, str(task_id)),
+        [kb.skill_name.get(sid, str(sid)) for sid in required_sids],
+        [kb.skill_name.get(sid, str(sid)) for sid in required_sids if sid in member_sids],
+        kb.workload.get(member_id, 0),
+        score,
+        best_rule,
+    )
+
+
+def _chosen_trace(
+    name: str,
+    task: str,
+    required_skills: list[str],
+    member_skills: list[str],
+    workload: int,
+    score: float,
+    best_rule: str,
+) -> list[InferenceStep]:
+    """The trace steps for one assignment; member_skills are the required skills the member has."""
     tr = TraceRecorder()
-    name = kb.member_name.get(member_id, str(member_id))
-    task = kb.task_name.get(task_id, str(task_id))
-
-    req_steps = []
-    for (tid, sid) in engine.facts.get("requires_skill", set()):
-        if tid == task_id:
-            sk = kb.skill_name.get(sid, str(sid))
-            req_steps.append(tr.fact(f"requires_skill({task}, {sk})"))
-    has_steps = []
-    required_sids = {sid for (tid, sid) in engine.facts.get("requires_skill", set()) if tid == task_id}
-    for (mid, sid) in engine.facts.get("has_skill", set()):
-        if mid == member_id and sid in required_sids:
-            sk = kb.skill_name.get(sid, str(sid))
-            has_steps.append(tr.fact(f"has_skill({name}, {sk})"))
-    tr.fact(f"workload({name}, {kb.workload.get(member_id, 0)})")
+    req_steps = [tr.fact(f"requires_skill({task}, {sk})") for sk in required_skills]
+    has_steps = [tr.fact(f"has_skill({name}, {sk})") for sk in member_skills]
+    tr.fact(f"workload({name}, {workload})")
     tr.fact(f"available({name}, yes)")
     tr.derived(f"can_perform({name}, {task})", RULE_CAN_PERFORM, req_steps + has_steps)
     tr.derived(f"eligible({name}, {task})", RULE_ELIGIBLE, [tr.steps[-1].step])
     tr.derived(f"preferred({name}, {task}, {score:.2f})", RULE_PREFERRED, [tr.steps[-1].step])
-    tr.derived(f"best_candidate({name}, {task}) → assign({name}, {task})", RULE_BEST, [tr.steps[-1].step])
+    tr.derived(f"best_candidate({name}, {task}) → assign({name}, {task})", best_rule, [tr.steps[-1].step])
     return tr.build()
 
 
@@ -346,56 +424,474 @@ def build_chosen_trace(
 # ---------------------------------------------------------------------------
 
 
+def _member_profiles(db: Session, members: list["TeamMember"]) -> dict[int, MemberProfile]:
+    """Scoring features of members: from the KB cache when enabled, else parsed here."""
+    return member_profiles(members, kb_cache.member_profiles(db) if settings.KB_CACHE_ENABLED else None)
+
+
+# (member id, name, years of experience, availability slot count) per run member
+_MemberRow = tuple[int, str, "int | None", int]
+
+# A member / task as a partition worker receives it: the fields the optimal
+# strategy reads of the rows, as plain tuples instead of pickled ORM rows
+_PartMember = tuple[int, str, "str | None"]  # id, name, calendar_availability
+_PartTask = tuple[int, str, "float | None", "int | None"]  # id, task_name, estimated_time, priority_order
+
+# Why a member is not eligible for a task, one byte per member (0 = eligible)
+_REJECT_MISSING_SKILL = 1
+_REJECT_OVERLOADED = 2
+_REJECT_UNAVAILABLE = 3
+
+
+@dataclass
+class _RunContext:
+    """Per-run state the allocation strategies read and update."""
+
+    members: list["TeamMember"]
+    member_rows: list[_MemberRow]
+    engine: LogicEngine
+    kb: KnowledgeBase
+    profiles: dict[int, MemberProfile]
+    features: MemberFeatures
+    workload_map: dict[int, int]
+    max_workload: int
+    # Members proved can_perform, per required-skill set: fixed for the run
+    # (assignments change workload and overloaded, never skills)
+    capable: dict[frozenset[int], set[int]] = field(default_factory=dict)
+    # How much of each Assignment to build (AllocateRequest.explain_level)
+    explain_level: str = "full"
+    explain_top_k: int = 3
+
+
 @dataclass
-class _CandidateResult:
-    member_id: int
-    member_name: str
-    eligible: bool
-    score: float
-    reasons: list[str]
-    rejection_reasons: list[str] | None
-    years_of_experience: int | None = None
-    current_workload: int | None = None
-    predicted_hours: float | None = None
-    availability_slots: int | None = None
+class _TaskCandidates:
+    """
+    One task's eligible members with their MCDM scores and workloads at
+    scoring time, and why each other member was rejected. Holds no ORM
+    objects, so a finished run can keep it (see _StoredRun) and build the
+    explanation rows only when they are asked for.
+    """
+
+    task_id: int
+    task_name: str
+    required_skill_names: list[str]
+    scored: CandidateScores  # eligible members, in member order
+    workload: array  # per eligible member, aligned with scored.member_ids
+    rejected: bytes  # per run member (member_rows order): 0 or a _REJECT_* code
+
+    @property
+    def eligible_ids(self) -> list[int]:
+        return self.scored.member_ids
+
+    def score(self, member_id: int) -> float:
+        return self.scored.scores[self.scored.member_ids.index(member_id)]
+
+    def best_id(self) -> int:
+        """best_candidate: the first eligible member with the highest score."""
+        scores = self.scored.scores
+        return self.scored.member_ids[max(range(len(scores)), key=scores.__getitem__)]
+
+    def rejection_reasons(self, code: int) -> list[str]:
+        if code == _REJECT_MISSING_SKILL:
+            names = self.required_skill_names
+            return [f"Missing required skill: {n}" for n in names] if names else ["No required skills"]
+        if code == _REJECT_OVERLOADED:
+            return ["Overloaded (workload exceeds threshold)"]
+        return ["Not available (no calendar)"]
+
+
+@dataclass
+class _RunResult:
+    assignments: list[Assignment] = field(default_factory=list)
+    unassigned_tasks: list[UnassignedTask] = field(default_factory=list)
+    top_assignments: list[dict[str, str]] = field(default_factory=list)
+    # Rejection reason -> members rejected with it, over assigned tasks (first-seen order)
+    rejection_counts: dict[str, int] = field(default_factory=dict)
+    # task id -> (candidates, chosen member, selection rule), per assigned task
+    evidence: dict[int, tuple[_TaskCandidates, int, str]] = field(default_factory=dict)
+    member_rows: list[_MemberRow] = field(default_factory=list)
+    # False when assignments are streamed out: keep them without trace or candidate rows
+    retain_detail: bool = True
+    # The run's member profiles and KB snapshot, for a second round in the same request
+    profiles: dict[int, MemberProfile] = field(default_factory=dict)
+    snapshot: KBSnapshot | None = None
+
+
+@dataclass
+class _StoredRun:
+    """
+    What run_store keeps of a run: its assignments without trace or
+    candidate rows, and the evidence to rebuild them (force-round
+    assignments are kept whole; they have no evidence).
+    """
+
+    assignments: dict[int, Assignment]
+    evidence: dict[int, tuple[_TaskCandidates, int, str]]
+    member_rows: list[_MemberRow]
+
+
+def _task_candidates(ctx: _RunContext, task: "Task") -> _TaskCandidates:
+    """Prove eligible(M, task) and score the eligible members at the current engine state."""
+    engine, kb = ctx.engine, ctx.kb
+    # Logical query: find all M such that eligible(M, task.id), as one
+    # set-at-a-time query (a relation lookup once materialized; the engine
+    # propagates overloaded changes after each assignment into it), under
+    # the LOGIC_ENGINE_MAX_STEPS budget for each member's eligible(m, task)
+    with engine.budget(goals=len(ctx.members)):
+        eligible_set = set(engine.project("eligible", Var("M"), task.id))
+    eligible_ids = [m.id for m in ctx.members if m.id in eligible_set]
+
+    # Rejection codes of ineligible members (for explanations and the run summary)
+    overloaded_ids = {f[0] for f in engine.facts.get("overloaded", set())}
+    task_skill_ids = _task_skill_ids(engine, task.id)
+    required_skill_names = [kb.skill_name.get(sid, str(sid)) for sid in task_skill_ids]
+
+    capable: set[int] = eligible_set
+    if len(eligible_set) < len(ctx.members):
+        # Tasks requiring the same skills share one set-at-a-time query,
+        # instead of a can_perform proof per ineligible member per task
+        skill_key = frozenset(task_skill_ids)
+        if skill_key not in ctx.capable:
+            with engine.budget(goals=len(ctx.members)):
+                ctx.capable[skill_key] = set(engine.project("can_perform", Var("M"), task.id))
+        capable = ctx.capable[skill_key]
+
+    def rejection(mid: int) -> int:
+        if mid in eligible_set:
+            return 0
+        if mid not in capable:
+            return _REJECT_MISSING_SKILL
+        if mid in overloaded_ids:
+            return _REJECT_OVERLOADED
+        return _REJECT_UNAVAILABLE
+
+    # All eligible members scored at once (see app/services/scoring.py);
+    # equal to predicted_completion_hours / delivery_speed_score / mcdm_score
+    scored = score_candidates(
+        ctx.features,
+        eligible_ids,
+        task.estimated_time,
+        dynamic_factor_weights(task),
+        ctx.max_workload,
+        vectorized=settings.SCORING_VECTORIZED,
+    )
+    return _TaskCandidates(
+        task_id=task.id,
+        task_name=task.task_name,
+        required_skill_names=required_skill_names,
+        scored=scored,
+        workload=array("q", (ctx.workload_map.get(mid, 0) for mid in eligible_ids)),
+        rejected=bytes(rejection(row[0]) for row in ctx.member_rows),
+    )
+
+
+def _candidate_explanations(
+    member_rows: list[_MemberRow],
+    tc: _TaskCandidates,
+    chosen_id: int,
+    level: str,
+    top_k: int = 3,
+) -> list[AssignmentExplanation]:
+    """
+    Explanation rows in member order: every member for level "full"; the
+    top_k best-scoring eligible members (chosen always among them) for
+    "top"; none for "none".
+    """
+    if level == "none":
+        return []
+    scored = tc.scored
+    position = {mid: i for i, mid in enumerate(scored.member_ids)}
+    if level == "top":
+        ranked = sorted(scored.member_ids, key=lambda mid: scored.scores[position[mid]], reverse=True)
+        keep = set(ranked[:top_k])
+        if chosen_id not in keep:
+            keep = {chosen_id, *ranked[: top_k - 1]}
+    rows = []
+    for (mid, name, years, slots), code in zip(member_rows, tc.rejected):
+        if level == "top" and mid not in keep:
+            continue
+        if code:
+            rows.append(
+                AssignmentExplanation(
+                    member_id=mid,
+                    member_name=name,
+                    chosen=(mid == chosen_id),
+                    reasons=[],
+                    rejection_reasons=tc.rejection_reasons(code),
+                    score=None,
+                )
+            )
+            continue
+        i = position[mid]
+        pred_h = scored.predicted_hours[i]
+        score, factors, weighted, weights = scored.scores[i], scored.factors(i), scored.weighted(i), scored.weights
+        reasons = [
+            f"MCDM score: {score:.3f}",
+            f"Predicted completion time: {pred_h:.2f}h",
+            f"Workload fairness {factors['workload']:.2f} × w{weights['workload']:.2f} = {weighted['workload']:.2f}",
+            f"Experience {factors['experience']:.2f} × w{weights['experience']:.2f} = {weighted['experience']:.2f}",
+            f"Availability {factors['availability']:.2f} × w{weights['availability']:.2f} = {weighted['availability']:.2f}",
+            f"Skill breadth {factors['skill_breadth']:.2f} × w{weights['skill_breadth']:.2f} = {weighted['skill_breadth']:.2f}",
+            f"Delivery speed {factors['delivery_speed']:.2f} × w{weights['delivery_speed']:.2f} = {weighted['delivery_speed']:.2f}",
+        ]
+        rows.append(
+            AssignmentExplanation(
+                member_id=mid,
+                member_name=name,
+                chosen=(mid == chosen_id),
+                reasons=reasons,
+                rejection_reasons=None,
+                score=score,
+                years_of_experience=years,
+                current_workload=tc.workload[i],
+                predicted_hours=pred_h,
+                availability_slots=slots,
+            )
+        )
+    return rows
+
+
+def _no_eligible_reason(tc: _TaskCandidates) -> str:
+    if tc.required_skill_names:
+        return f"No team member has required skills: {', '.join(tc.required_skill_names)}"
+    return "No eligible team member (skills or availability)"
+
+
+def _record_assignment(
+    ctx: _RunContext,
+    tc: _TaskCandidates,
+    chosen_id: int,
+    result: _RunResult,
+    selection: str,
+    best_rule: str = RULE_BEST,
+) -> Assignment:
+    """
+    Record and return the Assignment of tc's task to chosen_id, with its
+    explanation and, as ctx.explain_level asks, its trace and candidate
+    rows; selection is the sentence saying how the member was picked.
+    """
+    i = tc.eligible_ids.index(chosen_id)
+    chosen_score = tc.scored.scores[i]
+    chosen_factors, chosen_weighted, chosen_weights = tc.scored.factors(i), tc.scored.weighted(i), tc.scored.weights
+    chosen_member = next(m for m in ctx.members if m.id == chosen_id)
+    required_skill_names = tc.required_skill_names
+
+    constraints_satisfied = (
+        [f"Has all required skills: {', '.join(required_skill_names)}"] if required_skill_names else []
+    )
+    if chosen_member.calendar_availability:
+        constraints_satisfied.append(f"Has availability: {chosen_member.calendar_availability}")
+
+    chosen_pred_h = tc.scored.predicted_hours[i]
+    top_factors = sorted(chosen_weighted.items(), key=lambda x: x[1], reverse=True)[:2]
+    top_factor_text = ", ".join(
+        f"{name}({chosen_factors[name]:.2f}×w{chosen_weights[name]:.2f})"
+        for name, _ in top_factors
+    )
+    fallback_explanation = (
+        f"{chosen_member.name} assigned to {tc.task_name} by logical inference: "
+        f"eligible(M,T) proved (can_perform, available, ¬overloaded). "
+        f"{selection} "
+        f"Predicted completion time for this member: {chosen_pred_h:.2f}h. "
+        f"Top contributors: {top_factor_text}."
+    )
+    explanation = fallback_explanation
+
+    inference_trace = (
+        build_chosen_trace(chosen_id, tc.task_id, ctx.kb, ctx.engine, chosen_score, best_rule=best_rule)
+        if ctx.explain_level != "none"
+        else []
+    )
+    candidate_explanations = _candidate_explanations(ctx.member_rows, tc, chosen_id, ctx.explain_level, ctx.explain_top_k)
+    _count_rejections(result.rejection_counts, tc)
+
+    assignment = Assignment(
+        task_id=tc.task_id,
+        task_name=tc.task_name,
+        team_member_id=chosen_id,
+        team_member_name=chosen_member.name,
+        score=chosen_score,
+        explanation=explanation,
+        constraints_satisfied=constraints_satisfied,
+        inference_trace=inference_trace,
+        candidate_explanations=candidate_explanations,
+    )
+    result.assignments.append(
+        assignment
+        if result.retain_detail
+        else assignment.model_copy(update={"inference_trace": [], "candidate_explanations": []})
+    )
+    result.top_assignments.append(
+        {
+            "task_name": tc.task_name,
+            "member_name": chosen_member.name,
+            "score": f"{chosen_score:.3f}",
+            "top_factors": ", ".join(name for name, _ in top_factors),
+        }
+    )
+    result.evidence[tc.task_id] = (tc, chosen_id, best_rule)
+    return assignment
+
+
+def _count_rejections(counts: dict[str, int], tc: _TaskCandidates) -> None:
+    """Add tc's rejections to counts: per member, in member order, as if every reason were listed."""
+    for code in dict.fromkeys(tc.rejected):
+        if code:
+            members_rejected = tc.rejected.count(code)
+            for reason in tc.rejection_reasons(code):
+                counts[reason] = counts.get(reason, 0) + members_rejected
+
+
+def _allocate_greedy(
+    ctx: _RunContext, tasks: list["Task"], result: _RunResult
+) -> Iterator[Assignment | UnassignedTask]:
+    """
+    Tasks in priority order, each to its best-scoring eligible member; the
+    chosen member's workload is updated before the next task is scored.
+    Yields each decision as it is made.
+
+    Each task is scored once, when the loop reaches it, so there is no
+    per-task heap of earlier scores to patch: delivery speed is normalized
+    over the task's candidates and max_workload over the run, so one
+    assignment can move every candidate's score.
+    """
+    engine = ctx.engine
+    for task in tasks:
+        tc = _task_candidates(ctx, task)
+        if not tc.eligible_ids:
+            unassigned = UnassignedTask(task_id=task.id, task_name=task.task_name, reason=_no_eligible_reason(tc))
+            result.unassigned_tasks.append(unassigned)
+            yield unassigned
+            continue
+
+        # best_candidate: max multi-factor score among eligible
+        chosen_id = tc.best_id()
+        chosen_score = tc.score(chosen_id)
+        assignment = _record_assignment(
+            ctx, tc, chosen_id, result,
+            selection=f"Then selected by multi-factor scoring (MCDM) with final score {chosen_score:.2f}.",
+        )
+
+        # Always update workload for next task (even when apply=False) so allocation is balanced
+        old_w = ctx.workload_map.get(chosen_id, 0)
+        new_w = old_w + 1
+        ctx.workload_map[chosen_id] = new_w
+        ctx.kb.workload[chosen_id] = new_w
+        ctx.features.set_workload(chosen_id, new_w)
+        ctx.max_workload = max(ctx.workload_map.values(), default=0)
+        # Materialized relations re-derive eligible(chosen_id, T): one goal per task
+        with engine.budget(goals=len(engine.facts.get("task", ()))):
+            engine.retract_fact("workload", chosen_id, old_w)
+            engine.assert_fact("workload", chosen_id, new_w)
+            if new_w > OVERLOAD_LIMIT:
+                engine.assert_fact("overloaded", chosen_id)
+            elif old_w >= OVERLOAD_LIMIT and new_w <= OVERLOAD_LIMIT:
+                engine.retract_fact("overloaded", chosen_id)
+        yield assignment
+
+
+def _allocate_optimal(
+    ctx: _RunContext, tasks: list["Task"], result: _RunResult
+) -> Iterator[Assignment | UnassignedTask]:
+    """
+    The whole batch as one capacitated assignment: edges are the eligible
+    pairs proved at the start of the run, weighted by their MCDM scores
+    there, and each member takes tasks until overloaded (the bound greedy
+    reaches through overloaded(M)). Solved by min-cost flow
+    (app/services/assignment.py): most tasks assigned, then highest total
+    score, independent of task order. Yields each decision once the
+    whole batch is solved.
+    """
+    scored = [_task_candidates(ctx, task) for task in tasks]
+    capacity = {m.id: max(0, OVERLOAD_LIMIT + 1 - ctx.workload_map.get(m.id, 0)) for m in ctx.members}
+    chosen = solve_capacitated_assignment(
+        [list(zip(tc.eligible_ids, tc.scored.scores)) for tc in scored],
+        capacity,
+    )
+    names = {m.id: m.name for m in ctx.members}
+    for tc, chosen_id in zip(scored, chosen):
+        if chosen_id is None:
+            reason = (
+                _no_eligible_reason(tc)
+                if not tc.eligible_ids
+                else f"Every eligible member is needed for other tasks (max {OVERLOAD_LIMIT} tasks per run)."
+            )
+            unassigned = UnassignedTask(task_id=tc.task_id, task_name=tc.task_name, reason=reason)
+            result.unassigned_tasks.append(unassigned)
+            yield unassigned
+            continue
+        chosen_score = tc.score(chosen_id)
+        selection = (
+            "Then chosen by the optimal batch assignment (highest total MCDM score over all tasks) "
+            f"with score {chosen_score:.2f}."
+        )
+        best_id = tc.best_id()
+        if tc.score(best_id) > chosen_score:
+            selection += (
+                f" {names[best_id]} scored higher here ({tc.score(best_id):.2f}) "
+                "but is at capacity with tasks where the batch gains more."
+            )
+        yield _record_assignment(ctx, tc, chosen_id, result, selection=selection, best_rule=RULE_BATCH)
 
 
 def _run_force_round(
     db: Session,
-    request: AllocateRequest,
     tasks: list,
     members: list,
+    prior_member_ids: Iterable[int] = (),
+    profiles: dict[int, MemberProfile] | None = None,
+    snapshot: KBSnapshot | None = None,
 ) -> AllocateResponse:
     """
     Second-round allocation: relax skill requirement to partial match.
     Picks the member with highest skill overlap, then workload fairness, then experience.
+    prior_member_ids holds the member of each first-round assignment (their
+    workload this run); profiles and a snapshot holding the tasks, when the
+    first round already has them, are reused.
     """
-    from app.db.models import Task, TeamMember
-
     workload_map: dict[int, int] = {m.id: 0 for m in members}
-    if request.prior_assignments:
-        for pa in request.prior_assignments:
-            workload_map[pa.team_member_id] = workload_map.get(pa.team_member_id, 0) + 1
+    for mid in prior_member_ids:
+        workload_map[mid] = workload_map.get(mid, 0) + 1
 
+    if profiles is None:
+        profiles = _member_profiles(db, members)
     assignments: list[Assignment] = []
     unassigned_tasks: list[UnassignedTask] = []
     run_top_assignments: list[dict[str, str]] = []
 
-    for task in tasks:
-        required_skill_ids = {s.id for s in (task.required_skills or [])}
-        required_names = [s.skill_name for s in (task.required_skills or [])]
+    # Skill sets as bitmasks over the skills seen in this round, so a
+    # member's overlap with a task is one AND and a popcount
+    skill_bit: dict[int, int] = {}
+
+    def skill_mask(skill_ids: Iterable[int]) -> int:
+        mask = 0
+        for sid in skill_ids:
+            mask |= 1 << skill_bit.setdefault(sid, len(skill_bit))
+        return mask
+
+    # Only available members can take a task; their masks are fixed for the round
+    available = [
+        (m, m.id, skill_mask(profiles[m.id].skill_ids), m.years_of_experience or 0)
+        for m in members
+        if m.calendar_availability
+    ]
+    required_by_task = _required_skill_ids(db, tasks, snapshot)
 
-        # Candidates: available and not overloaded
-        candidates: list[tuple["TeamMember", float, int, int]] = []
-        for m in members:
-            if not m.calendar_availability:
-                continue
-            w = workload_map.get(m.id, 0)
+    for task in tasks:
+        required_mask = skill_mask(required_by_task[task.id])
+        required_count = required_mask.bit_count()
+
+        # Candidates: available and not overloaded, keyed by partial match
+        # desc, workload asc, experience desc, then member order
+        keys: list[tuple[float, int, int, int]] = []
+        for k, (_, mid, mask, exp) in enumerate(available):
+            w = workload_map.get(mid, 0)
             if w >= OVERLOAD_LIMIT:
                 continue
-            member_skill_ids = {s.id for s in (m.skills or [])}
-            overlap = len(required_skill_ids & member_skill_ids) / len(required_skill_ids) if required_skill_ids else 0
-            candidates.append((m, overlap, w, m.years_of_experience or 0))
+            overlap = (required_mask & mask).bit_count() / required_count if required_count else 0
+            keys.append((-overlap, w, -exp, k))
+        # The best three only, not a sort of every candidate
+        candidates = [(available[k][0], -neg_ov, w, -neg_exp) for neg_ov, w, neg_exp, k in heapq.nsmallest(3, keys)]
 
         if not candidates:
             unassigned_tasks.append(
@@ -407,8 +903,6 @@ def _run_force_round(
             )
             continue
 
-        # Sort: partial match desc, workload asc, experience desc
-        candidates.sort(key=lambda x: (-x[1], x[2], -x[3]))
         chosen = candidates[0][0]
         overlap = candidates[0][1]
         chosen_id = chosen.id
@@ -422,7 +916,7 @@ def _run_force_round(
 
         # Build candidate_explanations for "Why X over Y" (top 3)
         candidate_explanations = []
-        for i, (m, ov, w, exp) in enumerate(candidates[:3]):
+        for m, ov, w, exp in candidates:
             reasons = [
                 f"Partial match: {round(ov * 100)}%",
                 f"Workload: {w} task(s) this run",
@@ -504,13 +998,26 @@ def _run_force_round(
     )
 
 
-def run_allocation(db: Session, request: AllocateRequest) -> AllocateResponse:
+def _required_skill_ids(
+    db: Session, tasks: list["Task"], snapshot: KBSnapshot | None = None
+) -> dict[int, Sequence[int]]:
     """
-    Run allocation using logical inference.
-
-    The engine proves eligible(M, T) for each task T; we rank by workload
-    and select best_candidate. Rules are interpreted by the logic engine.
+    Required skill ids per task: from snapshot if given, else the KB cache
+    when enabled, else from each task's relation.
     """
+    required: dict[int, Sequence[int]] = {}
+    if snapshot is None and settings.KB_CACHE_ENABLED:
+        snapshot = kb_cache.view(db, [], tasks)
+    if snapshot is not None:
+        required = {tid: snapshot.task_skills(i) for i, tid in enumerate(snapshot.task_id)}
+    for task in tasks:
+        if task.id not in required:
+            required[task.id] = [s.id for s in (task.required_skills or [])]
+    return required
+
+
+def _load_run_rows(db: Session, request: AllocateRequest) -> tuple[list["Task"], list["TeamMember"]]:
+    """The unassigned tasks (priority order) and candidate members the request selects."""
     from app.db.models import Task, TeamMember
 
     task_query = db.query(Task).filter(Task.assignee_id.is_(None))
@@ -522,222 +1029,382 @@ def run_allocation(db: Session, request: AllocateRequest) -> AllocateResponse:
     if request.team_member_ids is not None:
         member_query = member_query.filter(TeamMember.id.in_(request.team_member_ids))
     members = member_query.all()
+    return tasks, members
 
-    if request.force_round and request.task_ids and tasks:
-        return _run_force_round(db, request, tasks, members)
 
-    if not tasks or not members:
-        return AllocateResponse(
-            assignments=[],
-            unassigned_task_ids=[t.id for t in tasks],
-            summary="No tasks to allocate or no team members available.",
-            overall_explanation="No allocation was performed because no tasks or no members were available.",
+def _allocation_events(
+    db: Session,
+    request: AllocateRequest,
+    tasks: list["Task"],
+    members: list["TeamMember"],
+    result: _RunResult,
+    stats: EngineStats | None = None,
+) -> Iterator[Assignment | UnassignedTask]:
+    """
+    Build the run's engine, KB and features, and allocate tasks with
+    request.strategy into result, yielding each decision as it is made.
+    """
+    # The process-wide KB cache serves a view of its snapshot; engine and kb
+    # below are this run's own, so in-run workload updates stay private.
+    snapshot = kb_cache.view(db, members, tasks) if settings.KB_CACHE_ENABLED else KBSnapshot.from_orm(members, tasks)
+    profiles = _member_profiles(db, members)
+    member_rows = [(m.id, m.name, m.years_of_experience, profiles[m.id].slot_count) for m in members]
+    result.member_rows = member_rows
+    result.profiles, result.snapshot = profiles, snapshot
+    normalizers = (
+        max(snapshot.member_workload, default=0),
+        max((profiles[m.id].years for m in members), default=0),
+        max((profiles[m.id].skill_count for m in members), default=0),
+    )
+
+    parts = _partition(request, snapshot, tasks, stats)
+    if parts is not None:
+        yield from _allocate_partitioned(
+            request, snapshot, tasks, members, profiles, normalizers, parts, result
         )
+        return
+
+    ctx = _run_context(request, snapshot, members, profiles, member_rows, normalizers, stats)
+    strategy = _allocate_optimal if request.strategy == "optimal" else _allocate_greedy
+    yield from strategy(ctx, tasks, result)
 
-    engine = build_engine_from_kb(members, tasks)
-    kb = build_knowledge_base(members, tasks)
+
+def _run_context(
+    request: AllocateRequest,
+    snapshot: KBSnapshot,
+    members: list["TeamMember"],
+    profiles: dict[int, MemberProfile],
+    member_rows: list[_MemberRow],
+    normalizers: tuple[int, int, int],
+    stats: EngineStats | None = None,
+) -> _RunContext:
+    """
+    Engine, KB and features over snapshot (members and their tasks);
+    normalizers are the run's (max workload, max years, max skill count).
+    """
+    engine = build_engine_from_snapshot(snapshot, stats=stats)
+    kb = knowledge_base_from_snapshot(snapshot)
     workload_map = {m.id: kb.workload.get(m.id, 0) for m in members}
-    max_workload = max(workload_map.values(), default=0)
-    max_years_experience = max(((m.years_of_experience or 0) for m in members), default=0)
-    max_skill_count = max((len(m.skills) if hasattr(m, "skills") and m.skills else 0 for m in members), default=0)
+    max_workload, max_years_experience, max_skill_count = normalizers
+    features = MemberFeatures(members, workload_map, max_years_experience, max_skill_count, profiles)
+    return _RunContext(
+        members=members,
+        member_rows=member_rows,
+        engine=engine,
+        kb=kb,
+        profiles=profiles,
+        features=features,
+        workload_map=workload_map,
+        max_workload=max_workload,
+        explain_level=request.explain_level,
+        explain_top_k=request.explain_top_k,
+    )
 
-    assignments: list[Assignment] = []
-    unassigned: list[int] = []
-    unassigned_tasks: list[UnassignedTask] = []
-    run_top_assignments: list[dict[str, str]] = []
-    run_rejection_reasons: list[str] = []
 
-    for task in tasks:
-        # Logical query: find all M such that eligible(M, task.id)
-        eligible_ids: list[int] = []
-        for m in members:
-            # Prove eligible(m.id, task.id)
-            sols = list(
-                engine.prove(
-                    FactGoal("eligible", (m.id, task.id)),
-                    {},
-                )
-            )
-            if sols:
-                eligible_ids.append(m.id)
-
-        # Build candidate results (including ineligible, for explanations)
-        overloaded_ids = {f[0] for f in engine.facts.get("overloaded", set())}
-        required_skill_ids = {sid for (tid, sid) in engine.facts.get("requires_skill", set()) if tid == task.id}
-
-        def get_rejection(mid: int) -> list[str]:
-            can_perform = bool(list(engine.prove(FactGoal("can_perform", (mid, task.id)), {})))
-            if not can_perform:
-                names = [kb.skill_name.get(sid, str(sid)) for sid in required_skill_ids]
-                return [f"Missing required skill: {n}" for n in names] if names else ["No required skills"]
-            if mid in overloaded_ids:
-                return ["Overloaded (workload exceeds threshold)"]
-            return ["Not available (no calendar)"]
-
-        predicted_hours_map: dict[int, float] = {}
-        for m in members:
-            if m.id in eligible_ids:
-                predicted_hours_map[m.id] = predicted_completion_hours(
-                    member=m,
-                    task=task,
-                    kb=kb,
-                    max_workload=max_workload,
-                    max_years_experience=max_years_experience,
-                    max_skill_count=max_skill_count,
-                )
+def _partition(
+    request: AllocateRequest,
+    snapshot: KBSnapshot,
+    tasks: list["Task"],
+    stats: EngineStats | None,
+) -> list[Part] | None:
+    """
+    The parts to allocate in parallel, or None to allocate in one piece.
+    Only the optimal strategy is split: it scores every task at the run's
+    starting state, so its parts are independent. Greedy rescales workload
+    fairness by the run-wide maximum workload after every assignment, which
+    couples all tasks. Profiled runs stay in one engine.
+    """
+    workers = settings.ALLOCATION_PARTITION_WORKERS
+    if (
+        workers < 2
+        or request.strategy != "optimal"
+        or stats is not None
+        or len(tasks) < settings.ALLOCATION_PARTITION_MIN_TASKS
+    ):
+        return None
+    parts = pack(skill_components(snapshot), workers)
+    return parts if len(parts) > 1 else None
+
+
+def _allocate_part(
+    request: AllocateRequest,
+    snapshot_path: str,
+    part_members: list[_PartMember],
+    part_tasks: list[_PartTask],
+    profiles: dict[int, MemberProfile],
+    member_rows: list[_MemberRow],
+    normalizers: tuple[int, int, int],
+) -> _RunResult:
+    """
+    Allocate one part in a worker process, without trace or candidate rows
+    (the parent builds those from the evidence, which is far smaller to send
+    back). snapshot_path is the run's snapshot file, mapped here and cut to
+    the part's rows; part_members and part_tasks carry the rest the strategy
+    reads, so no ORM row is pickled. member_rows are the whole run's, so the
+    rejection codes cover every run member: those outside the part lack the
+    skills for its tasks.
+    """
+    members = [
+        SimpleNamespace(id=mid, name=name, calendar_availability=availability)
+        for mid, name, availability in part_members
+    ]
+    tasks = [
+        SimpleNamespace(id=tid, task_name=name, estimated_time=hours, priority_order=priority)
+        for tid, name, hours, priority in part_tasks
+    ]
+    snapshot = load_snapshot(snapshot_path).subset([m.id for m in members], [t.id for t in tasks])
+    ctx = _run_context(request, snapshot, members, profiles, member_rows, normalizers)
+    ctx.explain_level = "none"
+    result = _RunResult()
+    for _ in _allocate_optimal(ctx, tasks, result):
+        pass
+    return result
 
-        candidates = []
-        score_cache: dict[int, tuple[float, dict[str, float], dict[str, float], dict[str, float]]] = {}
-        for m in members:
-            if m.id in eligible_ids:
-                pred_h = predicted_hours_map[m.id]
-                speed_s = delivery_speed_score(m.id, predicted_hours_map)
-                score, factors, weighted, weights = mcdm_score(
-                    member=m,
-                    task=task,
-                    kb=kb,
-                    max_workload=max_workload,
-                    max_years_experience=max_years_experience,
-                    max_skill_count=max_skill_count,
-                    delivery_speed=speed_s,
-                )
-                score_cache[m.id] = (score, factors, weighted, weights)
-                reasons = [
-                    f"MCDM score: {score:.3f}",
-                    f"Predicted completion time: {pred_h:.2f}h",
-                    f"Workload fairness {factors['workload']:.2f} × w{weights['workload']:.2f} = {weighted['workload']:.2f}",
-                    f"Experience {factors['experience']:.2f} × w{weights['experience']:.2f} = {weighted['experience']:.2f}",
-                    f"Availability {factors['availability']:.2f} × w{weights['availability']:.2f} = {weighted['availability']:.2f}",
-                    f"Skill breadth {factors['skill_breadth']:.2f} × w{weights['skill_breadth']:.2f} = {weighted['skill_breadth']:.2f}",
-                    f"Delivery speed {factors['delivery_speed']:.2f} × w{weights['delivery_speed']:.2f} = {weighted['delivery_speed']:.2f}",
-                ]
-                avail_slots = len([x for x in (m.calendar_availability or "").split(",") if x.strip()]) if m.calendar_availability else 0
-                candidates.append(
-                    _CandidateResult(
-                        m.id, m.name, True, score, reasons, None,
-                        years_of_experience=m.years_of_experience,
-                        current_workload=workload_map.get(m.id, 0),
-                        predicted_hours=pred_h,
-                        availability_slots=avail_slots,
-                    )
+
+def _allocate_partitioned(
+    request: AllocateRequest,
+    snapshot: KBSnapshot,
+    tasks: list["Task"],
+    members: list["TeamMember"],
+    profiles: dict[int, MemberProfile],
+    normalizers: tuple[int, int, int],
+    parts: list[Part],
+    result: _RunResult,
+) -> Iterator[Assignment | UnassignedTask]:
+    """
+    Allocate each part in the partition process pool, then merge the
+    decisions into result in task order, exactly as one run over all tasks
+    records them.
+    """
+    decisions: dict[int, Assignment | UnassignedTask] = {}
+    tops: dict[int, dict[str, str]] = {}
+    with partition.shared_snapshot(snapshot) as snapshot_path:
+        futures = []
+        for member_pos, task_pos in parts:
+            part_members = [members[i] for i in member_pos]
+            part_tasks = [tasks[j] for j in task_pos]
+            futures.append(
+                partition.executor().submit(
+                    _allocate_part,
+                    request,
+                    snapshot_path,
+                    [(m.id, m.name, m.calendar_availability) for m in part_members],
+                    [(t.id, t.task_name, t.estimated_time, t.priority_order) for t in part_tasks],
+                    {m.id: profiles[m.id] for m in part_members},
+                    result.member_rows,
+                    normalizers,
                 )
-            else:
-                candidates.append(_CandidateResult(m.id, m.name, False, 0.0, [], get_rejection(m.id), None, None, None, None))
-
-        if not eligible_ids:
-            unassigned.append(task.id)
-            required_skill_names = [
-                kb.skill_name.get(sid, str(sid))
-                for (tid, sid) in engine.facts.get("requires_skill", set())
-                if tid == task.id
-            ]
-            reason = (
-                f"No team member has required skills: {', '.join(required_skill_names)}"
-                if required_skill_names
-                else "No eligible team member (skills or availability)"
-            )
-            unassigned_tasks.append(
-                UnassignedTask(task_id=task.id, task_name=task.task_name, reason=reason)
             )
+        for future in futures:
+            part = future.result()
+            decisions.update((u.task_id, u) for u in part.unassigned_tasks)
+            for assignment, top in zip(part.assignments, part.top_assignments):
+                decisions[assignment.task_id] = assignment
+                tops[assignment.task_id] = top
+            result.evidence.update(part.evidence)
+
+    evidence = result.evidence
+    result.evidence = {}
+    for task in tasks:
+        decision = decisions[task.id]
+        if isinstance(decision, UnassignedTask):
+            result.unassigned_tasks.append(decision)
+            yield decision
             continue
-
-        # best_candidate: max multi-factor score among eligible
-        chosen_id = max(eligible_ids, key=lambda mid: score_cache[mid][0])
-        chosen_score, chosen_factors, chosen_weighted, chosen_weights = score_cache[chosen_id]
-        chosen_member = next(m for m in members if m.id == chosen_id)
-
-        required_skills = [
-            kb.skill_name.get(sid, str(sid))
-            for (tid, sid) in engine.facts.get("requires_skill", set())
-            if tid == task.id
-        ]
-        constraints_satisfied = [f"Has all required skills: {', '.join(required_skills)}"] if required_skills else []
-        if chosen_member.calendar_availability:
-            constraints_satisfied.append(f"Has availability: {chosen_member.calendar_availability}")
-
-        chosen_pred_h = predicted_hours_map.get(chosen_id, task.estimated_time or 0.0)
-        top_factors = sorted(chosen_weighted.items(), key=lambda x: x[1], reverse=True)[:2]
-        top_factor_text = ", ".join(
-            f"{name}({chosen_factors[name]:.2f}×w{chosen_weights[name]:.2f})"
-            for name, _ in top_factors
-        )
-        fallback_explanation = (
-            f"{chosen_member.name} assigned to {task.task_name} by logical inference: "
-            f"eligible(M,T) proved (can_perform, available, ¬overloaded). "
-            f"Then selected by multi-factor scoring (MCDM) with final score {chosen_score:.2f}. "
-            f"Predicted completion time for this member: {chosen_pred_h:.2f}h. "
-            f"Top contributors: {top_factor_text}."
+        assignment = _with_detail(
+            decision, evidence[task.id], result.member_rows, request.explain_level, request.explain_top_k
         )
-        explanation = fallback_explanation
+        result.assignments.append(assignment if result.retain_detail else decision)
+        result.top_assignments.append(tops[task.id])
+        result.evidence[task.id] = evidence[task.id]
+        _count_rejections(result.rejection_counts, evidence[task.id][0])
+        yield assignment
 
-        inference_trace = build_chosen_trace(chosen_id, task.id, kb, engine, chosen_score)
 
-        candidate_explanations = [
-            AssignmentExplanation(
-                member_id=c.member_id,
-                member_name=c.member_name,
-                chosen=(c.member_id == chosen_id),
-                reasons=c.reasons,
-                rejection_reasons=c.rejection_reasons,
-                score=c.score if c.eligible else None,
-                years_of_experience=c.years_of_experience,
-                current_workload=c.current_workload,
-                predicted_hours=c.predicted_hours,
-                availability_slots=c.availability_slots,
-            )
-            for c in candidates
-        ]
-        for c in candidates:
-            if c.rejection_reasons:
-                run_rejection_reasons.extend(c.rejection_reasons)
+def _allocate(
+    db: Session,
+    request: AllocateRequest,
+    tasks: list["Task"],
+    members: list["TeamMember"],
+    stats: EngineStats | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> _RunResult:
+    """Allocate tasks with request.strategy and return the whole result."""
+    result = _RunResult()
+    if progress is not None:
+        progress(0, len(tasks))
+    events = _allocation_events(db, request, tasks, members, result, stats)
+    for done, _ in enumerate(events, 1):
+        if progress is not None:
+            progress(done, len(tasks))
+    return result
 
-        assignments.append(
-            Assignment(
-                task_id=task.id,
-                task_name=task.task_name,
-                team_member_id=chosen_id,
-                team_member_name=chosen_member.name,
-                score=chosen_score,
-                explanation=explanation,
-                constraints_satisfied=constraints_satisfied,
-                inference_trace=inference_trace,
-                candidate_explanations=candidate_explanations,
-            )
-        )
-        run_top_assignments.append(
-            {
-                "task_name": task.task_name,
-                "member_name": chosen_member.name,
-                "score": f"{chosen_score:.3f}",
-                "top_factors": ", ".join(name for name, _ in top_factors),
-            }
+
+def run_allocation(
+    db: Session,
+    request: AllocateRequest,
+    progress: Callable[[int, int], None] | None = None,
+) -> AllocateResponse:
+    """
+    Run allocation using logical inference.
+
+    The engine proves eligible(M, T) for each task T; we rank by workload
+    and select best_candidate. Rules are interpreted by the logic engine.
+    progress(done, total) is called as tasks are decided.
+    """
+    tasks, members = _load_run_rows(db, request)
+    response = _run_without_engine(db, request, tasks, members, progress)
+    if response is not None:
+        return response
+
+    stats = _run_stats(request)
+    result = _allocate(db, request, tasks, members, stats=stats, progress=progress)
+    second_round = request.second_round and bool(result.unassigned_tasks)
+    response = _finish_run(db, request, tasks, result, stats, store=not second_round)
+    if second_round:
+        response = _run_second_round(db, request, tasks, members, result, response)
+    return response
+
+
+def stream_allocation(db: Session, request: AllocateRequest) -> Iterator[tuple[str, BaseModel]]:
+    """
+    run_allocation() as a stream of ("assignment", Assignment) and
+    ("unassigned", UnassignedTask) records, each yielded as soon as the
+    strategy decides it (greedy: task by task; optimal: after the batch is
+    solved), then one ("summary", AllocateResponse) with assignments left
+    empty. Assignments are not kept once yielded, beyond what the summary
+    and the run store need; apply commits before the summary.
+    """
+    tasks, members = _load_run_rows(db, request)
+    response = _run_without_engine(db, request, tasks, members)
+    if response is not None:
+        for a in response.assignments:
+            yield "assignment", a
+        for u in response.unassigned_tasks:
+            yield "unassigned", u
+        yield "summary", response.model_copy(update={"assignments": []})
+        return
+
+    stats = _run_stats(request)
+    result = _RunResult(retain_detail=False)
+    for decision in _allocation_events(db, request, tasks, members, result, stats=stats):
+        yield ("assignment" if isinstance(decision, Assignment) else "unassigned"), decision
+    second_round = request.second_round and bool(result.unassigned_tasks)
+    response = _finish_run(db, request, tasks, result, stats, store=not second_round)
+    if second_round:
+        response = _run_second_round(db, request, tasks, members, result, response)
+        for a in response.assignments[len(result.assignments) :]:
+            yield "assignment", a
+    yield "summary", response.model_copy(update={"assignments": []})
+
+
+def encode_allocation_stream(
+    request: AllocateRequest,
+    format: Literal["ndjson", "sse"],
+    log: Callable[[Session, AllocateRequest, AllocateResponse, int, set[int]], None] | None = None,
+) -> Iterator[str]:
+    """
+    stream_allocation() on its own session, as the lines of a response body:
+    one {"type", "data"} JSON object per record for "ndjson", one event
+    named by type for "sse". A run stopped by LOGIC_ENGINE_MAX_STEPS ends
+    with an "error" record ({"detail"}) instead of the summary.
+    log(db, request, summary, allocated, member_ids) is called with the
+    summary and the number of assignments and members streamed; its errors
+    are ignored.
+    """
+
+    def encode(kind: str, data: str) -> str:
+        if format == "sse":
+            return f"event: {kind}\ndata: {data}\n\n"
+        return f'{{"type": {json.dumps(kind)}, "data": {data}}}\n'
+
+    # Own session: the stream outlives the request that opened it
+    with SessionLocal() as db:
+        try:
+            # What the run log needs of the assignments, which are not kept once sent
+            allocated = 0
+            member_ids: set[int] = set()
+            for kind, record in stream_allocation(db, request):
+                if kind == "assignment":
+                    allocated += 1
+                    member_ids.add(record.team_member_id)
+                elif kind == "summary" and log is not None:
+                    try:
+                        log(db, request, record, allocated, member_ids)
+                    except Exception:
+                        # Logging should never block allocation API.
+                        pass
+                yield encode(kind, record.model_dump_json())
+        except ProofBudgetExceeded as exc:
+            # Headers are already sent, so the 422 of POST /allocate becomes a record
+            detail = f"Allocation stopped: {exc}. Raise LOGIC_ENGINE_MAX_STEPS to allow it."
+            yield encode("error", json.dumps({"detail": detail}))
+
+
+def _run_without_engine(
+    db: Session,
+    request: AllocateRequest,
+    tasks: list["Task"],
+    members: list["TeamMember"],
+    progress: Callable[[int, int], None] | None = None,
+) -> AllocateResponse | None:
+    """
+    The response of a run over rows already loaded that needs no engine (a
+    force round, or nothing to allocate); None when the strategy must run.
+    """
+    if request.force_round and request.task_ids and tasks:
+        response = _run_force_round(db, tasks, members, _prior_member_ids(request))
+        response.run_id = _store_run(response.assignments, {}, [])
+        if progress is not None:
+            progress(len(tasks), len(tasks))
+        return response
+
+    if not tasks or not members:
+        return AllocateResponse(
+            assignments=[],
+            unassigned_task_ids=[t.id for t in tasks],
+            summary="No tasks to allocate or no team members available.",
+            overall_explanation="No allocation was performed because no tasks or no members were available.",
         )
+    return None
+
+
+def _prior_member_ids(request: AllocateRequest) -> list[int]:
+    return [pa.team_member_id for pa in request.prior_assignments or []]
 
-        # Always update workload for next task (even when apply=False) so allocation is balanced
-        old_w = workload_map.get(chosen_id, 0)
-        new_w = old_w + 1
-        workload_map[chosen_id] = new_w
-        kb.workload[chosen_id] = new_w
-        max_workload = max(workload_map.values(), default=0)
-        engine.facts.setdefault("workload", set()).discard((chosen_id, old_w))
-        engine.facts["workload"].add((chosen_id, new_w))
-        if new_w > OVERLOAD_LIMIT:
-            engine.facts.setdefault("overloaded", set()).add((chosen_id,))
-        elif old_w >= OVERLOAD_LIMIT and new_w <= OVERLOAD_LIMIT:
-            engine.facts.get("overloaded", set()).discard((chosen_id,))
-
-        if request.apply:
-            task.assignee_id = chosen_id
 
+def _run_stats(request: AllocateRequest) -> EngineStats | None:
+    if request.profile:
+        return EngineStats()
+    if settings.LOGIC_ENGINE_STATS_SAMPLE_RATE > 0:
+        return EngineStats(sample_rate=settings.LOGIC_ENGINE_STATS_SAMPLE_RATE)
+    return None
+
+
+def _finish_run(
+    db: Session,
+    request: AllocateRequest,
+    tasks: list["Task"],
+    result: _RunResult,
+    stats: EngineStats | None,
+    store: bool = True,
+) -> AllocateResponse:
+    """Persist (if request.apply), summarize and (if store) store a finished run."""
     if request.apply:
+        task_by_id = {t.id: t for t in tasks}
+        for a in result.assignments:
+            task_by_id[a.task_id].assignee_id = a.team_member_id
         db.commit()
 
+    assignments = result.assignments
+    unassigned = [u.task_id for u in result.unassigned_tasks]
+    unassigned_tasks = result.unassigned_tasks
+    run_top_assignments = result.top_assignments
+    rejection_counts = result.rejection_counts
+
     num_assigned = len(assignments)
     num_unassigned = len(unassigned)
     summary = f"Allocated {num_assigned} task(s). {num_unassigned} task(s) could not be assigned (no eligible member)."
-    rejection_counts: dict[str, int] = {}
-    for r in run_rejection_reasons:
-        rejection_counts[r] = rejection_counts.get(r, 0) + 1
     def _short_reason(reason: str) -> str:
         if reason.startswith("Missing required skill: "):
             return "Missing skill: " + reason[len("Missing required skill: ") :]
@@ -793,6 +1460,155 @@ def run_allocation(db: Session, request: AllocateRequest) -> AllocateResponse:
         summary=summary,
         overall_explanation=overall_explanation,
         unassigned_tasks=unassigned_tasks,
+        engine_stats=stats.as_dict() if stats is not None else None,
+        run_id=_store_run(assignments, result.evidence, result.member_rows) if store else None,
+    )
+
+
+def _run_second_round(
+    db: Session,
+    request: AllocateRequest,
+    tasks: list["Task"],
+    members: list["TeamMember"],
+    result: _RunResult,
+    first: AllocateResponse,
+) -> AllocateResponse:
+    """
+    The relaxed round over the tasks the first round left unassigned, in
+    the same request (request.second_round): on the rows, profiles and
+    snapshot the first round loaded, with its assignments as the workload.
+    Returns both rounds as one response, stored as one run; force-assigned
+    tasks are not persisted, as with force_round.
+    """
+    left = {u.task_id for u in result.unassigned_tasks}
+    leftover = [t for t in tasks if t.id in left]
+    if request.apply:
+        # The first round's commit expired the loaded rows: refresh them in one query each
+        from app.db.models import Task, TeamMember
+
+        db.query(TeamMember).filter(TeamMember.id.in_([row[0] for row in result.member_rows])).all()
+        db.query(Task).filter(Task.id.in_(left)).all()
+    second = _run_force_round(
+        db,
+        leftover,
+        members,
+        [a.team_member_id for a in result.assignments],
+        profiles=result.profiles,
+        snapshot=result.snapshot,
+    )
+    return AllocateResponse(
+        assignments=first.assignments + second.assignments,
+        unassigned_task_ids=second.unassigned_task_ids,
+        summary=f"{first.summary} {second.summary}",
+        overall_explanation=f"{first.overall_explanation}\n\n{second.overall_explanation}",
+        unassigned_tasks=second.unassigned_tasks,
+        engine_stats=first.engine_stats,
+        run_id=_store_run(result.assignments + second.assignments, result.evidence, result.member_rows),
+    )
+
+
+def _store_run(
+    assignments: list[Assignment],
+    evidence: dict[int, tuple[_TaskCandidates, int, str]],
+    member_rows: list[_MemberRow],
+) -> str | None:
+    """Keep the run in run_store (when enabled) and return its run id."""
+    if not run_store.enabled():
+        return None
+    kept = {
+        a.task_id: a.model_copy(update={"inference_trace": [], "candidate_explanations": []})
+        if a.task_id in evidence
+        else a
+        for a in assignments
+    }
+    return run_store.put(_StoredRun(kept, evidence, member_rows))
+
+
+def stored_task_detail(run_id: str, task_id: int) -> Assignment | None:
+    """
+    The full Assignment (trace and every candidate row) of task_id in a
+    stored run, built from its evidence; None if the run is unknown or
+    expired, or left the task unassigned.
+    """
+    run = run_store.get(run_id)
+    if run is None or task_id not in run.assignments:
+        return None
+    assignment = run.assignments[task_id]
+    if task_id not in run.evidence:
+        return assignment
+    return _with_detail(assignment, run.evidence[task_id], run.member_rows, "full")
+
+
+def _with_detail(
+    assignment: Assignment,
+    evidence: tuple[_TaskCandidates, int, str],
+    member_rows: list[_MemberRow],
+    level: str,
+    top_k: int = 3,
+) -> Assignment:
+    """assignment with the trace and candidate rows of level, built from its evidence."""
+    if level == "none":
+        return assignment
+    tc, chosen_id, best_rule = evidence
+    i = tc.eligible_ids.index(chosen_id)
+    # Eligible, so the chosen member has every required skill
+    trace = _chosen_trace(
+        assignment.team_member_name,
+        tc.task_name,
+        tc.required_skill_names,
+        tc.required_skill_names,
+        tc.workload[i],
+        tc.scored.scores[i],
+        best_rule,
+    )
+    return assignment.model_copy(
+        update={
+            "inference_trace": trace,
+            "candidate_explanations": _candidate_explanations(member_rows, tc, chosen_id, level, top_k),
+        }
+    )
+
+
+def explain_stored_task(run_id: str, task_id: int) -> ExplainTaskResponse | None:
+    """
+    explain_task() for task_id in a stored run, with the evidence (chosen
+    member, best alternative, rejections) taken from the run itself.
+    """
+    assignment = stored_task_detail(run_id, task_id)
+    if assignment is None:
+        return None
+    if assignment.force_assigned:
+        return ExplainTaskResponse(
+            task_id=task_id, team_member_id=assignment.team_member_id, explanation=assignment.explanation
+        )
+    rows = assignment.candidate_explanations
+    chosen = next(c for c in rows if c.chosen)
+    alternatives = [c for c in rows if c.score is not None and not c.chosen]
+    best_alt = max(alternatives, key=lambda c: c.score, default=None)
+    return explain_task(
+        ExplainTaskRequest(
+            task_id=task_id,
+            task_name=assignment.task_name,
+            team_member_id=assignment.team_member_id,
+            team_member_name=assignment.team_member_name,
+            constraints_satisfied=assignment.constraints_satisfied,
+            chosen_score=chosen.score,
+            chosen_reasons=chosen.reasons,
+            best_alternative=(
+                {"member_name": best_alt.member_name, "score": f"{best_alt.score:.3f}"} if best_alt else None
+            ),
+            best_alternative_gap=round(chosen.score - best_alt.score, 4) if best_alt else None,
+            best_alternative_reasons=best_alt.reasons if best_alt else [],
+            top_rejection_reasons=[r for c in rows for r in (c.rejection_reasons or [])][:5],
+            chosen_years_of_experience=chosen.years_of_experience,
+            chosen_current_workload=chosen.current_workload,
+            chosen_predicted_hours=chosen.predicted_hours,
+            chosen_availability_slots=chosen.availability_slots,
+            runner_up_years_of_experience=best_alt.years_of_experience if best_alt else None,
+            runner_up_current_workload=best_alt.current_workload if best_alt else None,
+            runner_up_predicted_hours=best_alt.predicted_hours if best_alt else None,
+            runner_up_availability_slots=best_alt.availability_slots if best_alt else None,
+        )
     )
 
 
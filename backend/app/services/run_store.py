@@ -0,0 +1,107 @@
+"""
+Bounded store of recent allocation runs, keyed by run id.
+
+run_allocation() puts each run's structured results here (see
+reasoning._StoredRun) and returns the run id, so the detail and explain
+endpoints take a run id and a task id instead of the client sending the
+evidence back. Runs live in memory, most recently used first, up to
+RUN_STORE_MAX_RUNS; each expires RUN_STORE_TTL_SECONDS after it was stored.
+With RUN_STORE_SPILL_PATH set, runs pushed out of memory are written
+(pickled) to that SQLite file and read back from it until they expire. The
+file is this process's cache, not an exchange format: only runs this
+backend stored are ever unpickled from it.
+"""
+
+from __future__ import annotations
+
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any
+
+from app.core.config import settings
+
+_lock = threading.Lock()
+# run id -> (stored at, run), least recently used first
+_runs: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+
+def enabled() -> bool:
+    return settings.RUN_STORE_MAX_RUNS > 0
+
+
+def put(run: Any) -> str:
+    """Store run and return its new run id."""
+    run_id = uuid.uuid4().hex
+    now = time.time()
+    with _lock:
+        _runs[run_id] = (now, run)
+        evicted = []
+        while len(_runs) > settings.RUN_STORE_MAX_RUNS:
+            evicted.append(_runs.popitem(last=False))
+    if evicted and settings.RUN_STORE_SPILL_PATH:
+        _spill(evicted, now)
+    return run_id
+
+
+def get(run_id: str) -> Any | None:
+    """The run stored under run_id, or None if unknown or expired."""
+    now = time.time()
+    with _lock:
+        entry = _runs.get(run_id)
+        if entry is not None:
+            if now - entry[0] <= settings.RUN_STORE_TTL_SECONDS:
+                _runs.move_to_end(run_id)
+                return entry[1]
+            del _runs[run_id]
+            return None
+    if settings.RUN_STORE_SPILL_PATH:
+        return _load_spilled(run_id, now)
+    return None
+
+
+def pop(run_id: str) -> Any | None:
+    """Remove the run stored in memory under run_id and return it (None if absent)."""
+    with _lock:
+        entry = _runs.pop(run_id, None)
+    return entry[1] if entry is not None else None
+
+
+def clear() -> None:
+    """Drop every run held in memory (spilled runs expire on their own)."""
+    with _lock:
+        _runs.clear()
+
+
+# ---------------------------------------------------------------------------
+# SQLite spill
+# ---------------------------------------------------------------------------
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(settings.RUN_STORE_SPILL_PATH, timeout=10)
+    conn.execute("CREATE TABLE IF NOT EXISTS allocation_runs (run_id TEXT PRIMARY KEY, stored_at REAL, run BLOB)")
+    return conn
+
+
+def _spill(entries: list[tuple[str, tuple[float, Any]]], now: float) -> None:
+    rows = [(run_id, stored_at, pickle.dumps(run, pickle.HIGHEST_PROTOCOL)) for run_id, (stored_at, run) in entries]
+    with _connect() as conn:
+        conn.execute("DELETE FROM allocation_runs WHERE stored_at < ?", (now - settings.RUN_STORE_TTL_SECONDS,))
+        conn.executemany("INSERT OR REPLACE INTO allocation_runs VALUES (?, ?, ?)", rows)
+    conn.close()
+
+
+def _load_spilled(run_id: str, now: float) -> Any | None:
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT run FROM allocation_runs WHERE run_id = ? AND stored_at >= ?",
+            (run_id, now - settings.RUN_STORE_TTL_SECONDS),
+        ).fetchone()
+    finally:
+        conn.close()
+    return pickle.loads(row[0]) if row else None
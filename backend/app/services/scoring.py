@@ -0,0 +1,237 @@
+"""
+Column-wise MCDM scoring over every eligible member of a task.
+
+The scalar functions in reasoning.py (workload_score, ..., mcdm_score) are
+the reference implementation. score_candidates() computes the same factor
+columns, predicted hours and final scores for all candidates at once: with
+NumPy array ops when it is installed (optional dependency), else with the
+same expressions over lists. Each column applies the reference's operations
+in the reference's order, so scores are bit-identical to mcdm_score() and
+ties between members break the same way.
+"""
+
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # optional: the list path below is used instead
+    np = None
+
+if TYPE_CHECKING:
+    from app.db.models import TeamMember
+
+FACTORS = ("workload", "experience", "availability", "skill_breadth", "delivery_speed")
+
+
+def availability_slot_count(text: str | None) -> int:
+    """Slots in calendar_availability ("Mon 9-12, Tue 13-17"), counted as availability_score() counts them."""
+    availability = (text or "").strip()
+    if not availability:
+        return 0
+    return sum(1 for slot in availability.split(",") if slot.strip())
+
+
+class MemberProfile:
+    """
+    Scoring inputs of one member that only change when the member row does:
+    years of experience, availability slot count and skills. Built once per
+    KB version (see kb_cache.member_profiles) and shared read-only between
+    runs.
+    """
+
+    __slots__ = ("years", "slot_count", "skill_ids", "skill_count")
+
+    def __init__(self, years: int, slot_count: int, skill_ids: frozenset[int]) -> None:
+        self.years = years
+        self.slot_count = slot_count
+        self.skill_ids = skill_ids
+        self.skill_count = len(skill_ids)
+
+    @classmethod
+    def from_member(cls, member: "TeamMember") -> "MemberProfile":
+        skills = member.skills if hasattr(member, "skills") and member.skills else []
+        return cls(
+            member.years_of_experience or 0,
+            availability_slot_count(member.calendar_availability),
+            frozenset(s.id for s in skills),
+        )
+
+
+def member_profiles(
+    members: list["TeamMember"],
+    cached: dict[int, MemberProfile] | None = None,
+) -> dict[int, MemberProfile]:
+    """Profiles of members, taken from cached where present and built otherwise."""
+    cached = cached or {}
+    return {m.id: cached.get(m.id) or MemberProfile.from_member(m) for m in members}
+
+
+class MemberFeatures:
+    """
+    Factor inputs of the run's members, one row per member in the order
+    given. Experience, availability and skill breadth are normalized once
+    here (their normalizers are fixed for the run); workload changes as the
+    run assigns tasks and is scored per task.
+    """
+
+    __slots__ = ("row", "workload", "experience", "availability", "breadth", "_arrays")
+
+    def __init__(
+        self,
+        members: list["TeamMember"],
+        workload: dict[int, int],
+        max_years_experience: int,
+        max_skill_count: int,
+        profiles: dict[int, MemberProfile] | None = None,
+    ) -> None:
+        profiles = member_profiles(members, profiles)
+        rows = [profiles[m.id] for m in members]
+        self.row = {m.id: i for i, m in enumerate(members)}
+        self.workload = [workload.get(m.id, 0) for m in members]
+        # Same expressions as years_experience_score / availability_score / skill_breadth_score
+        self.experience = [
+            0.5 if max_years_experience <= 0 else min(1.0, p.years / max_years_experience) for p in rows
+        ]
+        self.availability = [min(1.0, p.slot_count / 6.0) for p in rows]
+        self.breadth = [0.5 if max_skill_count <= 0 else min(1.0, p.skill_count / max_skill_count) for p in rows]
+        self._arrays: tuple[Any, Any, Any] | None = None
+
+    def set_workload(self, member_id: int, workload: int) -> None:
+        self.workload[self.row[member_id]] = workload
+
+    def arrays(self) -> tuple[Any, Any, Any]:
+        """experience, availability and breadth as NumPy arrays (built on first use)."""
+        if self._arrays is None:
+            self._arrays = (
+                np.asarray(self.experience, dtype=np.float64),
+                np.asarray(self.availability, dtype=np.float64),
+                np.asarray(self.breadth, dtype=np.float64),
+            )
+        return self._arrays
+
+
+@dataclass
+class CandidateScores:
+    """
+    score_candidates() output, one entry per member id in member_ids. Columns
+    are compact float arrays; factors(i) and weighted(i) build the
+    per-member dicts only when an explanation needs them.
+    """
+
+    member_ids: list[int]
+    predicted_hours: Sequence[float]
+    # One column per name in FACTORS
+    factor_columns: list[Sequence[float]]
+    weights: dict[str, float]
+    scores: Sequence[float]
+
+    def factors(self, i: int) -> dict[str, float]:
+        return {name: col[i] for name, col in zip(FACTORS, self.factor_columns)}
+
+    def weighted(self, i: int) -> dict[str, float]:
+        # The same product score_candidates() summed into scores[i]
+        return {name: col[i] * self.weights[name] for name, col in zip(FACTORS, self.factor_columns)}
+
+
+def score_candidates(
+    features: MemberFeatures,
+    member_ids: list[int],
+    estimated_time: float | None,
+    weights: dict[str, float],
+    max_workload: int,
+    vectorized: bool = True,
+) -> CandidateScores:
+    """
+    MCDM scores of member_ids for one task: predicted hours, the five factor
+    columns (delivery speed normalized over these candidates) and final
+    scores. vectorized=False, or NumPy missing, evaluates the same
+    expressions over lists.
+    """
+    if not member_ids:
+        return CandidateScores([], array("d"), [array("d") for _ in FACTORS], weights, array("d"))
+    rows = [features.row[mid] for mid in member_ids]
+    base_hours = estimated_time if (estimated_time and estimated_time > 0) else 4.0
+    if vectorized and np is not None:
+        factor_cols, scores, hours = _columns_numpy(features, rows, base_hours, weights, max_workload)
+    else:
+        factor_cols, scores, hours = _columns_python(features, rows, base_hours, weights, max_workload)
+    return CandidateScores(
+        member_ids=list(member_ids),
+        predicted_hours=hours,
+        factor_columns=factor_cols,
+        weights=weights,
+        scores=scores,
+    )
+
+
+def _columns_numpy(
+    features: MemberFeatures,
+    rows: list[int],
+    base_hours: float,
+    weights: dict[str, float],
+    max_workload: int,
+) -> tuple[list[array], array, array]:
+    idx = np.asarray(rows, dtype=np.intp)
+    n = len(rows)
+    workload = np.asarray(features.workload, dtype=np.float64)[idx]
+    experience, availability, breadth = features.arrays()
+
+    workload_s = np.ones(n) if max_workload == 0 else 1.0 - (workload / (max_workload + 1))
+    exp_s = experience[idx]
+    avail_s = availability[idx]
+    breadth_s = breadth[idx]
+
+    predicted = (
+        base_hours
+        * (1.45 - (0.65 * exp_s))
+        * (1.30 - (0.40 * breadth_s))
+        * (1.25 - (0.35 * avail_s))
+        * (1.40 - (0.50 * workload_s))
+    )
+    predicted = np.maximum(0.25, predicted)
+    lo, hi = predicted.min(), predicted.max()
+    speed_s = np.ones(n) if hi - lo < 1e-9 else 1.0 - ((predicted - lo) / (hi - lo))
+
+    factor_cols = [workload_s, exp_s, avail_s, breadth_s, speed_s]
+    # Summed column by column, in FACTORS order, as sum() does per member
+    scores = factor_cols[0] * weights[FACTORS[0]]
+    for name, col in zip(FACTORS[1:], factor_cols[1:]):
+        scores = scores + col * weights[name]
+    return [_packed(c) for c in factor_cols], _packed(scores), _packed(predicted)
+
+
+def _columns_python(
+    features: MemberFeatures,
+    rows: list[int],
+    base_hours: float,
+    weights: dict[str, float],
+    max_workload: int,
+) -> tuple[list[array], array, array]:
+    workload_s = [1.0 if max_workload == 0 else 1.0 - (features.workload[r] / (max_workload + 1)) for r in rows]
+    exp_s = [features.experience[r] for r in rows]
+    avail_s = [features.availability[r] for r in rows]
+    breadth_s = [features.breadth[r] for r in rows]
+
+    predicted = [
+        max(0.25, base_hours * (1.45 - (0.65 * e)) * (1.30 - (0.40 * b)) * (1.25 - (0.35 * a)) * (1.40 - (0.50 * w)))
+        for w, e, a, b in zip(workload_s, exp_s, avail_s, breadth_s)
+    ]
+    # min/max once per task, not once per member as delivery_speed_score() does
+    lo, hi = min(predicted), max(predicted)
+    speed_s = [1.0] * len(rows) if hi - lo < 1e-9 else [1.0 - ((h - lo) / (hi - lo)) for h in predicted]
+
+    factor_cols = [workload_s, exp_s, avail_s, breadth_s, speed_s]
+    weighted_cols = [[v * weights[name] for v in col] for name, col in zip(FACTORS, factor_cols)]
+    scores = [sum(values) for values in zip(*weighted_cols)]
+    return [array("d", c) for c in factor_cols], array("d", scores), array("d", predicted)
+
+
+def _packed(column: Any) -> array:
+    """A float64 NumPy column as array('d'), without a Python float per element."""
+    packed = array("d")
+    packed.frombytes(np.ascontiguousarray(column, dtype=np.float64).tobytes())
+    return packed
@@ -0,0 +1,98 @@
+"""
+Shared fixtures. The app reads DATABASE_URL when app.core.config is first
+imported, so it is pointed at a throwaway SQLite file before anything from
+app is imported (spawned job and partition workers inherit it).
+"""
+
+import os
+import random
+import tempfile
+from types import SimpleNamespace
+
+# Set once per session: processes that import this module again (spawned workers) keep the same file
+if "KRAFT_TEST_DATABASE_URL" not in os.environ:
+    os.environ["KRAFT_TEST_DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="kraft-tests-"), "test.db")
+os.environ["DATABASE_URL"] = os.environ["KRAFT_TEST_DATABASE_URL"]
+os.environ["RUN_STORE_SPILL_PATH"] = ""
+# KB snapshot files shared with job and partition workers, next to the database
+os.environ["KB_SNAPSHOT_DIR"] = os.path.dirname(os.environ["KRAFT_TEST_DATABASE_URL"].removeprefix("sqlite:///"))
+
+import pytest  # noqa: E402
+
+from app.db.base import Base  # noqa: E402
+from app.db.models import Skill, Task, TeamMember  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.services import kb_cache, run_store  # noqa: E402
+
+
+def random_kb(n_members: int, n_tasks: int, n_skills: int, seed: int = 1) -> tuple[list, list]:
+    """
+    Unsaved members and tasks shaped like the ORM rows (what
+    KBSnapshot.from_orm reads), for engine tests that need no database.
+    """
+    rng = random.Random(seed)
+    skills = [SimpleNamespace(id=i + 1, skill_name=f"S{i}") for i in range(n_skills)]
+    tasks = [
+        SimpleNamespace(id=j + 1, task_name=f"T{j}", required_skills=rng.sample(skills, rng.randint(0, 3)))
+        for j in range(n_tasks)
+    ]
+    members = [
+        SimpleNamespace(
+            id=i + 1,
+            name=f"M{i}",
+            calendar_availability=rng.choice([None, "Mon 9-12", "Mon 9-12, Tue 13-17"]),
+            years_of_experience=i % 11,
+            assigned_tasks=[None] * rng.randint(0, 5),
+            skills=rng.sample(skills, rng.randint(0, min(n_skills, 6))),
+        )
+        for i in range(n_members)
+    ]
+    return members, tasks
+
+
+def seed_database(n_members: int, n_tasks: int, n_skills: int, seed: int = 1) -> None:
+    """Replace the test database with a random team: some members unavailable, a tenth of the tasks assigned."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        skills = [Skill(skill_name=f"S{i}", skill_type="hard") for i in range(n_skills)]
+        db.add_all(skills)
+        members = [
+            TeamMember(
+                name=f"M{i}",
+                calendar_availability=", ".join(f"Mon {h}-{h + 1}" for h in range(rng.randint(0, 6))) or None,
+                years_of_experience=rng.randint(0, 10),
+                skills=rng.sample(skills, rng.randint(1, min(n_skills, 8))),
+            )
+            for i in range(n_members)
+        ]
+        db.add_all(members)
+        tasks = [
+            Task(
+                task_name=f"T{j}",
+                estimated_time=rng.choice([None, 2.0, 4.0, 8.0]),
+                priority_order=rng.choice([None, 1, 2, 3]),
+                required_skills=rng.sample(skills, rng.randint(1, 3)),
+            )
+            for j in range(n_tasks)
+        ]
+        db.add_all(tasks)
+        db.commit()
+        for task in tasks[: n_tasks // 10]:
+            task.assignee_id = rng.choice(members).id
+        db.commit()
+    kb_cache.invalidate()
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def _empty_run_store():
+    run_store.clear()
+    yield
+    run_store.clear()
@@ -0,0 +1,100 @@
+import pytest
+
+from app.core.config import settings
+from app.schemas.allocation import AllocateRequest
+from app.services.logic_engine import ProofBudgetExceeded
+from app.services.reasoning import run_allocation
+from tests.conftest import seed_database
+
+# Every default-on speedup switched off: the reference the defaults must reproduce
+BASELINE_SETTINGS = {
+    "LOGIC_ENGINE_MODE": "interpret",
+    "LOGIC_ENGINE_TABLING": False,
+    "LOGIC_ENGINE_MATERIALIZE": False,
+    "LOGIC_ENGINE_BITSET_KERNEL": False,
+    "LOGIC_ENGINE_REORDER": False,
+    "KB_CACHE_ENABLED": False,
+    "SCORING_VECTORIZED": False,
+}
+
+
+def allocate(db, **fields) -> dict:
+    response = run_allocation(db, AllocateRequest(**fields)).model_dump()
+    response.pop("run_id")
+    return response
+
+
+@pytest.fixture(scope="module")
+def team():
+    seed_database(40, 60, 12, seed=3)
+
+
+@pytest.mark.parametrize("strategy", ["greedy", "optimal"])
+@pytest.mark.parametrize("explain_level", ["full", "top"])
+def test_defaults_match_unoptimized_baseline(team, db, monkeypatch, strategy, explain_level):
+    optimized = allocate(db, strategy=strategy, explain_level=explain_level)
+    for name, value in BASELINE_SETTINGS.items():
+        monkeypatch.setattr(settings, name, value)
+    baseline = allocate(db, strategy=strategy, explain_level=explain_level)
+    assert optimized["assignments"]
+    assert optimized == baseline
+
+
+@pytest.mark.parametrize("materialize", [False, True])
+def test_step_budget_is_per_goal(team, db, monkeypatch, materialize):
+    for name, value in BASELINE_SETTINGS.items():
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(settings, "LOGIC_ENGINE_MATERIALIZE", materialize)
+    unlimited = allocate(db)
+    # A few steps per member and task carry the whole run, however large the team
+    monkeypatch.setattr(settings, "LOGIC_ENGINE_MAX_STEPS", 10)
+    assert allocate(db) == unlimited
+    # Materialized runs spend theirs keeping eligible current after each assignment
+    monkeypatch.setattr(settings, "LOGIC_ENGINE_MAX_STEPS", 1)
+    with pytest.raises(ProofBudgetExceeded):
+        allocate(db)
+
+
+@pytest.mark.parametrize("materialize", [False, True])
+def test_profile_returns_engine_counters(team, db, monkeypatch, materialize):
+    monkeypatch.setattr(settings, "LOGIC_ENGINE_MATERIALIZE", materialize)
+    plain = allocate(db)
+    profiled = allocate(db, profile=True)
+    stats = profiled.pop("engine_stats")
+    assert plain.pop("engine_stats") is None
+    assert profiled == plain
+    assert stats["sample_rate"] == 1.0
+    assert stats["queries"] == stats["sampled"] > 0
+    if materialize:
+        # Derived once up front, then read from the relations without a proof
+        assert stats["rules"]["can_perform#0"]["expansions"] > 0
+        assert stats["rules"]["eligible#0"]["answers"] > 0
+    else:
+        # Every task asks for its eligible members once
+        n_tasks = len(plain["assignments"]) + len(plain["unassigned_tasks"])
+        assert stats["predicates"]["eligible"]["goals"] == n_tasks
+
+
+def without_evidence(response: dict) -> dict:
+    assignments = [{**a, "inference_trace": [], "candidate_explanations": []} for a in response["assignments"]]
+    return {**response, "assignments": assignments}
+
+
+@pytest.mark.parametrize("strategy", ["greedy", "optimal"])
+def test_explain_levels_only_trim_the_evidence(team, db, strategy):
+    full = allocate(db, strategy=strategy)
+    top = allocate(db, strategy=strategy, explain_level="top", explain_top_k=2)
+    none = allocate(db, strategy=strategy, explain_level="none")
+    # Same decisions, scores, explanations and summaries at every level
+    assert without_evidence(top) == without_evidence(none) == without_evidence(full)
+    assert full["assignments"]
+
+    for f, t, n in zip(full["assignments"], top["assignments"], none["assignments"]):
+        assert n["inference_trace"] == [] and n["candidate_explanations"] == []
+        assert t["inference_trace"] == f["inference_trace"] != []
+        # The two best-scoring eligible rows of "full" (earlier member first on ties), with the chosen one always kept
+        eligible = [r for r in f["candidate_explanations"] if r["score"] is not None]
+        ranked = [r["member_id"] for r in sorted(eligible, key=lambda r: r["score"], reverse=True)]
+        keep = set(ranked[:2]) if f["team_member_id"] in ranked[:2] else {f["team_member_id"], ranked[0]}
+        assert t["candidate_explanations"] == [r for r in f["candidate_explanations"] if r["member_id"] in keep]
+        assert [r["member_id"] for r in t["candidate_explanations"] if r["chosen"]] == [f["team_member_id"]]
@@ -0,0 +1,50 @@
+import itertools
+import random
+
+import pytest
+
+from app.services.assignment import solve_capacitated_assignment
+
+
+def brute_force(options, capacity) -> tuple[int, float]:
+    """Best (tasks assigned, total score) over every feasible assignment."""
+    best = (0, 0.0)
+    for choice in itertools.product(*([None, *(m for m, _ in opts)] for opts in options)):
+        used = [m for m in choice if m is not None]
+        if any(used.count(m) > capacity.get(m, 0) for m in set(used)):
+            continue
+        score = sum(dict(opts)[m] for opts, m in zip(options, choice) if m is not None)
+        best = max(best, (len(used), score))
+    return best
+
+
+def random_instance(rng: random.Random) -> tuple[list[list[tuple[str, float]]], dict[str, int]]:
+    members = [f"m{k}" for k in range(rng.randint(1, 4))]
+    capacity = {m: rng.randint(0, 2) for m in members}
+    options = [
+        [(m, round(rng.random(), 3)) for m in rng.sample(members, rng.randint(0, len(members)))]
+        for _ in range(rng.randint(1, 6))
+    ]
+    return options, capacity
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_min_cost_flow_matches_brute_force(seed):
+    options, capacity = random_instance(random.Random(seed))
+    chosen = solve_capacitated_assignment(options, capacity)
+
+    assert len(chosen) == len(options)
+    for opts, m in zip(options, chosen):
+        assert m is None or m in dict(opts)
+    for m in set(chosen) - {None}:
+        assert chosen.count(m) <= capacity[m]
+    count = sum(m is not None for m in chosen)
+    score = sum(dict(opts)[m] for opts, m in zip(options, chosen) if m is not None)
+    best_count, best_score = brute_force(options, capacity)
+    assert count == best_count
+    assert score == pytest.approx(best_score, abs=1e-5)
+
+
+def test_solution_is_deterministic():
+    options, capacity = random_instance(random.Random(11))
+    assert solve_capacitated_assignment(options, capacity) == solve_capacitated_assignment(options, capacity)
@@ -0,0 +1,63 @@
+"""
+Allocation against the original implementation, not against the current
+code with its speedups switched off: data/baseline_allocation.json holds
+what the allocator before them (commit 0a56f9c) returned for this team, a
+first round and a force round over its leftovers. The one intended change
+is applied to it: a task's required skills are listed in skill-id order
+(the original listed them in set-iteration order of its facts).
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from app.core.config import settings
+from app.schemas.allocation import AllocateRequest
+from app.services.reasoning import run_allocation
+from tests.conftest import seed_database
+
+BASELINE = json.loads((Path(__file__).parent / "data" / "baseline_allocation.json").read_text(encoding="utf-8"))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def team():
+    seed_database(8, 16, 5, seed=5)
+
+
+def response(db, **fields) -> dict:
+    result = run_allocation(db, AllocateRequest(**fields)).model_dump()
+    result.pop("run_id")
+    result.pop("engine_stats")
+    return result
+
+
+@pytest.mark.parametrize("kb_cache", [True, False])
+def test_allocation_matches_original_implementation(db, monkeypatch, kb_cache):
+    monkeypatch.setattr(settings, "KB_CACHE_ENABLED", kb_cache)
+    first = response(db)
+    assert first == BASELINE["first_round"]
+    prior = [{"task_id": a["task_id"], "team_member_id": a["team_member_id"]} for a in first["assignments"]]
+    second = response(db, task_ids=first["unassigned_task_ids"], force_round=True, prior_assignments=prior)
+    assert second == BASELINE["force_round"]
+
+
+def test_required_skills_are_listed_in_id_order(db):
+    from app.db.models import Task
+
+    first = response(db)
+    reasons = [
+        c["rejection_reasons"]
+        for a in first["assignments"]
+        for c in a["candidate_explanations"]
+        if c["rejection_reasons"] and c["rejection_reasons"][0].startswith("Missing required skill")
+    ]
+    assert any(len(r) > 1 for r in reasons)
+    for a in first["assignments"]:
+        task = db.get(Task, a["task_id"])
+        in_id_order = [s.skill_name for s in sorted(task.required_skills, key=lambda s: s.id)]
+        listed = [s["fact_or_derived"] for s in a["inference_trace"] if s["fact_or_derived"].startswith("requires_skill(")]
+        assert listed == [f"requires_skill({task.task_name}, {name})" for name in in_id_order]
+        for c in a["candidate_explanations"]:
+            if c["rejection_reasons"] and c["rejection_reasons"][0].startswith("Missing required skill"):
+                assert c["rejection_reasons"] == [f"Missing required skill: {name}" for name in in_id_order]
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from app.db.models import Task, TeamMember
+from app.schemas.allocation import AllocateRequest, PriorAssignment
+from app.services.reasoning import OVERLOAD_LIMIT, run_allocation
+from tests.conftest import seed_database
+
+
+def reference_force_round(tasks, members, prior_member_ids):
+    """
+    The force round as a full stable sort over every candidate: returns
+    (task id, [(member id, overlap, workload, experience)] of the top three) per task.
+    """
+    workload = {m.id: 0 for m in members}
+    for mid in prior_member_ids:
+        workload[mid] += 1
+    picks = []
+    for task in tasks:
+        required = {s.id for s in task.required_skills}
+        candidates = []
+        for m in members:
+            if not m.calendar_availability or workload[m.id] >= OVERLOAD_LIMIT:
+                continue
+            overlap = len(required & {s.id for s in m.skills}) / len(required) if required else 0
+            candidates.append((m.id, overlap, workload[m.id], m.years_of_experience or 0))
+        candidates.sort(key=lambda c: (-c[1], c[2], -c[3]))
+        if candidates:
+            workload[candidates[0][0]] += 1
+        picks.append((task.id, candidates[:3]))
+    return picks
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_force_round_matches_full_sort(db, seed):
+    seed_database(30, 50, 10, seed=seed)
+    tasks = db.query(Task).filter(Task.assignee_id.is_(None)).order_by(Task.priority_order.asc().nullslast()).all()
+    members = db.query(TeamMember).all()
+    rng = random.Random(seed)
+    # Enough prior assignments that some members start the round overloaded
+    prior = [PriorAssignment(task_id=0, team_member_id=rng.choice(members[:6]).id) for _ in range(20)]
+
+    response = run_allocation(
+        db, AllocateRequest(task_ids=[t.id for t in tasks], force_round=True, prior_assignments=prior)
+    )
+    got = {a.task_id: a for a in response.assignments}
+    expected = reference_force_round(tasks, members, [p.team_member_id for p in prior])
+    assert len(got) + len(response.unassigned_tasks) == len(tasks)
+    for task_id, top in expected:
+        if not top:
+            assert task_id in response.unassigned_task_ids
+            continue
+        assignment = got[task_id]
+        assert assignment.team_member_id == top[0][0]
+        rows = [(c.member_id, c.score, c.current_workload, c.years_of_experience) for c in assignment.candidate_explanations]
+        assert rows == top
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import mmap
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.api.routes import allocate as allocate_routes
+from app.core.config import settings
+from app.db.models import AllocationJob
+from app.db.session import SessionLocal
+from app.schemas.allocation import AllocateRequest
+from app.services import jobs, kb_cache
+from app.services.reasoning import run_allocation
+from tests.conftest import seed_database
+
+HOST = socket.gethostname()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def team():
+    seed_database(12, 16, 5, seed=9)
+    yield
+    jobs.stop()
+
+
+def add_job(request_json: str = "{}", status: str = "queued", owner: str | None = jobs._OWNER, heartbeat_at=None) -> str:
+    job_id = uuid.uuid4().hex
+    with SessionLocal() as db:
+        db.add(
+            AllocationJob(
+                id=job_id,
+                status=status,
+                request_json=request_json,
+                created_at=datetime.now(),
+                owner=owner,
+                heartbeat_at=heartbeat_at or datetime.now(),
+            )
+        )
+        db.commit()
+    return job_id
+
+
+def load(job_id: str) -> AllocationJob:
+    with SessionLocal() as db:
+        return db.get(AllocationJob, job_id)
+
+
+def wait_finished(job_id: str, timeout: float = 60.0) -> AllocationJob:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = load(job_id)
+        if job.status in jobs.FINISHED:
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} still {job.status}")
+
+
+def dead_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_submitted_job_runs_to_done_with_the_direct_result(db):
+    job = jobs.submit(db, AllocateRequest())
+    assert job.status == "queued" and job.owner == jobs._OWNER
+    finished = wait_finished(job.id)
+    status = jobs.job_status(finished)
+    expected = run_allocation(db, AllocateRequest())
+    assert status.status == "done" and status.tasks_done == status.tasks_total > 0
+    assert status.result.assignments == expected.assignments
+
+
+def test_worker_claims_a_job_once():
+    job_id = add_job()
+    job_id_, _, _ = jobs._run_job(job_id, jobs._OWNER)
+    assert load(job_id).status == "done"
+    assert jobs._run_job(job_id, jobs._OWNER) == (job_id_, None, False)
+
+
+def test_worker_maps_the_backend_snapshot_file(db, tmp_path, monkeypatch):
+    path, fingerprint = kb_cache.snapshot_file(db)
+    version = kb_cache.snapshot(db).version
+    expected = run_allocation(db, AllocateRequest())
+    job_id = add_job()
+    jobs._run_job(job_id, jobs._OWNER, (path, fingerprint))
+    served = kb_cache.snapshot(db)
+    # Served from the mapped file, not reloaded from the database
+    assert isinstance(served.member_id.obj, mmap.mmap) and served.version == version
+    assert jobs.job_status(load(job_id)).result.assignments == expected.assignments
+
+    # With writers outside the process, a file taken at another fingerprint is not served;
+    # a missing one falls back to the database
+    monkeypatch.setattr(settings, "KB_CACHE_EXTERNAL_WRITERS", True)
+    kb_cache.adopt(path, ("stale",))
+    assert not isinstance(kb_cache.snapshot(db).member_id.obj, mmap.mmap)
+    job_id = add_job()
+    jobs._run_job(job_id, jobs._OWNER, (str(tmp_path / "missing.snap"), fingerprint))
+    assert jobs.job_status(load(job_id)).result.assignments == expected.assignments
+
+
+def test_invalid_request_fails_the_job():
+    job_id = add_job('{"strategy": 5}')
+    jobs._run_job(job_id, jobs._OWNER)
+    job = load(job_id)
+    assert job.status == "failed" and job.error.startswith("ValidationError")
+
+
+def test_worker_of_another_owner_cannot_claim_or_write():
+    job_id = add_job(owner="elsewhere:1:aaaa")
+    assert jobs._run_job(job_id, jobs._OWNER) == (job_id, None, False)
+    assert jobs._set(job_id, jobs._OWNER, status="done") == 0
+    assert load(job_id).status == "queued"
+
+
+def test_owner_gone():
+    now = datetime.now()
+    stale = now - timedelta(seconds=settings.ALLOCATION_JOB_STALE_SECONDS + 1)
+    assert jobs._owner_gone(None, None, now)
+    assert jobs._owner_gone("elsewhere:1:aaaa", stale, now)
+    assert not jobs._owner_gone("elsewhere:1:aaaa", now, now)
+    assert not jobs._owner_gone(jobs._OWNER, now, now)
+    if jobs.os.name == "posix":
+        assert jobs._owner_gone(f"{HOST}:{dead_pid()}:aaaa", now, now)
+        assert not jobs._owner_gone(f"{HOST}:{jobs.os.getppid()}:aaaa", now, now)
+
+
+def test_reclaim_takes_over_only_orphaned_jobs():
+    stale = datetime.now() - timedelta(seconds=settings.ALLOCATION_JOB_STALE_SECONDS + 1)
+    orphaned = [
+        add_job(status="running", owner=None),
+        add_job(status="running", owner="elsewhere:1:aaaa", heartbeat_at=stale),
+    ]
+    alive = add_job(status="running", owner="elsewhere:2:bbbb")
+    assert jobs.reclaim() == 2
+    assert jobs.reclaim() == 0
+    for job_id in orphaned:
+        job = wait_finished(job_id)
+        assert job.status == "done" and job.owner == jobs._OWNER
+    assert load(alive).status == "running" and load(alive).owner == "elsewhere:2:bbbb"
+
+
+def test_queue_limit(db, monkeypatch):
+    monkeypatch.setattr(settings, "ALLOCATION_JOB_MAX_PENDING", 1)
+    add_job(owner="elsewhere:3:cccc")
+    with pytest.raises(jobs.JobQueueFull):
+        jobs.submit(db, AllocateRequest())
+
+
+def test_job_events_end_with_an_error_when_the_row_is_deleted(db):
+    # Owned by a live backend elsewhere, so nothing here runs or takes it over
+    job_id = add_job(status="running", owner="elsewhere:4:dddd")
+    response = allocate_routes.allocate_job_events(job_id, db)
+
+    async def follow() -> tuple[str, list[str]]:
+        first = await anext(response.body_iterator)
+        with SessionLocal() as other:
+            other.delete(other.get(AllocationJob, job_id))
+            other.commit()
+        return first, [event async for event in response.body_iterator]
+
+    first, rest = asyncio.run(follow())
+    assert first.startswith("event: progress\n")
+    [event] = rest
+    kind, data = event.strip().split("\n")
+    assert kind == "event: error"
+    assert json.loads(data.removeprefix("data: ")) == {"detail": f"Allocation job {job_id} was deleted."}
+
+
+def test_job_events_end_with_an_error_when_no_backend_owns_the_job(monkeypatch):
+    # Nothing here takes it over, as another live backend would
+    monkeypatch.setattr(jobs, "reclaim", lambda: 0)
+    monkeypatch.setattr(settings, "ALLOCATION_JOB_STALE_SECONDS", 0.2)
+    monkeypatch.setattr(jobs, "_EVENTS_POLL_INTERVAL", 0.05)
+    job_id = add_job(status="running", owner="elsewhere:5:eeee", heartbeat_at=datetime.now() - timedelta(seconds=1))
+    started = time.monotonic()
+    first, *rest = jobs.events(job_id)
+    assert first.startswith("event: progress\n")
+    [event] = rest
+    assert event.startswith("event: error\n") and "no running backend" in event
+    assert time.monotonic() - started < 5
+
+
+def test_job_events_keep_alive_while_nothing_changes(monkeypatch):
+    monkeypatch.setattr(jobs, "_EVENTS_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(jobs, "_EVENTS_KEEPALIVE", 0.0)
+    job_id = add_job(status="running", owner="elsewhere:6:ffff")
+    stream = jobs.events(job_id)
+    assert next(stream).startswith("event: progress\n")
+    assert next(stream) == next(stream) == ": keep-alive\n\n"
+    # A client gone: the generator is closed and releases its session
+    stream.close()
@@ -0,0 +1,238 @@
+import subprocess
+import sys
+from contextlib import contextmanager
+from typing import Iterator
+
+import pytest
+from sqlalchemy import event, insert, update
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.db.models import Skill, Task, TeamMember, team_member_skills
+from app.db.session import SessionLocal, engine
+from app.schemas.allocation import AllocateRequest
+from app.services import kb_cache
+from app.services.kb_snapshot import KBSnapshot
+from app.services.reasoning import run_allocation
+from tests.conftest import seed_database
+
+
+@pytest.fixture(autouse=True)
+def team():
+    # Every test writes, so each starts from the same team
+    seed_database(6, 8, 4, seed=21)
+
+
+def current() -> KBSnapshot:
+    """What a new request sees: kb_cache.view() of every member and task, in a fresh session."""
+    with SessionLocal() as session:
+        members = session.query(TeamMember).order_by(TeamMember.id).all()
+        tasks = session.query(Task).order_by(Task.id).all()
+        return kb_cache.view(session, members, tasks)
+
+
+def cached() -> KBSnapshot:
+    with SessionLocal() as session:
+        return kb_cache.snapshot(session)
+
+
+def database() -> KBSnapshot:
+    """The snapshot a reload would build now."""
+    with SessionLocal() as session:
+        members = (
+            session.query(TeamMember)
+            .options(selectinload(TeamMember.skills), selectinload(TeamMember.assigned_tasks))
+            .order_by(TeamMember.id)
+            .all()
+        )
+        tasks = session.query(Task).options(selectinload(Task.required_skills)).order_by(Task.id).all()
+        return KBSnapshot.from_orm(members, tasks)
+
+
+@contextmanager
+def statements() -> Iterator[list[str]]:
+    """SQL sent to the database inside the block."""
+    sent: list[str] = []
+
+    def record(conn, cursor, statement, *args) -> None:
+        sent.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield sent
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def skills_of(snapshot: KBSnapshot, member_id: int) -> list[int]:
+    return list(snapshot.member_skills(list(snapshot.member_id).index(member_id)))
+
+
+def missing_skill(db) -> tuple[TeamMember, Skill]:
+    """The first member without every skill, and a skill they lack."""
+    skills = db.query(Skill).order_by(Skill.id).all()
+    for member in db.query(TeamMember).order_by(TeamMember.id):
+        for skill in skills:
+            if skill not in member.skills:
+                return member, skill
+    raise AssertionError("every member has every skill")
+
+
+def test_unchanged_kb_is_served_without_a_query():
+    first = cached()
+    with SessionLocal() as session, statements() as sent:
+        assert kb_cache.snapshot(session) is first
+    assert sent == []
+    # Reads, and sessions that wrote nothing, keep the version
+    version = kb_cache.kb_version()
+    with SessionLocal() as db:
+        db.query(TeamMember).all()
+        db.commit()
+    assert kb_cache.kb_version() == version
+    assert cached() is first
+
+
+def test_orm_row_write_reloads_on_commit(db):
+    before = cached()
+    version = kb_cache.kb_version()
+    member = db.query(TeamMember).order_by(TeamMember.id).first()
+    member.name = "Renamed"
+    db.flush()
+    # Uncommitted, even db's own view still has the committed rows
+    assert kb_cache.kb_version() == version
+    assert kb_cache.view(db, [member], []).member_name == ["M0"]
+    db.commit()
+    assert kb_cache.kb_version() > version
+    assert cached() is not before
+    assert current().member_name[0] == "Renamed"
+
+
+def test_columns_outside_the_snapshot_keep_the_cache(db):
+    before = cached()
+    version = kb_cache.kb_version()
+    db.query(Task).order_by(Task.id).first().estimated_time = 12.5
+    db.query(TeamMember).order_by(TeamMember.id).first().resume_path = "resumes/m0.pdf"
+    db.commit()
+    assert kb_cache.kb_version() == version
+    assert cached() is before
+
+
+@pytest.mark.parametrize("how", ["column", "relationship", "collection"])
+def test_assignee_changes_update_workloads_without_a_reload(db, how):
+    before = cached()
+    version = kb_cache.kb_version()
+    members = db.query(TeamMember).order_by(TeamMember.id).all()
+    tasks = db.query(Task).order_by(Task.id).all()
+    moved = [t for t in tasks if t.assignee_id is None][:3] + [t for t in tasks if t.assignee_id is not None][:1]
+    for task in moved:
+        member = members[-1] if task.assignee_id != members[-1].id else members[0]
+        if how == "column":
+            task.assignee_id = member.id
+        elif how == "relationship":
+            task.assignee = member
+        else:
+            member.assigned_tasks.append(task)
+    db.commit()
+    assert kb_cache.kb_version() > version
+
+    with statements() as sent:
+        after = cached()
+    # The workload column swapped in: no reload, and the same KB a reload builds
+    assert sent == [] and after is not before
+    assert after.version == database().version != before.version
+    assert after.member_name is not before.member_name and list(after.member_skill) == list(before.member_skill)
+
+
+def test_applied_run_updates_workloads_without_a_reload(db):
+    cached()
+    response = run_allocation(db, AllocateRequest(apply=True))
+    assert response.assignments
+    with statements() as sent:
+        after = cached()
+    assert sent == [] and after.version == database().version
+
+
+def test_reload_between_flush_and_commit_is_not_patched(db):
+    # db moves an assignee and flushes; another writer's commit replaces the entry before db commits
+    task = db.query(Task).filter(Task.assignee_id.is_(None)).order_by(Task.id).first()
+    task.assignee_id = db.query(TeamMember).order_by(TeamMember.id).first().id
+    db.flush()
+    kb_cache.invalidate()
+    reloaded = cached()
+    db.commit()
+    with statements() as sent:
+        after = cached()
+    # Reloaded rather than patching an entry the flush did not count against
+    assert sent and after is not reloaded and after.version == database().version
+
+
+def test_orm_collection_change_reloads_on_commit(db):
+    member, missing = missing_skill(db)
+    assert missing.id not in skills_of(current(), member.id)
+    version = kb_cache.kb_version()
+    member.skills.append(missing)
+    db.commit()
+    assert kb_cache.kb_version() > version
+    assert missing.id in skills_of(current(), member.id)
+
+
+def test_core_writes_through_a_session_reload_on_commit(db):
+    member, skill = missing_skill(db)
+    missing, row = skill.id, list(current().member_id).index(member.id)
+    before = current()
+    version = kb_cache.kb_version()
+    # Through the session, so do_orm_execute flags it
+    db.execute(insert(team_member_skills).values(team_member_id=member.id, skill_id=missing))
+    db.execute(update(Task).where(Task.assignee_id.is_(None)).values(assignee_id=member.id))
+    db.commit()
+    assert kb_cache.kb_version() > version
+    after = current()
+    assert missing in skills_of(after, member.id)
+    assert after.member_workload[row] > before.member_workload[row]
+
+
+def test_rolled_back_writes_keep_the_version(db):
+    before = cached()
+    version = kb_cache.kb_version()
+    db.query(TeamMember).order_by(TeamMember.id).first().name = "Discarded"
+    db.query(Task).order_by(Task.id).first().assignee_id = 1
+    db.flush()
+    db.rollback()
+    assert kb_cache.kb_version() == version
+    assert cached() is before
+
+
+def test_writes_outside_the_process_need_external_writers(monkeypatch):
+    before = cached()
+    version = kb_cache.kb_version()
+    # A Core write on a bare connection raises no session events
+    with engine.begin() as connection:
+        connection.execute(update(TeamMember).where(TeamMember.id == 1).values(years_of_experience=99))
+    assert cached() is before
+
+    monkeypatch.setattr(settings, "KB_CACHE_EXTERNAL_WRITERS", True)
+    assert kb_cache.kb_version() == version
+    assert cached() is not before
+    after = current()
+    assert after.member_years[0] == 99
+
+    # Nor does a write from another process
+    script = (
+        "import sqlite3, sys\n"
+        "with sqlite3.connect(sys.argv[1]) as c:\n"
+        "    c.execute('UPDATE tasks SET assignee_id = 2 WHERE assignee_id IS NULL')\n"
+    )
+    subprocess.run([sys.executable, "-c", script, engine.url.database], check=True)
+    assert kb_cache.kb_version() == version
+    assert current().member_workload[1] > after.member_workload[1]
+
+
+def test_invalidate_reloads_edits_the_fingerprint_cannot_see(monkeypatch):
+    monkeypatch.setattr(settings, "KB_CACHE_EXTERNAL_WRITERS", True)
+    cached()
+    # Same length, so every fingerprint sum stays the same
+    with engine.begin() as connection:
+        connection.execute(update(TeamMember).where(TeamMember.id == 1).values(name="X0"))
+    assert current().member_name[0] == "M0"
+    kb_cache.invalidate()
+    assert current().member_name[0] == "X0"
@@ -0,0 +1,146 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.kb_snapshot import _COLUMNS, _HEADER, KBSnapshot, load_snapshot, write_snapshot
+from app.services.logic_engine import Var
+from app.services.reasoning import build_engine_from_snapshot
+from app.services.scoring import MemberProfile
+from tests.conftest import random_kb
+
+
+def columns(snapshot: KBSnapshot) -> dict:
+    """Every field of snapshot as plain lists, for comparing snapshots whatever their column types."""
+    fields = {name: list(getattr(snapshot, name)) for name in _COLUMNS}
+    fields.update(
+        version=snapshot.version,
+        member_name=list(snapshot.member_name),
+        task_name=list(snapshot.task_name),
+        skill_name=list(snapshot.skill_name),
+    )
+    return fields
+
+
+def test_from_orm_reads_the_rows_in_the_order_given():
+    members, tasks = random_kb(12, 15, 6, seed=2)
+    snapshot = KBSnapshot.from_orm(members, tasks)
+    assert list(snapshot.member_id) == [m.id for m in members]
+    assert list(snapshot.member_workload) == [len(m.assigned_tasks) for m in members]
+    assert list(snapshot.member_available) == [int(bool(m.calendar_availability)) for m in members]
+    assert list(snapshot.member_years) == [m.years_of_experience for m in members]
+    assert list(snapshot.task_id) == [t.id for t in tasks]
+    for i, m in enumerate(members):
+        assert list(snapshot.member_skills(i)) == [s.id for s in m.skills]
+    for j, t in enumerate(tasks):
+        assert list(snapshot.task_skills(j)) == sorted(s.id for s in t.required_skills)
+    assert snapshot.member_name == [m.name for m in members]
+    assert snapshot.task_name == [t.task_name for t in tasks]
+    required = {s.id: s.skill_name for t in tasks for s in t.required_skills}
+    assert dict(snapshot.skill_name) == required
+    profiles = snapshot.member_profiles()
+    for m in members:
+        expected = MemberProfile.from_member(m)
+        assert [getattr(profiles[m.id], k) for k in MemberProfile.__slots__] == [
+            getattr(expected, k) for k in MemberProfile.__slots__
+        ]
+
+
+def test_subset_equals_from_orm_over_the_same_rows():
+    members, tasks = random_kb(20, 25, 6, seed=4)
+    full = KBSnapshot.from_orm(members, tasks)
+    rng = random.Random(4)
+    for _ in range(10):
+        some_members = rng.sample(members, rng.randint(0, len(members)))
+        some_tasks = rng.sample(tasks, rng.randint(0, len(tasks)))
+        part = full.subset([m.id for m in some_members] + [999], [t.id for t in some_tasks] + [999])
+        assert columns(part) == columns(KBSnapshot.from_orm(some_members, some_tasks))
+    # From a frozen or mapped snapshot as well
+    assert columns(full.frozen().subset(full.member_id, full.task_id)) == columns(full)
+
+
+def test_with_workload_equals_from_orm_over_the_new_assignments():
+    members, tasks = random_kb(10, 12, 5, seed=5)
+    snapshot = KBSnapshot.from_orm(members, tasks).frozen()
+    members[0].assigned_tasks = []
+    members[3].assigned_tasks.extend([None] * 4)
+    workload = {m.id: len(m.assigned_tasks) for m in members if m.assigned_tasks} | {999: 2}
+    updated = snapshot.with_workload(workload)
+    assert columns(updated) == columns(KBSnapshot.from_orm(members, tasks))
+    assert updated.member_skill is snapshot.member_skill
+
+
+def test_frozen_columns_are_read_only_views_of_the_same_kb():
+    members, tasks = random_kb(8, 10, 5, seed=6)
+    snapshot = KBSnapshot.from_orm(members, tasks)
+    frozen = snapshot.frozen()
+    assert columns(frozen) == columns(snapshot)
+    for name in _COLUMNS:
+        column = getattr(frozen, name)
+        assert isinstance(column, memoryview) and column.readonly
+    with pytest.raises(TypeError):
+        frozen.member_workload[0] = 99
+    # Names are copies, so the original can change without touching the frozen one
+    snapshot.member_name[0] = "changed"
+    assert frozen.member_name[0] == members[0].name
+
+
+def test_version_changes_with_any_kb_change():
+    members, tasks = random_kb(8, 10, 5, seed=8)
+    version = KBSnapshot.from_orm(members, tasks).version
+    assert KBSnapshot.from_orm(members, tasks).version == version
+    # Loading the same rows in another order changes the engine's answer order, so the version too
+    assert KBSnapshot.from_orm(members[::-1], tasks).version != version
+
+    skill = SimpleNamespace(id=99, skill_name="S99")
+    changes = [
+        lambda: members[0].assigned_tasks.append(None),
+        lambda: setattr(members[1], "calendar_availability", None if members[1].calendar_availability else "Mon 9-12"),
+        lambda: setattr(members[2], "years_of_experience", members[2].years_of_experience + 1),
+        lambda: members[3].skills.append(skill),
+        lambda: tasks[0].required_skills.append(skill),
+        lambda: setattr(members[4], "name", "renamed"),
+        lambda: setattr(skill, "skill_name", "S100"),
+    ]
+    seen = {version}
+    for change in changes:
+        change()
+        version = KBSnapshot.from_orm(members, tasks).version
+        assert version not in seen
+        seen.add(version)
+
+
+def test_write_and_load_round_trip(tmp_path):
+    members, tasks = random_kb(15, 20, 6, seed=10)
+    snapshot = KBSnapshot.from_orm(members, tasks)
+    path = tmp_path / "kb.snap"
+    write_snapshot(snapshot, path)
+    loaded = load_snapshot(path)
+    assert columns(loaded) == columns(snapshot)
+    assert isinstance(loaded.member_skill, memoryview) and loaded.member_skill.readonly
+    # An engine over the mapped columns proves the same answers
+    a, b = build_engine_from_snapshot(snapshot), build_engine_from_snapshot(loaded)
+    for t in tasks:
+        assert a.project("eligible", Var("M"), t.id) == b.project("eligible", Var("M"), t.id)
+    # Rewriting replaces the file whole
+    write_snapshot(snapshot.subset(snapshot.member_id[:3], snapshot.task_id[:2]), path)
+    assert list(load_snapshot(path).member_id) == list(snapshot.member_id[:3])
+
+
+def test_load_rejects_other_files(tmp_path):
+    snapshot = KBSnapshot.from_orm(*random_kb(4, 4, 3, seed=1))
+    path = tmp_path / "kb.snap"
+    write_snapshot(snapshot, path)
+    data = path.read_bytes()
+
+    bad = tmp_path / "bad.snap"
+    for content, message in [
+        (b"", "not a knowledge-base snapshot"),
+        (b"NOTAKB\0\0" + data[8:], "not a knowledge-base snapshot"),
+        (data[:8] + (2).to_bytes(4, "little") + data[12:], "snapshot format 2"),
+        (data[:-1], "truncated"),
+        (data[: _HEADER.size + 8], "truncated"),
+    ]:
+        bad.write_bytes(content)
+        with pytest.raises(ValueError, match=message):
+            load_snapshot(bad)
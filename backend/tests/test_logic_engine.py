@@ -0,0 +1,482 @@
+import random
+
+import pytest
+
+from app.services.kb_snapshot import KBSnapshot
+from app.services.logic_engine import (
+    ConjGoal,
+    EngineStats,
+    FactGoal,
+    FactIndex,
+    ForallGoal,
+    LogicEngine,
+    NegGoal,
+    ProofBudgetExceeded,
+    Var,
+    subset_shape,
+)
+from app.services.reasoning import OVERLOAD_LIMIT, build_engine_from_snapshot
+from tests.conftest import random_kb
+
+DERIVED = ("can_perform", "eligible")
+
+
+def plain_engine(engine: LogicEngine) -> LogicEngine:
+    """The plain interpreter over engine's rules and current facts."""
+    plain = LogicEngine(rules=list(engine.rules))
+    for pred, facts in engine.facts.items():
+        for fact in facts:
+            plain.assert_fact(pred, *fact)
+    return plain
+
+
+def reference_answers(engine: LogicEngine) -> dict[str, set[tuple]]:
+    """Derived tuples proved from scratch by the plain interpreter over engine's current facts."""
+    plain = plain_engine(engine)
+    return {
+        pred: {(s["M"], s["T"]) for s in plain.prove(FactGoal(pred, (Var("M"), Var("T"))))}
+        for pred in DERIVED
+    }
+
+
+def answers(engine: LogicEngine) -> dict[str, set[tuple]]:
+    return {pred: set(engine.select(pred, Var("M"), Var("T"))) for pred in DERIVED}
+
+
+def random_change(engine: LogicEngine, rng: random.Random, members: list[int], tasks: list[int], skills: list[int]) -> None:
+    """One assert or retract of the kind allocation and KB edits make."""
+    m = rng.choice(members)
+    kind = rng.choice(("workload", "available", "has_skill", "requires_skill"))
+    if kind == "workload":
+        old = next(w for mid, w in engine.facts["workload"] if mid == m)
+        new = max(0, old + rng.choice((-1, 1)))
+        engine.retract_fact("workload", m, old)
+        engine.assert_fact("workload", m, new)
+        if new > OVERLOAD_LIMIT:
+            engine.assert_fact("overloaded", m)
+        else:
+            engine.retract_fact("overloaded", m)
+    elif kind == "available":
+        if not engine.retract_fact("available", m):
+            engine.assert_fact("available", m)
+    elif kind == "has_skill":
+        s = rng.choice(skills)
+        if not engine.retract_fact("has_skill", m, s):
+            engine.assert_fact("has_skill", m, s)
+    else:
+        t, s = rng.choice(tasks), rng.choice(skills)
+        if not engine.retract_fact("requires_skill", t, s):
+            engine.assert_fact("requires_skill", t, s)
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_materialized_relations_follow_fact_changes(mode, seed):
+    members, tasks = random_kb(12, 15, 6, seed=seed)
+    snapshot = KBSnapshot.from_orm(members, tasks)
+    engine = build_engine_from_snapshot(snapshot, mode=mode, materialize=True)
+    rng = random.Random(seed)
+    member_ids, task_ids, skill_ids = [m.id for m in members], [t.id for t in tasks], list(range(1, 7))
+    assert answers(engine) == reference_answers(engine)
+    for _ in range(60):
+        random_change(engine, rng, member_ids, task_ids, skill_ids)
+        assert answers(engine) == reference_answers(engine)
+    # Maintained in place, not dropped and recomputed by a fallback
+    assert set(engine._derived) == set(DERIVED)
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+@pytest.mark.parametrize("tabling", [False, True])
+@pytest.mark.parametrize("materialize", [False, True])
+@pytest.mark.parametrize("bitset_kernel", [False, True])
+@pytest.mark.parametrize("reorder", [False, True])
+def test_engine_options_prove_the_same_answers(mode, tabling, materialize, bitset_kernel, reorder):
+    members, tasks = random_kb(10, 12, 5, seed=7)
+    snapshot = KBSnapshot.from_orm(members, tasks)
+    baseline = build_engine_from_snapshot(
+        snapshot, mode="interpret", tabling=False, materialize=False, bitset_kernel=False, reorder=False
+    )
+    engine = build_engine_from_snapshot(
+        snapshot, mode=mode, tabling=tabling, materialize=materialize, bitset_kernel=bitset_kernel, reorder=reorder
+    )
+    for t in tasks:
+        for pred in DERIVED:
+            goal = FactGoal(pred, (Var("M"), t.id))
+            expected = [s["M"] for s in baseline.prove(goal)]
+            assert sorted(s["M"] for s in engine.prove(goal)) == sorted(expected)
+            assert sorted(m for m, _ in engine.select(pred, Var("M"), t.id)) == sorted(set(expected))
+    # Ground goals and repeated proofs exercise the trail's undo on backtracking
+    for m in members:
+        for t in tasks:
+            goal = FactGoal("eligible", (m.id, t.id))
+            assert any(True for _ in engine.prove(goal)) == any(True for _ in baseline.prove(goal))
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+@pytest.mark.parametrize("materialize", [False, True])
+def test_query_api_matches_prove(mode, materialize):
+    members, tasks = random_kb(10, 12, 5, seed=11)
+    engine = build_engine_from_snapshot(KBSnapshot.from_orm(members, tasks), mode=mode, materialize=materialize)
+    for t in tasks:
+        for pred in DERIVED:
+            goal = FactGoal(pred, (Var("M"), t.id))
+            expected = {s["M"] for s in engine.prove(goal)}
+            first = engine.prove_one(goal)
+            assert (first is None) == (not expected)
+            assert first is None or first["M"] in expected
+            assert engine.exists(goal) == bool(expected)
+            assert engine.count(goal) == len(expected)
+            assert engine.count(goal, limit=1) == min(1, len(expected))
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+def test_step_budget_aborts_queries(mode):
+    members, tasks = random_kb(10, 12, 5, seed=11)
+    engine = build_engine_from_snapshot(
+        KBSnapshot.from_orm(members, tasks), mode=mode, tabling=False, materialize=False, max_steps=0
+    )
+    goal = FactGoal("eligible", (Var("M"), Var("T")))
+    assert engine.max_steps is None
+    total = engine.count(goal)
+    with pytest.raises(ProofBudgetExceeded):
+        engine.count(goal, max_steps=5)
+    with pytest.raises(ProofBudgetExceeded):
+        with engine.budget(5):
+            engine.project("eligible", Var("M"), tasks[0].id)
+    # The budget is scoped to its query, and scales with the goals a query stands for
+    assert engine.count(goal) == total
+    with engine.budget(5, goals=len(members)):
+        engine.project("eligible", Var("M"), tasks[0].id)
+    # Materialization and its upkeep run under the enclosing budget; an
+    # aborted one leaves no half-built relation behind
+    with pytest.raises(ProofBudgetExceeded):
+        with engine.budget(5):
+            engine.materialize()
+    assert not engine._derived
+    engine.materialize()
+    m = next(m.id for m in members if (m.id,) not in engine.facts["overloaded"])
+    with pytest.raises(ProofBudgetExceeded):
+        with engine.budget(1):
+            engine.assert_fact("overloaded", m)
+    assert engine.count(goal) == plain_engine(engine).count(goal)
+    engine.materialize()
+    # A nested budget's steps count against the enclosing one
+    with pytest.raises(ProofBudgetExceeded):
+        with engine.budget(4):
+            with engine.budget(10):
+                engine.retract_fact("overloaded", m)
+            engine.assert_fact("overloaded", m)
+
+
+def test_fact_index_lookups_follow_adds_and_discards():
+    rng = random.Random(5)
+    index = FactIndex()
+    facts: list[tuple] = []  # reference: every fact present, in assertion order
+    a, b, c = Var("A"), Var("B"), Var("C")
+    patterns = [(a, b, c), (1, b, c), (a, 2, c), (1, 2, c), (a, b, 3)]
+    for step in range(400):
+        fact = (rng.randint(1, 4), rng.randint(1, 4), rng.randint(1, 4))
+        if rng.random() < 0.6:
+            assert index.add(fact) == (fact not in facts)
+            if fact not in facts:
+                facts.append(fact)
+        else:
+            assert index.discard(fact) == (fact in facts)
+            if fact in facts:
+                facts.remove(fact)
+        # Indexes are built on first use part-way through, then kept in sync
+        for pattern in patterns[: 1 + step // 80]:
+            expected = [f for f in facts if all(isinstance(a, Var) or a == v for a, v in zip(pattern, f))]
+            assert list(index.lookup(pattern)) == expected
+        assert list(index.lookup(fact)) == ([fact] if fact in facts else [])
+        assert len(index) == len(facts)
+    assert index.distinct(0) == len({f[0] for f in facts})
+
+
+def family_engine(mode: str) -> LogicEngine:
+    """Rules the allocation KB does not exercise: recursion, a repeated Var, ¬ and a callable ∀ domain."""
+    X, Y, Z, C = Var("X"), Var("Y"), Var("Z"), Var("C")
+    engine = LogicEngine(mode=mode)
+    for parent, child in [(1, 2), (1, 3), (2, 4), (3, 5), (4, 6)]:
+        engine.assert_fact("parent", parent, child)
+    for mentor, mentee in [(1, 4), (3, 3), (5, 5)]:
+        engine.assert_fact("mentor", mentor, mentee)
+    for person in range(1, 7):
+        engine.assert_fact("person", person)
+    engine.add_rule("ancestor", ["X", "Y"], FactGoal("parent", (X, Y)))
+    engine.add_rule("ancestor", ["X", "Y"], ConjGoal((FactGoal("parent", (X, Z)), FactGoal("ancestor", (Z, Y)))))
+    engine.add_rule("own_mentor", ["X"], FactGoal("mentor", (X, X)))
+    engine.add_rule("leaf", ["X"], ConjGoal((FactGoal("person", (X,)), NegGoal(FactGoal("parent", (X, Z))))))
+    children = lambda e, subst: (child for parent, child in e.facts["parent"] if parent == subst["X"])  # noqa: E731
+    engine.add_rule(
+        "parent_of_leaves",
+        ["X"],
+        ConjGoal((FactGoal("person", (X,)), ForallGoal(C, children, FactGoal("leaf", (C,))))),
+    )
+    return engine
+
+
+def test_compiled_mode_matches_interpreter_on_general_rules():
+    X, Y = Var("X"), Var("Y")
+    goals = [
+        FactGoal("ancestor", (1, Y)),
+        FactGoal("ancestor", (X, 6)),
+        FactGoal("ancestor", (X, X)),
+        FactGoal("ancestor", (2, 6)),
+        FactGoal("own_mentor", (X,)),
+        FactGoal("leaf", (X,)),
+        FactGoal("parent_of_leaves", (X,)),
+        ConjGoal((FactGoal("parent", (X, Y)), NegGoal(FactGoal("leaf", (Y,))))),
+    ]
+    interpreted, compiled = family_engine("interpret"), family_engine("compiled")
+    for goal in goals:
+        expected = list(interpreted.prove(goal))
+        assert list(compiled.prove(goal)) == expected
+    # Each rule body is compiled once, when the rule is added
+    assert len(compiled._compiled["ancestor"]) == 2
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+def test_tabling_drops_only_dependent_tables(mode):
+    members, tasks = random_kb(10, 12, 5, seed=13)
+    engine = build_engine_from_snapshot(KBSnapshot.from_orm(members, tasks), mode=mode, tabling=True, materialize=False)
+    for t in tasks:
+        for pred in DERIVED:
+            list(engine.prove(FactGoal(pred, (Var("M"), t.id))))
+    assert set(engine._tables) == set(DERIVED)
+    can_perform_table = engine._tables["can_perform"]
+
+    # overloaded is read by eligible only: can_perform answers survive
+    m = next(m.id for m in members if (m.id,) not in engine.facts["overloaded"])
+    engine.assert_fact("overloaded", m)
+    assert "eligible" not in engine._tables
+    assert engine._tables["can_perform"] is can_perform_table
+    # A new skill can change both
+    engine.assert_fact("has_skill", m, next(s for s in range(1, 6) if (m, s) not in engine.facts["has_skill"]))
+    assert not engine._tables
+    expected = reference_answers(engine)
+    for t in tasks:
+        for pred in DERIVED:
+            proved = {s["M"] for s in engine.prove(FactGoal(pred, (Var("M"), t.id)))}
+            assert proved == {mid for mid, tid in expected[pred] if tid == t.id}
+    # Variants share a table entry: renaming the open Var is a hit
+    hits = engine._tables["eligible"]
+    list(engine.prove(FactGoal("eligible", (Var("Who"), tasks[0].id))))
+    assert engine._tables["eligible"] is hits and len(hits) == len(tasks)
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+def test_materialize_matches_proofs_on_recursive_rules(mode):
+    engine = family_engine(mode)
+    proved = {
+        pred: {tuple(s[v] for v in names) for s in engine.prove(FactGoal(pred, tuple(Var(v) for v in names)))}
+        for pred, names in [("ancestor", "XY"), ("own_mentor", "X"), ("leaf", "X"), ("parent_of_leaves", "X")]
+    }
+    engine.materialize()
+    for pred, expected in proved.items():
+        assert set(engine.materialized(pred)) == expected
+    # Semi-naive rounds reach the transitive closure
+    assert (1, 6) in engine.materialized("ancestor")
+    # parent_of_leaves reads leaf under ∀, so leaf is complete in a lower stratum
+    strata = engine.stratify()
+    level = {pred: i for i, stratum in enumerate(strata) for pred in stratum}
+    assert level["parent_of_leaves"] > level["leaf"]
+
+
+def test_recursion_through_negation_is_rejected():
+    engine = LogicEngine()
+    engine.assert_fact("node", 1)
+    engine.add_rule("odd", ["X"], ConjGoal((FactGoal("node", (Var("X"),)), NegGoal(FactGoal("even", (Var("X"),))))))
+    engine.add_rule("even", ["X"], ConjGoal((FactGoal("node", (Var("X"),)), NegGoal(FactGoal("odd", (Var("X"),))))))
+    with pytest.raises(ValueError, match="not stratifiable"):
+        engine.materialize()
+
+
+def test_bitset_kernel_matches_subset_test_after_changes():
+    members, tasks = random_kb(10, 12, 6, seed=17)
+    engine = build_engine_from_snapshot(KBSnapshot.from_orm(members, tasks), bitset_kernel=True, materialize=False)
+    # can_perform's body: member(M) ∧ task(T) ∧ ∀S: requires_skill(T, S) ⇒ has_skill(M, S)
+    shape = subset_shape(engine.rules[0][2].goals[2])
+    assert shape == ("requires_skill", 0, Var("T"), "has_skill", 0, Var("M"))
+    assert engine._kernel_applies(shape)
+    rng = random.Random(17)
+    member_ids, task_ids = [m.id for m in members], [t.id for t in tasks]
+    for _ in range(40):
+        random_change(engine, rng, member_ids, task_ids, list(range(1, 7)))
+        for t in task_ids:
+            need = {s for tid, s in engine.facts["requires_skill"] if tid == t}
+            for m in member_ids:
+                have = {s for mid, s in engine.facts["has_skill"] if mid == m}
+                assert engine._kernel.covers(engine, shape, t, m) == (need <= have)
+    # A rule-defined predicate is not a base relation the masks can read
+    engine.add_rule("has_skill", ["M", "S"], FactGoal("certified", (Var("M"), Var("S"))))
+    assert not engine._kernel_applies(shape)
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+@pytest.mark.parametrize("materialize", [False, True])
+def test_project_returns_distinct_values_in_assertion_order(mode, materialize):
+    engine = family_engine(mode)
+    for skill in (5, 3, 5, 9):
+        engine.assert_fact("requires_skill", 1, skill)
+    engine.assert_fact("requires_skill", 2, 4)
+    if materialize:
+        engine.materialize()
+    assert engine.project("requires_skill", 1, Var("S")) == [5, 3, 9]
+    assert engine.project("requires_skill", Var("T"), 4) == [2]
+    assert engine.project("requires_skill", 3, Var("S")) == []
+    # Derived predicates: each value once, however many proofs reach it
+    descendants = engine.project("ancestor", 1, Var("Y"))
+    assert sorted(descendants) == [2, 3, 4, 5, 6]
+    with pytest.raises(ValueError):
+        engine.project("requires_skill", Var("T"), Var("S"))
+
+
+def test_reorder_runs_cheap_goals_first_and_holds_negations():
+    X, Y = Var("X"), Var("Y")
+    engine = LogicEngine(reorder=True)
+    for x in range(50):
+        for y in range(4):
+            engine.assert_fact("edge", x, y)
+    engine.assert_fact("start", 3)
+    engine.assert_fact("start", 7)
+    engine.assert_fact("blocked", 2)
+    body = [FactGoal("edge", (X, Y)), NegGoal(FactGoal("blocked", (Y,))), FactGoal("start", (X,))]
+    # start (2 rows) binds X before edge is read; the cheap ¬blocked(Y) still waits for edge to bind Y
+    assert [i for i, _ in engine._order_conjuncts(body, set())] == [2, 0, 1]
+    assert [i for i, _ in engine._order_conjuncts(body, {"Y"})][0] == 1
+    assert [i for i, _ in LogicEngine()._order_conjuncts(body, set())] == [0, 1, 2]
+
+    plain = LogicEngine()
+    for pred, facts in engine.facts.items():
+        for fact in facts:
+            plain.assert_fact(pred, *fact)
+    for e in (engine, plain):
+        e.add_rule("reach", ["X", "Y"], ConjGoal(tuple(body)))
+    expected = sorted((s["X"], s["Y"]) for s in plain.prove(FactGoal("reach", (X, Y))))
+    assert expected == [(3, 0), (3, 1), (3, 3), (7, 0), (7, 1), (7, 3)]
+    assert sorted((s["X"], s["Y"]) for s in engine.prove(FactGoal("reach", (X, Y)))) == expected
+
+
+def counted_engine(mode: str, stats: EngineStats) -> LogicEngine:
+    """r(X) <- p(X) ∧ q(X) and r(X) <- s(X), with stats attached after the facts are loaded."""
+    X = Var("X")
+    engine = LogicEngine(mode=mode, tabling=False)
+    for x in (1, 2, 3):
+        engine.assert_fact("p", x)
+    for x in (2, 3):
+        engine.assert_fact("q", x)
+    engine.add_rule("r", ["X"], ConjGoal((FactGoal("p", (X,)), FactGoal("q", (X,)))))
+    engine.add_rule("r", ["X"], FactGoal("s", (X,)))
+    engine.stats = stats
+    return engine
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+def test_stats_count_goals_per_predicate_and_rule(mode):
+    stats = EngineStats()
+    engine = counted_engine(mode, stats)
+    assert [s["X"] for s in engine.prove(FactGoal("r", (Var("X"),)))] == [2, 3]
+    assert (stats.queries, stats.sampled) == (1, 1)
+    counts = stats.as_dict()
+    assert {pred: c["goals"] for pred, c in counts["predicates"].items()} == {"r": 1, "p": 1, "q": 3, "s": 1}
+    assert counts["predicates"]["r"]["rule_expansions"] == 2
+    assert counts["predicates"]["p"]["facts_scanned"] == 3
+    assert {label: (c["expansions"], c["answers"]) for label, c in counts["rules"].items()} == {
+        "r#0": (1, 2),
+        "r#1": (1, 0),
+    }
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+def test_stats_sample_a_fraction_of_queries(mode):
+    stats = EngineStats(sample_rate=0.3, seed=4)
+    engine = counted_engine(mode, stats)
+    for _ in range(200):
+        assert engine.exists(FactGoal("r", (2,)))
+    assert stats.queries == 200
+    assert 30 < stats.sampled < 90
+    # Only sampled queries record, and each records all of its goals
+    assert stats.predicates["r"].goals == stats.sampled
+    assert stats.rules["r#0"].expansions == stats.sampled
+
+    unsampled = EngineStats(sample_rate=0.0)
+    engine.stats = unsampled
+    engine.count(FactGoal("r", (Var("X"),)))
+    assert (unsampled.queries, unsampled.sampled, unsampled.predicates) == (1, 0, {})
+
+
+@pytest.mark.parametrize("mode", ["interpret", "compiled"])
+def test_suspended_proof_does_not_hold_the_sample(mode):
+    stats = EngineStats()
+    engine = counted_engine(mode, stats)
+    X = Var("X")
+    suspended = engine.prove(FactGoal("r", (X,)))
+    assert next(suspended) == {"X": 2}
+    assert engine._call_depth == 0 and engine._recording is None
+    # Later queries are top-level queries of their own, not part of the suspended one
+    engine.select("r", X)
+    engine.count(FactGoal("r", (X,)))
+    assert stats.queries == 3
+    # Resuming records into the suspended proof's own sample
+    goals = stats.predicates["q"].goals
+    assert [s["X"] for s in suspended] == [3]
+    assert stats.predicates["q"].goals > goals
+    abandoned = engine.prove(FactGoal("r", (X,)))
+    next(abandoned)
+    engine.count(FactGoal("r", (X,)))
+    assert stats.queries == 5 and engine._call_depth == 0
+
+
+@pytest.mark.parametrize("tabling", [False, True])
+def test_select_matches_prove_on_general_rules(tabling):
+    X, Y = Var("X"), Var("Y")
+    engine = family_engine("compiled")
+    engine.tabling = tabling
+    # Not range-restricted: Y is never bound, so answers are not ground
+    engine.add_rule("has_child", ["X", "Y"], FactGoal("parent", (X, Var("Z"))))
+    # One rule joined, anti-joined (¬parent) and filtered (callable ∀) set-at-a-time
+    engine.add_rule(
+        "leaf_grandchild",
+        ["X", "Y"],
+        ConjGoal((FactGoal("parent", (X, Var("Z"))), FactGoal("parent", (Var("Z"), Y)), FactGoal("leaf", (Y,)))),
+    )
+    patterns = [
+        ("ancestor", (1, Y)),
+        ("ancestor", (X, 6)),
+        ("ancestor", (X, Y)),
+        ("own_mentor", (X,)),
+        ("leaf", (X,)),
+        ("leaf", (4,)),
+        ("parent_of_leaves", (X,)),
+        ("leaf_grandchild", (X, Y)),
+        ("leaf_grandchild", (1, Y)),
+        ("has_child", (X, Y)),
+    ]
+    def ground(answer: tuple) -> tuple:
+        # A position left open may come back under any Var name
+        return tuple(None if isinstance(a, Var) else a for a in answer)
+
+    for pred, args in patterns:
+        proved = dict.fromkeys(
+            ground(tuple(s.get(a.name, a) if isinstance(a, Var) else a for a in args))
+            for s in engine.prove(FactGoal(pred, args))
+        )
+        selected = engine.select(pred, *args)
+        # Distinct answers, including from the tuple-at-a-time fallbacks (recursive, non-ground)
+        assert len(set(selected)) == len(selected), pred
+        assert sorted(map(ground, selected), key=repr) == sorted(proved, key=repr), pred
+    assert engine.select("leaf_grandchild", X, Y) == [(1, 5), (2, 6)]
+    assert engine.select("leaf", X) == [(5,), (6,)]
+
+
+def test_select_is_one_goal_per_query():
+    stats = EngineStats()
+    members, tasks = random_kb(10, 12, 5, seed=3)
+    engine = build_engine_from_snapshot(KBSnapshot.from_orm(members, tasks), mode="compiled", tabling=False, materialize=False)
+    engine.stats = stats
+    engine.select("eligible", Var("M"), tasks[0].id)
+    assert stats.queries == 1
+    # The derived subgoal is queried once for every member, not once per member
+    assert stats.predicates["eligible"].goals == 1
+    assert stats.predicates["can_perform"].goals == 1
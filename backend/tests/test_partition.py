@@ -0,0 +1,120 @@
+import io
+import pickle
+import random
+from concurrent.futures import Future
+
+import pytest
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.models import Skill, Task, TeamMember
+from app.db.session import SessionLocal, engine
+from app.schemas.allocation import AllocateRequest
+from app.services import kb_cache, partition
+from app.services.kb_snapshot import KBSnapshot
+from app.services.partition import pack, skill_components
+from app.services.reasoning import run_allocation
+from tests.conftest import random_kb
+
+
+def seed_departments(departments: int, members: int, tasks: int, seed: int = 3) -> None:
+    """Teams whose skills do not overlap, plus a task nobody can do: several independent components."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        for d in range(departments):
+            skills = [Skill(skill_name=f"D{d}S{i}", skill_type="hard") for i in range(6)]
+            db.add_all(
+                TeamMember(
+                    name=f"D{d}M{i}",
+                    calendar_availability=", ".join(f"Mon {h}-{h + 1}" for h in range(rng.randint(0, 5))) or None,
+                    years_of_experience=rng.randint(0, 10),
+                    skills=rng.sample(skills, rng.randint(1, 6)),
+                )
+                for i in range(members)
+            )
+            db.add_all(
+                Task(
+                    task_name=f"D{d}T{i}",
+                    estimated_time=rng.choice([None, 2.0, 8.0]),
+                    priority_order=rng.choice([None, 1, 2]),
+                    required_skills=rng.sample(skills, rng.randint(1, 3)),
+                )
+                for i in range(tasks)
+            )
+        db.add(Task(task_name="orphan", required_skills=[Skill(skill_name="nobody", skill_type="hard")]))
+        db.commit()
+    kb_cache.invalidate()
+
+
+def test_components_cover_every_capable_pair():
+    members, tasks = random_kb(30, 40, 12, seed=4)
+    snapshot = KBSnapshot.from_orm(members, tasks)
+    components = skill_components(snapshot)
+    component_of_task = {j: c for c, (_, ts) in enumerate(components) for j in ts}
+    component_of_member = {i: c for c, (ms, _) in enumerate(components) for i in ms}
+    assert sorted(component_of_task) == list(range(len(tasks)))
+    for j in range(len(tasks)):
+        required = set(snapshot.task_skills(j))
+        for i in range(len(members)):
+            if required <= set(snapshot.member_skills(i)):
+                assert component_of_member[i] == component_of_task[j]
+
+
+def test_pack_keeps_components_whole():
+    members, tasks = random_kb(30, 40, 12, seed=4)
+    components = skill_components(KBSnapshot.from_orm(members, tasks))
+    parts = pack(components, 3)
+    assert 1 <= len(parts) <= 3
+    assert sorted(j for _, ts in parts for j in ts) == list(range(40))
+    assert parts == pack(components, 3)
+
+
+@pytest.mark.parametrize("explain_level", ["full", "top", "none"])
+def test_partitioned_optimal_matches_one_piece(db, monkeypatch, explain_level):
+    seed_departments(4, 8, 15)
+    request = AllocateRequest(strategy="optimal", explain_level=explain_level)
+    whole = run_allocation(db, request).model_dump(exclude={"run_id"})
+
+    monkeypatch.setattr(settings, "ALLOCATION_PARTITION_WORKERS", 2)
+    monkeypatch.setattr(settings, "ALLOCATION_PARTITION_MIN_TASKS", 1)
+    assert len(pack(skill_components(kb_cache.snapshot(db)), 2)) == 2
+    split = run_allocation(db, request).model_dump(exclude={"run_id"})
+    assert whole["assignments"] and whole["unassigned_tasks"]
+    assert split == whole
+
+
+class PicklingExecutor:
+    """Runs each part in this process from its pickled arguments, noting any ORM instance pickled."""
+
+    def __init__(self) -> None:
+        self.orm_instances: list[object] = []
+
+    def submit(self, fn, *args) -> Future:
+        executor = self
+
+        class Pickler(pickle.Pickler):
+            def reducer_override(self, obj):
+                if isinstance(obj, Base):
+                    executor.orm_instances.append(obj)
+                return NotImplemented
+
+        buffer = io.BytesIO()
+        Pickler(buffer).dump(args)
+        future = Future()
+        future.set_result(fn(*pickle.loads(buffer.getvalue())))
+        return future
+
+
+def test_parts_are_sent_without_orm_rows(db, monkeypatch):
+    seed_departments(3, 6, 10)
+    request = AllocateRequest(strategy="optimal")
+    whole = run_allocation(db, request).model_dump(exclude={"run_id"})
+
+    monkeypatch.setattr(settings, "ALLOCATION_PARTITION_WORKERS", 2)
+    monkeypatch.setattr(settings, "ALLOCATION_PARTITION_MIN_TASKS", 1)
+    pool = PicklingExecutor()
+    monkeypatch.setattr(partition, "executor", lambda: pool)
+    assert run_allocation(db, request).model_dump(exclude={"run_id"}) == whole
+    assert pool.orm_instances == []
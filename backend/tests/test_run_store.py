@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.schemas.allocation import AllocateRequest
+from app.services import run_store
+from app.services.reasoning import run_allocation, stored_task_detail
+from tests.conftest import seed_database
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """run_store's time.time(), advanced by hand."""
+    now = SimpleNamespace(t=1_000_000.0)
+    monkeypatch.setattr(run_store, "time", SimpleNamespace(time=lambda: now.t))
+    return now
+
+
+@pytest.fixture
+def small_store(monkeypatch):
+    monkeypatch.setattr(settings, "RUN_STORE_MAX_RUNS", 2)
+    monkeypatch.setattr(settings, "RUN_STORE_TTL_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "RUN_STORE_SPILL_PATH", "")
+
+
+def test_least_recently_used_run_is_evicted(small_store, clock):
+    a, b = run_store.put("a"), run_store.put("b")
+    assert run_store.get(a) == "a"  # a is now the most recently used
+    c = run_store.put("c")
+    assert run_store.get(b) is None
+    assert (run_store.get(a), run_store.get(c)) == ("a", "c")
+
+
+def test_runs_expire_after_ttl(small_store, clock):
+    run_id = run_store.put("run")
+    clock.t += 60
+    assert run_store.get(run_id) == "run"
+    clock.t += 1
+    assert run_store.get(run_id) is None
+
+
+def test_pop_removes_the_run(small_store, clock):
+    run_id = run_store.put("run")
+    assert run_store.pop(run_id) == "run"
+    assert run_store.pop(run_id) is None
+    assert run_store.get(run_id) is None
+
+
+def test_evicted_runs_are_read_back_from_the_spill_file(small_store, clock, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "RUN_STORE_SPILL_PATH", str(tmp_path / "runs.db"))
+    ids = [run_store.put({"run": k}) for k in range(4)]
+    run_store.clear()
+    assert [run_store.get(run_id) for run_id in ids] == [{"run": 0}, {"run": 1}, None, None]
+    clock.t += 61
+    assert run_store.get(ids[0]) is None
+
+
+def test_store_disabled_with_no_runs(monkeypatch):
+    monkeypatch.setattr(settings, "RUN_STORE_MAX_RUNS", 0)
+    assert not run_store.enabled()
+
+
+def test_stored_detail_matches_a_full_run(db):
+    seed_database(15, 20, 6, seed=5)
+    full = run_allocation(db, AllocateRequest())
+    top = run_allocation(db, AllocateRequest(explain_level="top", explain_top_k=2))
+    assert top.run_id and full.assignments
+    for expected, trimmed in zip(full.assignments, top.assignments):
+        assert len(trimmed.candidate_explanations) <= 2
+        assert stored_task_detail(top.run_id, trimmed.task_id) == expected
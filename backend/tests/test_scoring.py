@@ -0,0 +1,68 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.reasoning import (
+    availability_score,
+    delivery_speed_score,
+    dynamic_factor_weights,
+    mcdm_score,
+    predicted_completion_hours,
+)
+from app.services.scoring import MemberFeatures, MemberProfile, availability_slot_count, score_candidates
+from tests.conftest import random_kb
+
+
+@pytest.mark.parametrize(
+    "text",
+    [None, "", "  ", "Mon 9-12", "Mon 9-12, Tue 13-17", "Mon 9-12,, Tue 13-17 ,", "whenever", "Mon-Wed 9-17, Fri"],
+)
+def test_profile_counts_slots_as_availability_score(text):
+    member = SimpleNamespace(years_of_experience=None, calendar_availability=text, skills=[])
+    profile = MemberProfile.from_member(member)
+    assert profile.slot_count == availability_slot_count(text)
+    assert min(1.0, profile.slot_count / 6.0) == availability_score(member)
+    assert (profile.years, profile.skill_count) == (0, 0)
+
+
+@pytest.mark.parametrize("busy", [True, False], ids=["workload", "no-workload"])
+@pytest.mark.parametrize("seed", range(4))
+def test_score_candidates_is_bit_identical_to_the_scalar_functions(seed, busy):
+    rng = random.Random(seed)
+    members, _ = random_kb(30, 0, 8, seed=seed)
+    workload = {m.id: rng.randint(0, 4) if busy else 0 for m in members}
+    kb = SimpleNamespace(workload=workload)
+    max_workload = max(workload.values())
+    max_years = max(m.years_of_experience for m in members)
+    max_skills = max(len(m.skills) for m in members)
+    features = MemberFeatures(members, workload, max_years, max_skills)
+
+    for estimated_time, priority in [(None, None), (2.5, 1), (8.0, 3), (0.0, 0), (6.0, 1)]:
+        task = SimpleNamespace(estimated_time=estimated_time, priority_order=priority)
+        weights = dynamic_factor_weights(task)
+        # Includes single candidates, whose delivery speed is 1.0
+        candidates = rng.sample(members, rng.choice([1, 2, len(members) // 2, len(members)]))
+        ids = [m.id for m in candidates]
+        limits = (max_workload, max_years, max_skills)
+        hours = {m.id: predicted_completion_hours(m, task, kb, *limits) for m in candidates}
+        expected = [mcdm_score(m, task, kb, *limits, delivery_speed_score(m.id, hours)) for m in candidates]
+
+        for vectorized in (True, False):
+            scored = score_candidates(features, ids, estimated_time, weights, max_workload, vectorized=vectorized)
+            assert scored.member_ids == ids
+            # == on floats: the same operations in the same order, not just close
+            assert list(scored.predicted_hours) == [hours[mid] for mid in ids]
+            assert list(scored.scores) == [score for score, _, _, _ in expected]
+            for i, (_, factors, weighted, _) in enumerate(expected):
+                assert scored.factors(i) == factors
+                assert scored.weighted(i) == weighted
+
+
+def test_score_candidates_without_candidates():
+    members, _ = random_kb(3, 0, 2)
+    features = MemberFeatures(members, {}, 10, 2)
+    weights = dynamic_factor_weights(SimpleNamespace(estimated_time=4.0, priority_order=2))
+    for vectorized in (True, False):
+        scored = score_candidates(features, [], 4.0, weights, 0, vectorized=vectorized)
+        assert (scored.member_ids, list(scored.scores), list(scored.predicted_hours)) == ([], [], [])
@@ -0,0 +1,38 @@
+import pytest
+
+from app.schemas.allocation import AllocateRequest, PriorAssignment
+from app.services.reasoning import run_allocation, stored_task_detail
+from tests.conftest import seed_database
+
+
+def seed():
+    seed_database(10, 60, 8, seed=6)
+
+
+@pytest.mark.parametrize("strategy", ["greedy", "optimal"])
+@pytest.mark.parametrize("apply", [False, True])
+def test_second_round_matches_two_requests(db, strategy, apply):
+    seed()
+    first = run_allocation(db, AllocateRequest(strategy=strategy, apply=apply))
+    second = run_allocation(
+        db,
+        AllocateRequest(
+            task_ids=first.unassigned_task_ids,
+            force_round=True,
+            prior_assignments=[
+                PriorAssignment(task_id=a.task_id, team_member_id=a.team_member_id) for a in first.assignments
+            ],
+        ),
+    )
+    seed()
+    db.expire_all()
+    both = run_allocation(db, AllocateRequest(strategy=strategy, apply=apply, second_round=True))
+
+    assert first.unassigned_task_ids and second.assignments
+    assert both.assignments == first.assignments + second.assignments
+    assert both.unassigned_tasks == second.unassigned_tasks
+    assert both.summary == f"{first.summary} {second.summary}"
+    assert both.overall_explanation == f"{first.overall_explanation}\n\n{second.overall_explanation}"
+    # One run in the store holds both rounds
+    for assignment in (first.assignments[0], second.assignments[0]):
+        assert stored_task_detail(both.run_id, assignment.task_id) == assignment
@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import pytest
+
+from app.api.routes import allocate as allocate_routes
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.schemas.allocation import AllocateRequest
+from app.services import reasoning
+from app.services.reasoning import run_allocation
+from tests.conftest import seed_database
+
+
+@pytest.fixture(scope="module", autouse=True)
+def team():
+    seed_database(10, 40, 8, seed=13)
+
+
+def drain(response) -> str:
+    """The whole body of a StreamingResponse (without a test client)."""
+
+    async def collect() -> str:
+        chunks = [chunk async for chunk in response.body_iterator]
+        return "".join(c.decode() if isinstance(c, bytes) else c for c in chunks)
+
+    return asyncio.run(collect())
+
+
+def ndjson(request: AllocateRequest) -> list[dict]:
+    body = drain(allocate_routes.allocate_stream(request, format="ndjson"))
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def sse(request: AllocateRequest) -> list[dict]:
+    """The stream's events as {"type", "data"} records, like ndjson()."""
+    body = drain(allocate_routes.allocate_stream(request, format="sse"))
+    records = []
+    for event in body.split("\n\n")[:-1]:
+        kind, data = event.split("\n")
+        records.append({"type": kind.removeprefix("event: "), "data": json.loads(data.removeprefix("data: "))})
+    return records
+
+
+@pytest.fixture
+def run_log(monkeypatch) -> list[tuple]:
+    """What the stream passes to the run log, instead of writing logs/ALLOCATION_RUN_LOG.md."""
+    calls = []
+    monkeypatch.setattr(
+        allocate_routes,
+        "_append_allocation_log",
+        lambda db, request, result, allocated=None, member_ids=None: calls.append((result, allocated, member_ids)),
+    )
+    return calls
+
+
+def expected_records(request: AllocateRequest) -> list[dict]:
+    """POST /allocate's response as stream records: assignments, then unassigned tasks, then the summary."""
+    with SessionLocal() as db:
+        response = json.loads(run_allocation(db, request).model_dump_json())
+    return (
+        [{"type": "assignment", "data": a} for a in response["assignments"]]
+        + [{"type": "unassigned", "data": u} for u in response["unassigned_tasks"]]
+        + [{"type": "summary", "data": {**response, "assignments": []}}]
+    )
+
+
+def by_kind(records: list[dict]) -> list[dict]:
+    # Greedy interleaves the two kinds in task order; the response lists them apart
+    order = {"assignment": 0, "unassigned": 1, "summary": 2}
+    records = sorted(records, key=lambda r: order[r["type"]])
+    for r in records:
+        r["data"].pop("run_id", None)
+    return records
+
+
+@pytest.mark.parametrize("strategy", ["greedy", "optimal"])
+def test_ndjson_and_sse_stream_the_response_of_post_allocate(run_log, strategy):
+    request = AllocateRequest(strategy=strategy)
+    expected = by_kind(expected_records(request))
+    assert any(r["type"] == "unassigned" for r in expected)
+    records = ndjson(request)
+    assert records[-1]["type"] == "summary"
+    assert by_kind(records) == expected
+    assert by_kind(sse(request)) == expected
+
+    # The run log counts what was streamed, without the stream keeping the assignments
+    assigned = [r["data"] for r in records if r["type"] == "assignment"]
+    summary, allocated, member_ids = run_log[0]
+    assert summary.assignments == [] and summary.unassigned_task_ids == records[-1]["data"]["unassigned_task_ids"]
+    assert (allocated, member_ids) == (len(assigned), {a["team_member_id"] for a in assigned})
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [{"task_ids": []}, {"team_member_ids": []}, {"task_ids": [1, 2, 3], "force_round": True}],
+    ids=["no-tasks", "no-members", "force-round"],
+)
+def test_runs_without_the_engine_load_the_rows_once(run_log, monkeypatch, fields):
+    request = AllocateRequest(**fields)
+    expected = by_kind(expected_records(request))
+    loads = []
+    load_run_rows = reasoning._load_run_rows
+    monkeypatch.setattr(reasoning, "_load_run_rows", lambda *args: loads.append(args) or load_run_rows(*args))
+    assert by_kind(ndjson(request)) == expected
+    assert len(loads) == 1
+
+
+def test_stream_ends_with_an_error_record_when_the_budget_runs_out(monkeypatch):
+    # Unmaterialized eligible(m, t) takes about 3 steps per member
+    monkeypatch.setattr(settings, "LOGIC_ENGINE_MATERIALIZE", False)
+    monkeypatch.setattr(settings, "LOGIC_ENGINE_MAX_STEPS", 1)
+    records = ndjson(AllocateRequest())
+    assert records[-1]["type"] == "error"
+    assert "LOGIC_ENGINE_MAX_STEPS" in records[-1]["data"]["detail"]
+    assert all(r["type"] in ("assignment", "unassigned") for r in records[:-1])
+
+    body = drain(allocate_routes.allocate_stream(AllocateRequest(), format="sse"))
+    event, data = body.strip().split("\n\n")[-1].split("\n")
+    assert event == "event: error"
+    assert json.loads(data.removeprefix("data: "))["detail"] == records[-1]["data"]["detail"]
+
+
+def test_service_encodes_the_stream_without_a_run_log():
+    request = AllocateRequest()
+    lines = list(reasoning.encode_allocation_stream(request, "ndjson"))
+    assert by_kind([json.loads(line) for line in lines]) == by_kind(expected_records(request))
@@ -16,6 +16,8 @@ export const kraftApi = {
         apply: options.apply ?? false,
         force_round: options.forceRound ?? false,
         prior_assignments: options.priorAssignments ?? null,
+        second_round: options.secondRound ?? false,
+        explain_level: options.explainLevel ?? 'full',
       }),
       signal: controller.signal,
     });
@@ -41,6 +43,34 @@ export const kraftApi = {
     return res.json();
   },
 
+  async runTaskDetail(runId, taskId) {
+    const res = await fetch(`${BASE}/allocate/runs/${encodeURIComponent(runId)}/tasks/${taskId}`);
+    if (!res.ok) {
+      const text = await res.text();
+      const err = new Error(text || `Task detail failed: ${res.status}`);
+      err.status = res.status;
+      throw err;
+    }
+    return res.json();
+  },
+
+  async explainRunTask(runId, taskId) {
+    const controller = new AbortController();
+    const timeout = setTimeout(() => controller.abort(), 120000);
+    const res = await fetch(`${BASE}/allocate/runs/${encodeURIComponent(runId)}/tasks/${taskId}/explain`, {
+      method: 'POST',
+      signal: controller.signal,
+    });
+    clearTimeout(timeout);
+    if (!res.ok) {
+      const text = await res.text();
+      const err = new Error(text || `Explain task failed: ${res.status}`);
+      err.status = res.status;
+      throw err;
+    }
+    return res.json();
+  },
+
   async explainTask(payload) {
     const controller = new AbortController();
     const timeout = setTimeout(() => controller.abort(), 120000);
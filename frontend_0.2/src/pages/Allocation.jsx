@@ -117,7 +117,8 @@ export default function Allocation() {
   const runAllocation = async () => {
     setIsRunning(true);
     try {
-      const res = await kraftApi.allocate({ apply: false });
+      // Top candidates only; a task's full detail is loaded from the run when it is selected
+      const res = await kraftApi.allocate({ apply: false, explainLevel: 'top' });
       const overallExplanation = res.overall_explanation || res.summary || '';
       setRunUnassignedTasks(res.unassigned_tasks || []);
       const mapped = (res.assignments || []).map((a) => ({
@@ -129,6 +130,8 @@ export default function Allocation() {
         status: 'proposed',
         confidence: Math.round((a.score ?? 0) * 100),
         source: 'backend',
+        run_id: res.run_id ?? null,
+        detail_loaded: false,
         force_assigned: a.force_assigned ?? false,
         reasoning: {
           skill_match: a.constraints_satisfied?.join('; ') || '',
@@ -142,6 +145,7 @@ export default function Allocation() {
       setAllocations(mapped);
       setRunExplanation(overallExplanation);
       setSelectedAllocation(mapped[0] || null);
+      loadTaskDetail(mapped[0]);
       setTaskExplanation('');
       if (mapped.length > 0) {
         toast.success(res.summary || `Allocation completed (${mapped.length} assignment${mapped.length !== 1 ? 's' : ''})`);
@@ -210,6 +214,27 @@ export default function Allocation() {
     }
   };
 
+  const loadTaskDetail = async (allocation) => {
+    if (!allocation?.run_id || allocation.detail_loaded) return;
+    try {
+      const a = await kraftApi.runTaskDetail(allocation.run_id, allocation.task_id);
+      const withDetail = (prev) => ({
+        ...prev,
+        detail_loaded: true,
+        reasoning: {
+          ...prev.reasoning,
+          inference_trace: a.inference_trace,
+          candidate_explanations: a.candidate_explanations,
+        },
+      });
+      setAllocations((prev) => prev.map((p) => (p.id === allocation.id ? withDetail(p) : p)));
+      setSelectedAllocation((prev) => (prev?.id === allocation.id ? withDetail(prev) : prev));
+    } catch (e) {
+      // 404: the run expired from the server's store; keep the top candidates from the run response
+      if (e.status !== 404) toast.error(e.message || 'Task detail failed.');
+    }
+  };
+
   const loadTaskExplanation = async (allocation) => {
     if (!allocation) return;
     setTaskExplainLoading(true);
@@ -219,6 +244,22 @@ export default function Allocation() {
         setTaskExplainLoading(false);
         return;
       }
+      if (allocation.run_id) {
+        // The server still holds this run: it gathers the evidence itself
+        try {
+          const res = await kraftApi.explainRunTask(allocation.run_id, allocation.task_id);
+          setTaskExplanation(res.explanation || '');
+          return;
+        } catch (e) {
+          if (e.status !== 404) throw e;
+          // The run expired from the server's store. The evidence can be sent instead only if
+          // this task's full candidate rows were loaded before; the run response has the top ones.
+          if (!allocation.detail_loaded) {
+            setTaskExplanation('The evidence for this run has expired. Run the allocation again to explain this task.');
+            return;
+          }
+        }
+      }
       const chosen = allocation.reasoning?.candidate_explanations?.find((c) => c.chosen);
       const eligible = (allocation.reasoning?.candidate_explanations || []).filter((c) => typeof c.score === 'number');
       const bestAlt = eligible
@@ -270,6 +311,8 @@ export default function Allocation() {
       setTaskExplanation(res.explanation || '');
     } catch (e) {
       setTaskExplanation('');
+      const msg = e.name === 'AbortError' ? 'Request timed out.' : e.message || 'Explain task failed.';
+      toast.error(msg);
     } finally {
       setTaskExplainLoading(false);
     }
@@ -421,6 +464,7 @@ export default function Allocation() {
                                 }`}
                                 onClick={() => {
                                   setSelectedAllocation(allocation);
+                                  loadTaskDetail(allocation);
                                   loadTaskExplanation(allocation);
                                 }}
                               >